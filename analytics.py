@@ -0,0 +1,323 @@
+"""
+חישובי דף ניתוח הנתונים - פעולות וקטוריות ב-pandas במקום לולאות Python לכל פריט
+הפריטים משוטחים פעם אחת לעמודות מוקלדות (מחרוזות כ-category), הקטגוריה נמצאת במילון
+שנבנה מראש, והחג נקבע בחיפוש בינארי (searchsorted) על טווחי החגים הממוינים.
+"""
+
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_CATEGORY = 'לא ידוע'
+NO_HOLIDAY = 'לא חג'
+
+# טווחי חגים כולל יום הסיום (דוגמה לשנים 2023-2025, אפשר להרחיב)
+HOLIDAYS = [
+    ("פסח",    [("2023-04-05", "2023-04-13"), ("2024-04-22", "2024-04-30"), ("2025-04-12", "2025-04-20")]),
+    ("שבועות",  [("2023-05-25", "2023-05-27"), ("2024-06-11", "2024-06-13"), ("2025-06-01", "2025-06-03")]),
+    ("ראש השנה",[("2023-09-15", "2023-09-17"), ("2024-10-02", "2024-10-04"), ("2025-09-22", "2025-09-24")]),
+    ("סוכות",   [("2023-09-29", "2023-10-07"), ("2024-10-16", "2024-10-24"), ("2025-10-03", "2025-10-11")]),
+    ("חנוכה",  [("2023-12-07", "2023-12-15"), ("2024-12-25", "2025-01-02"), ("2025-12-14", "2025-12-22")]),
+    ("פורים",  [("2023-03-06", "2023-03-08"), ("2024-03-24", "2024-03-26"), ("2025-03-14", "2025-03-16")]),
+]
+
+def category_lookup(categories: Mapping[str, Sequence[str]]) -> Dict[str, str]:
+    """מוצר -> קטגוריה (הקטגוריה הראשונה שמכילה את המוצר, כמו החיפוש הקודם)"""
+    lookup: Dict[str, str] = {}
+    for category, products in categories.items():
+        for product in products:
+            lookup.setdefault(product, category)
+    return lookup
+
+def map_categories(products: pd.Series, lookup: Mapping[str, str]) -> pd.Series:
+    """קטגוריה לכל שורה - המילון נבדק רק לערכים השונים, השורות נבנות מהקודים"""
+    products = products.astype('category')
+    mapped = pd.Categorical([lookup.get(name, UNKNOWN_CATEGORY) for name in products.cat.categories])
+    codes = mapped.codes[products.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=mapped.categories),
+                     index=products.index, name='category')
+
+@lru_cache(maxsize=1)
+def holiday_ranges() -> Tuple[pd.IntervalIndex, pd.Categorical]:
+    """טווחי החגים כ-IntervalIndex ממוין ושם החג לכל טווח (נבנה פעם אחת)"""
+    ranges = sorted(
+        (pd.Timestamp(start), pd.Timestamp(end), name)
+        for name, spans in HOLIDAYS for start, end in spans
+    )
+    index = pd.IntervalIndex.from_tuples([(start, end) for start, end, _ in ranges], closed='both')
+    if not index.is_non_overlapping_monotonic:
+        raise ValueError("holiday ranges overlap")
+    names = pd.Categorical([name for _, _, name in ranges],
+                           categories=[name for name, _ in HOLIDAYS] + [NO_HOLIDAY])
+    return index, names
+
+def assign_holidays(dates: pd.Series) -> pd.Series:
+    """שם החג לכל תאריך (לפי היום) - חיפוש בינארי אחד לכל העמודה במקום apply לכל שורה"""
+    index, names = holiday_ranges()
+    days = dates.dt.normalize().to_numpy(dtype='datetime64[ns]')
+    starts = index.left.to_numpy(dtype='datetime64[ns]')
+    ends = index.right.to_numpy(dtype='datetime64[ns]')
+
+    # הטווח האחרון שמתחיל עד היום - והיום בתוכו אם הוא לא אחרי הסיום (NaT לא בתוך אף טווח)
+    position = np.searchsorted(starts, days, side='right') - 1
+    candidate = position.clip(min=0)
+    inside = (position >= 0) & (days <= ends[candidate])
+    codes = np.where(inside, names.codes[candidate], len(names.categories) - 1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=names.categories),
+                     index=dates.index, name='holiday')
+
+def flatten_items(orders: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """שורה לכל פריט בהזמנה: order, product, quantity, customer, phone, customer_id, date
+
+    מעבר אחד על ההזמנות לרשימות עמודה; שדות ההזמנה נאספים פעם אחת להזמנה ומשוכפלים
+    לפריטים ב-take. הזמנות בלי items תקין מדולגות; כמות לא מספרית נספרת כ-0.
+    דף הניתוח קורא את טבלאות הסיכום ולא משתמש בזה - משמש את benchmark() (השוואה
+    למימוש הקודם ולסיכום מטבלאות הסיכום על אותן הזמנות).
+    """
+    order_rows: List[int] = []
+    products: List[str] = []
+    quantities: List[Any] = []
+    customers: List[str] = []
+    phones: List[str] = []
+    customer_ids: List[Any] = []
+    dates: List[Any] = []
+
+    for order in orders:
+        items = order.get('items', {})
+        if not isinstance(items, dict) or not items:
+            continue
+        order_rows.extend([len(customers)] * len(items))
+        customers.append(order.get('customer_name', '') or '')
+        phones.append(order.get('phone', '') or '')
+        customer_ids.append(order.get('customer_id'))
+        dates.append(order.get('created_at', ''))
+        for product, details in items.items():
+            products.append(product)
+            # תמיכה במבנה בו הפריט הוא dict עם מפתח quantity או מספר ישיר
+            quantities.append(details.get('quantity', details) if isinstance(details, dict) else details)
+
+    per_order = pd.DataFrame({
+        'customer': pd.Categorical(customers),
+        'phone': pd.Categorical(phones),
+        'customer_id': pd.to_numeric(pd.Series(customer_ids, dtype=object), errors='coerce').astype('Int64'),
+        'date': pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce'),
+    })
+    rows = np.asarray(order_rows, dtype=np.int64)
+    items_frame = per_order.take(rows).reset_index(drop=True)
+    items_frame.insert(0, 'order', rows)
+    items_frame.insert(1, 'product', pd.Categorical(products))
+    items_frame.insert(2, 'quantity', pd.to_numeric(pd.Series(quantities, dtype=object), errors='coerce')
+                       .fillna(0.0).astype('float64'))
+    return items_frame
+
+def _sum_quantity(frame: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """סכום הכמות לכל קבוצה (רק קבוצות שמופיעות), מהגדולה לקטנה"""
+    return (frame.groupby(keys, observed=True, sort=False)['quantity'].sum()
+            .reset_index().sort_values('quantity', ascending=False, ignore_index=True))
+
+def summarize(products: pd.DataFrame, customers: pd.DataFrame, dated: pd.DataFrame,
+              categories: Mapping[str, Sequence[str]]) -> Dict[str, pd.DataFrame]:
+    """סיכומי הכמויות של דף הניתוח: category, product, customer, month, holiday
+
+    products - עמודות product, quantity; customers - customer, phone, quantity;
+    dated - date, quantity (שורות בלי תאריך לא נספרות בחודשים ובחגים).
+    שורות flatten_items מתאימות לשלושתם, וכך גם טבלאות הסיכום של מסד הנתונים.
+    """
+    by_category = products[['product', 'quantity']].assign(
+        category=map_categories(products['product'], category_lookup(categories))
+    )
+    summaries = {
+        'category': _sum_quantity(by_category, ['category']),
+        'product': _sum_quantity(products, ['product']),
+        'customer': _sum_quantity(customers, ['customer', 'phone']),
+    }
+
+    dated = dated[['date', 'quantity']].dropna(subset=['date'])
+    month_sum = dated.groupby(dated['date'].dt.to_period('M').rename('month'))['quantity'].sum().reset_index()
+    month_sum['month'] = month_sum['month'].astype(str)
+    summaries['month'] = month_sum
+    summaries['holiday'] = _sum_quantity(dated.assign(holiday=assign_holidays(dated['date'])), ['holiday'])
+    return summaries
+
+def summarize_items(items: pd.DataFrame, categories: Mapping[str, Sequence[str]]) -> Dict[str, pd.DataFrame]:
+    """הסיכומים ישירות משורות הפריטים של flatten_items (ב-benchmark)"""
+    return summarize(items, items, items, categories)
+
+def _reference_summaries(orders: List[Dict[str, Any]], categories: Mapping[str, Sequence[str]]) -> Dict[str, pd.DataFrame]:
+    """המימוש הקודם של דף הניתוח (dict לכל פריט, next() לקטגוריה, apply לחג) - להשוואה בלבד"""
+    rows = []
+    for order in orders:
+        items = order.get('items', {})
+        if not isinstance(items, dict):
+            continue
+        for product, details in items.items():
+            quantity = details.get('quantity', details) if isinstance(details, dict) else details
+            category = next((cat for cat, plist in categories.items() if product in plist), UNKNOWN_CATEGORY)
+            rows.append({
+                'customer': order.get('customer_name', ''),
+                'phone': order.get('phone', ''),
+                'product': product,
+                'category': category,
+                'quantity': quantity,
+                'date': order.get('created_at', '')
+            })
+    df = pd.DataFrame(rows)
+    summaries = {
+        'category': df.groupby('category')['quantity'].sum().reset_index(),
+        'product': df.groupby('product')['quantity'].sum().reset_index(),
+        'customer': df.groupby(['customer', 'phone'])['quantity'].sum().reset_index(),
+    }
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+    df['month'] = df['date'].dt.to_period('M').astype(str)
+    summaries['month'] = df.groupby('month')['quantity'].sum().reset_index()
+
+    def get_holiday_name(date):
+        for name, ranges in HOLIDAYS:
+            for start, end in ranges:
+                if pd.to_datetime(start) <= date <= pd.to_datetime(end):
+                    return name
+        return NO_HOLIDAY
+    df['holiday'] = df['date'].apply(get_holiday_name)
+    summaries['holiday'] = df.groupby('holiday')['quantity'].sum().reset_index()
+    return summaries
+
+SUMMARY_KEYS = {
+    'category': ['category'],
+    'product': ['product'],
+    'customer': ['customer', 'phone'],
+    'month': ['month'],
+    'holiday': ['holiday'],
+}
+
+def _same_totals(expected: pd.DataFrame, actual: pd.DataFrame, keys: List[str]) -> bool:
+    """אותן קבוצות ואותם סכומי כמות (בלי תלות בסדר השורות ובסוג העמודות)"""
+    def totals(frame):
+        return frame.astype({key: str for key in keys}).set_index(keys)['quantity'].sort_index()
+    left, right = totals(expected), totals(actual)
+    return left.index.equals(right.index) and np.allclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float))
+
+def _sample_orders(item_count: int, categories: Mapping[str, Sequence[str]], seed: int = 7) -> List[Dict[str, Any]]:
+    """הזמנות לדוגמה: 1-5 פריטים להזמנה, ימים ב-2023-2025 (חצות - כמו ימי טבלאות הסיכום)"""
+    import random
+    rng = random.Random(seed)
+    catalog = [product for products in categories.values() for product in products] + ['מוצר מיוחד']
+    days = pd.date_range('2023-01-01', '2025-12-31', freq='D').strftime('%Y-%m-%d 00:00:00').tolist()
+    orders = []
+    produced = 0
+    while produced < item_count:
+        customer = rng.randrange(500)
+        items = {}
+        for product in rng.sample(catalog, rng.randint(1, 5)):
+            quantity = rng.choice([1, 2, 3, 0.5, 1.5, 2.5])
+            items[product] = {'quantity': quantity, 'unit': 'יחידות'} if rng.random() < 0.5 else quantity
+        orders.append({
+            'id': len(orders) + 1,
+            'customer_name': f"לקוח {customer}",
+            'phone': f"050{customer:07d}",
+            'customer_id': customer + 1,
+            'items': items,
+            'created_at': rng.choice(days),
+        })
+        produced += len(items)
+    return orders
+
+REFERENCE_SAMPLE_ITEMS = 2000  # המימוש הקודם לוקח כ-10ms לפריט - נמדד רק על מדגם
+
+def _orders_prefix(orders: List[Dict[str, Any]], item_count: int) -> List[Dict[str, Any]]:
+    """ההזמנות הראשונות שמכילות לפחות item_count פריטים"""
+    total = 0
+    for index, order in enumerate(orders):
+        total += len(order['items'])
+        if total >= item_count:
+            return orders[:index + 1]
+    return orders
+
+def benchmark(item_count: int = 120000, reference_items: int = REFERENCE_SAMPLE_ITEMS,
+              categories: Optional[Mapping[str, Sequence[str]]] = None) -> Dict[str, float]:
+    """זמן חישוב הדף: המימוש הקודם (על מדגם), שיטוח + סיכום וקטורי, וסיכום מתוך טבלאות הסיכום
+
+    המימוש הקודם רץ על reference_items הפריטים הראשונים בלבד; הזמן שלו לכל הפריטים
+    מוערך לפי הזמן לפריט. האימות: המימוש הוקטורי זהה לקודם על המדגם, וסיכום מצורת
+    טבלאות הסיכום זהה לוקטורי על כל הפריטים.
+    """
+    categories = categories if categories is not None else _load_app_categories()
+    orders = _sample_orders(item_count, categories)
+    sample = _orders_prefix(orders, reference_items)
+
+    started = time.perf_counter()
+    expected = _reference_summaries(sample, categories)
+    reference_sample_seconds = time.perf_counter() - started
+    sample_items = flatten_items(sample)
+    sample_actual = summarize_items(sample_items, categories)
+
+    started = time.perf_counter()
+    items = flatten_items(orders)
+    flatten_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = summarize_items(items, categories)
+    summarize_seconds = time.perf_counter() - started
+
+    # אותם סיכומים מצורת טבלאות הסיכום (מוצר / לקוח / יום) - מה שהדף מקבל ממסד הנתונים
+    products = items.groupby('product', observed=True)['quantity'].sum().reset_index()
+    customers = items.groupby(['customer', 'phone'], observed=True)['quantity'].sum().reset_index()
+    daily = items.groupby('date')['quantity'].sum().reset_index()
+    started = time.perf_counter()
+    from_rollups = summarize(products, customers, daily, categories)
+    rollup_seconds = time.perf_counter() - started
+
+    # אימות - אותם סכומים בכל המסלולים
+    for name, keys in SUMMARY_KEYS.items():
+        if not _same_totals(expected[name], sample_actual[name], keys):
+            raise AssertionError(f"{name} summary mismatch (flatten_items vs reference)")
+        if not _same_totals(actual[name], from_rollups[name], keys):
+            raise AssertionError(f"{name} summary mismatch (rollups vs flatten_items)")
+
+    vectorized_seconds = flatten_seconds + summarize_seconds
+    reference_seconds = reference_sample_seconds * len(items) / len(sample_items)
+    return {
+        'orders': len(orders),
+        'items': len(items),
+        'reference_items': len(sample_items),
+        'reference_sample_seconds': reference_sample_seconds,
+        'reference_seconds': reference_seconds,
+        'flatten_seconds': flatten_seconds,
+        'summarize_seconds': summarize_seconds,
+        'vectorized_seconds': vectorized_seconds,
+        'rollup_seconds': rollup_seconds,
+        'speedup': reference_seconds / vectorized_seconds if vectorized_seconds else float('inf'),
+    }
+
+def _load_app_categories() -> Dict[str, List[str]]:
+    """קורא את PRODUCT_CATEGORIES מ-app.py בלי לייבא את streamlit"""
+    import ast
+    import os
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == 'PRODUCT_CATEGORIES' for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    return {}
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="זמן חישוב דף הניתוח: לולאות מול פעולות וקטוריות")
+    parser.add_argument("--items", type=int, default=120000)
+    parser.add_argument("--reference-items", type=int, default=REFERENCE_SAMPLE_ITEMS,
+                        help="פריטים למדידת המימוש הקודם (איטי - כ-10ms לפריט)")
+    args = parser.parse_args()
+
+    result = benchmark(args.items, args.reference_items)
+    print(f"הזמנות: {result['orders']}, פריטים: {result['items']}")
+    print(f"מימוש קודם:           {result['reference_seconds']:.3f}s "
+          f"(משוער - נמדד {result['reference_sample_seconds']:.3f}s על {result['reference_items']} פריטים)")
+    print(f"שיטוח + סיכום וקטורי: {result['vectorized_seconds']:.3f}s "
+          f"(שיטוח {result['flatten_seconds']:.3f}s, סיכום {result['summarize_seconds']:.3f}s)")
+    print(f"מטבלאות הסיכום:       {result['rollup_seconds']:.3f}s")
+    print(f"האצה:                 x{result['speedup']:.1f}")
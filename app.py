@@ -12,7 +12,10 @@ from database import (
     load_customers, save_customers, find_or_create_customer, 
     update_customer_stats, cleanup_old_customers, cleanup_old_orders,
     update_order, delete_order, move_order_to_closed, get_next_order_id,
-    import_existing_data
+    import_existing_data, load_orders_cached,
+    ensure_schema, cleanup_change_log, query_closed_orders, count_closed_orders,
+    query_orders, count_orders, get_active_order_item_names, get_rollup_daily_totals,
+    get_rollup_products, get_rollup_customers
 )
 
 # ייבוא קליינט ה-API לסנכרון
@@ -28,6 +31,9 @@ if not os.path.exists('zoares_central.db'):
     init_database()
     import_existing_data()
 
+# עדכון סכמה קיימת (יומן שינויים וטריגרים) - פעם אחת לכל תהליך
+ensure_schema()
+
 # הגדרת כותרת האפליקציה
 st.set_page_config(
     page_title="מערכת ניהול הזמנות",
@@ -42,6 +48,8 @@ st.set_page_config(
 # הגדרות שמירה
 ACTIVE_ORDER_RETENTION_DAYS = 20  # ימי עסקים להזמנות פעילות
 CLOSED_ORDER_RETENTION_DAYS = 1825  # 5 שנים להזמנות סגורות
+CLOSED_ORDERS_PAGE_SIZE = 50  # הזמנות סגורות לעמוד
+ACTIVE_ORDERS_PAGE_SIZE = 50  # הזמנות פעילות לעמוד
 
 # רשימת מוצרים מאורגנת לפי קטגוריות
 PRODUCT_CATEGORIES = {
@@ -651,6 +659,7 @@ def main():
         active_removed, closed_removed = cleanup_old_orders()
         if active_removed > 0 or closed_removed > 0:
             st.info(f"🔧 ניקוי אוטומטי: {active_removed} הזמנות פעילות ו-{closed_removed} הזמנות סגורות הועברו/נמחקו")
+        cleanup_change_log()
         st.session_state.cleanup_done = True
     
     # ניקוי לקוחות ישנים
@@ -660,14 +669,10 @@ def main():
     if API_AVAILABLE:
         try:
             api_client = create_api_client()
-            auto_refresh_on_updates(api_client, refresh_interval=30)  # בדיקה כל 30 שניות
+            auto_refresh_on_updates(api_client, refresh_interval=30, entity_types=["order", "customer"])
         except Exception as e:
             st.sidebar.warning(f"⚠️ בעיה בסנכרון: {str(e)}")
     
-    # טעינת הזמנות
-    orders = load_orders()
-    closed_orders = load_closed_orders()
-    
     # סיידבר לניווט
     st.sidebar.title("ניווט")
     
@@ -694,27 +699,29 @@ def main():
     next_order_id = get_next_order_id()
     st.sidebar.markdown("---")
     st.sidebar.info(f"מספר הזמנה הבא: #{next_order_id}")
-    st.sidebar.info(f"הזמנות פעילות: {len(orders)}")
-    st.sidebar.info(f"הזמנות סגורות: {len(closed_orders)}")
+    # ספירות בלבד - ההזמנות עצמן נטענות רק בעמודים שצריכים אותן
+    st.sidebar.info(f"הזמנות פעילות: {count_orders()['total']}")
+    st.sidebar.info(f"הזמנות סגורות: {count_closed_orders()['total']}")
     
     if page == "הזמנות פעילות":
-        show_active_orders_page(orders)
+        show_active_orders_page()
     elif page == "הזמנות סגורות":
-        show_closed_orders_page(closed_orders)
+        show_closed_orders_page()
     elif page == "הוספת הזמנה":
-        show_add_order_page(orders)
+        show_add_order_page()
     elif page == "עריכת הזמנות":
-        show_edit_orders_page(orders)
+        # מטמון משותף - שאילתה רק אם מסד הנתונים השתנה
+        show_edit_orders_page(load_orders_cached())
     elif page == "ניתוח נתונים":
-        show_analytics_page(orders, closed_orders)
+        show_analytics_page()
     elif page == "ניהול לקוחות":
         show_customers_page()
     elif page == "ניתוח מתקדם":
-        show_enhanced_analytics_page(orders, closed_orders)
+        show_enhanced_analytics_page()
     elif page == "תחזוקת מסד הנתונים":
         show_database_maintenance()
 
-def show_active_orders_page(orders):
+def show_active_orders_page():
     """מציג את דף ההזמנות הפעילות"""
     st.header("📋 הזמנות פעילות")
     
@@ -763,27 +770,6 @@ def show_active_orders_page(orders):
         show_order_details(selected_order)
         return
     
-    if not orders:
-        st.info("אין הזמנות עדיין. הוסף הזמנה חדשה!")
-        return
-    
-    # המרה ל-DataFrame
-    df = pd.DataFrame(orders)
-    
-    # הוספת קטגוריה ברירת מחדל להזמנות ישנות
-    if 'category' not in df.columns:
-        df['category'] = 'עופות'  # ברירת מחדל להזמנות ישנות
-    
-    # הוספת עמודות חסרות להזמנות לקוחות
-    if 'phone' not in df.columns:
-        df['phone'] = ''
-    if 'address' not in df.columns:
-        df['address'] = '{}'
-    if 'delivery_notes' not in df.columns:
-        df['delivery_notes'] = ''
-    if 'items' not in df.columns:
-        df['items'] = '{}'
-    
     # אפשרויות סינון
     st.subheader("🔍 סינון הזמנות")
     col1, col2, col3, col4 = st.columns(4)
@@ -799,10 +785,7 @@ def show_active_orders_page(orders):
             category_products = ["כל המוצרים"] + PRODUCT_CATEGORIES[selected_category]
             selected_product = st.selectbox("סינון לפי מוצר:", category_products)
         else:
-            if 'product' in df.columns:
-                all_products = ["כל המוצרים"] + list(df['product'].dropna().unique())
-            else:
-                all_products = ["כל המוצרים"]
+            all_products = ["כל המוצרים"] + get_active_order_item_names()
             selected_product = st.selectbox("סינון לפי מוצר:", all_products)
     
     with col3:
@@ -821,38 +804,35 @@ def show_active_orders_page(orders):
         # חיפוש לפי שם לקוח
         search_customer = st.text_input("חיפוש לפי שם לקוח:", "")
     
-    # החלת הסינונים
-    filtered_df = df.copy()
-    
+    # הסינונים מבוצעים במסד הנתונים - קטגוריה = הזמנות שמכילות לפחות מוצר אחד ממנה
+    filters = {
+        'status': selected_status if selected_status != "כל הסטטוסים" else None,
+        'customer': search_customer.strip() or None,
+        'item': selected_product if selected_product != "כל המוצרים" else None
+    }
     if selected_category != "כל הקטגוריות":
-        filtered_df = filtered_df[filtered_df['category'] == selected_category]
+        filters['any_item'] = PRODUCT_CATEGORIES[selected_category]
     
-    if selected_product != "כל המוצרים":
-        filtered_df = filtered_df[filtered_df['product'] == selected_product]
+    # מספר העמוד מתאפס כשהסינון משתנה
+    filters_key = (selected_category, selected_product, selected_status, search_customer)
+    if st.session_state.get('active_filters_key') != filters_key:
+        st.session_state.active_filters_key = filters_key
+        st.session_state.active_orders_page = 1
     
-    if selected_status != "כל הסטטוסים":
-        filtered_df = filtered_df[filtered_df['status'] == selected_status]
+    result = query_orders(filters, page=st.session_state.active_orders_page, page_size=ACTIVE_ORDERS_PAGE_SIZE)
+    page_orders = result['orders']
+    status_counts = result['status_counts']
     
-    if search_customer:
-        filtered_df = filtered_df[filtered_df['customer_name'].str.contains(search_customer, case=False, na=False)]
+    if result['total'] == 0 and not any(filters.values()):
+        st.info("אין הזמנות עדיין. הוסף הזמנה חדשה!")
+        return
     
     # הצגת הנתונים המסוננים
-    st.subheader(f"📊 תוצאות ({len(filtered_df)} הזמנות)")
+    st.subheader(f"📊 תוצאות ({result['total']} הזמנות)")
     
-    if len(filtered_df) > 0:
-        # יצירת עמודות מותאמות לסוגי הזמנות שונים
-        display_columns = ["id", "customer_name", "category", "product", "quantity", "price", "status", "created_at"]
-        
-        # הוספת עמודות נוספות אם קיימות
-        if 'phone' in filtered_df.columns:
-            display_columns.append("phone")
-        if 'address' in filtered_df.columns:
-            display_columns.append("address")
-        
+    if len(page_orders) > 0:
         # הצגת הטבלה עם כפתורים ללחיצה על שם הלקוח
-        for idx, row in filtered_df.iterrows():
-            order = row.to_dict()
-            
+        for idx, order in enumerate(page_orders):
             # יצירת כרטיס הזמנה
             with st.container():
                 col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([1, 2, 1, 1, 1, 1, 1, 1])
@@ -953,30 +933,49 @@ def show_active_orders_page(orders):
                         st.rerun()
                 
                 st.markdown("---")
+        
+        # ניווט בין עמודים
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if result['page'] > 1 and st.button("➡️ הקודם", key="active_prev_page"):
+                st.session_state.active_orders_page = result['page'] - 1
+                st.rerun()
+        with col2:
+            st.caption(f"עמוד {result['page']} מתוך {result['pages']}")
+        with col3:
+            if result['page'] < result['pages'] and st.button("הבא ⬅️", key="active_next_page"):
+                st.session_state.active_orders_page = result['page'] + 1
+                st.rerun()
     else:
         st.warning("לא נמצאו הזמנות לפי הסינונים שנבחרו")
     
     # סטטיסטיקות מהירות
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("סה״כ הזמנות", len(filtered_df))
+        st.metric("סה״כ הזמנות", result['total'])
     with col2:
-        # חישוב סה"כ ערך - התאמה לסוגי הזמנות שונים
-        total_value = 0
-        for _, row in filtered_df.iterrows():
-            if 'total_amount' in row and pd.notna(row['total_amount']):
-                total_value += row['total_amount']
-            elif 'price' in row and 'quantity' in row and pd.notna(row['price']) and pd.notna(row['quantity']):
-                total_value += row['price'] * row['quantity']
         st.metric("ערך כולל (מוסתר)", "מוסתר בשלב זה")
     with col3:
-        pending_orders = len([o for o in filtered_df.to_dict('records') if o['status'] == 'pending'])
-        st.metric("הזמנות ממתינות", pending_orders)
+        st.metric("הזמנות ממתינות", status_counts.get('pending', 0))
     with col4:
-        completed_orders = len([o for o in filtered_df.to_dict('records') if o['status'] == 'completed'])
-        st.metric("הזמנות הושלמו", completed_orders)
+        st.metric("הזמנות הושלמו", status_counts.get('completed', 0))
 
-def show_closed_orders_page(closed_orders):
+def get_closed_date_range(date_filter):
+    """ממיר בחירת תאריך לטווח [מ, עד) של closed_at בפורמט מסד הנתונים"""
+    fmt = '%Y-%m-%d %H:%M:%S'
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if date_filter == "היום":
+        return today_start.strftime(fmt), (today_start + timedelta(days=1)).strftime(fmt)
+    elif date_filter == "אתמול":
+        return (today_start - timedelta(days=1)).strftime(fmt), today_start.strftime(fmt)
+    elif date_filter == "השבוע":
+        return (now - timedelta(days=7)).strftime(fmt), None
+    elif date_filter == "החודש":
+        return (now - timedelta(days=30)).strftime(fmt), None
+    return None, None
+
+def show_closed_orders_page():
     """מציג את דף ההזמנות הסגורות"""
     st.header("📋 הזמנות סגורות")
     
@@ -988,25 +987,6 @@ def show_closed_orders_page(closed_orders):
     
     st.info(f"הזמנות סגורות נשמרות עד {CLOSED_ORDER_RETENTION_DAYS} ימי עסקים")
     
-    if not closed_orders:
-        st.info("אין הזמנות סגורות")
-        return
-    
-    # המרה ל-DataFrame
-    df = pd.DataFrame(closed_orders)
-    
-    # הוספת עמודות חסרות
-    if 'phone' not in df.columns:
-        df['phone'] = ''
-    if 'address' not in df.columns:
-        df['address'] = '{}'
-    if 'delivery_notes' not in df.columns:
-        df['delivery_notes'] = ''
-    if 'items' not in df.columns:
-        df['items'] = '{}'
-    if 'closed_at' not in df.columns:
-        df['closed_at'] = df['created_at']
-    
     # אפשרויות סינון
     st.subheader("🔍 סינון הזמנות סגורות")
     col1, col2, col3 = st.columns(3)
@@ -1031,37 +1011,36 @@ def show_closed_orders_page(closed_orders):
         # סינון לפי תאריך סגירה
         date_filter = st.selectbox("סינון לפי תאריך:", ["כל התאריכים", "היום", "אתמול", "השבוע", "החודש"], key="closed_date_filter")
     
-    # החלת הסינונים
-    filtered_df = df.copy()
-    
-    if selected_status != "כל הסטטוסים":
-        filtered_df = filtered_df[filtered_df['status'] == selected_status]
-    
-    if search_customer:
-        filtered_df = filtered_df[filtered_df['customer_name'].str.contains(search_customer, case=False, na=False)]
-    
-    # סינון לפי תאריך
-    if date_filter != "כל התאריכים":
-        today = datetime.now()
-        if date_filter == "היום":
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['closed_at']).dt.date == today.date()]
-        elif date_filter == "אתמול":
-            yesterday = today - timedelta(days=1)
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['closed_at']).dt.date == yesterday.date()]
-        elif date_filter == "השבוע":
-            week_ago = today - timedelta(days=7)
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['closed_at']) >= week_ago]
-        elif date_filter == "החודש":
-            month_ago = today - timedelta(days=30)
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['closed_at']) >= month_ago]
+    # הסינונים מבוצעים במסד הנתונים
+    date_from, date_to = get_closed_date_range(date_filter)
+    filters = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'status': selected_status if selected_status != "כל הסטטוסים" else None,
+        'customer': search_customer.strip() or None
+    }
+    
+    # דפדוף לפי סמן - מתאפס כשהסינון משתנה
+    filters_key = (selected_status, search_customer, date_filter)
+    if st.session_state.get('closed_filters_key') != filters_key:
+        st.session_state.closed_filters_key = filters_key
+        st.session_state.closed_page_cursors = [None]
+    cursors = st.session_state.closed_page_cursors
+    
+    counts = count_closed_orders(**filters)
+    page = query_closed_orders(**filters, after=cursors[-1], page_size=CLOSED_ORDERS_PAGE_SIZE)
+    page_orders = page['orders']
+    
+    if counts['total'] == 0 and not any(filters.values()):
+        st.info("אין הזמנות סגורות")
+        return
     
     # הצגת הנתונים המסוננים
-    st.subheader(f"📊 תוצאות ({len(filtered_df)} הזמנות סגורות)")
+    st.subheader(f"📊 תוצאות ({counts['total']} הזמנות סגורות)")
     
-    if len(filtered_df) > 0:
+    if len(page_orders) > 0:
         # הצגת הטבלה עם כפתורים ללחיצה על שם הלקוח
-        for idx, row in filtered_df.iterrows():
-            order = row.to_dict()
+        for idx, order in enumerate(page_orders):
             # יצירת כרטיס הזמנה
             with st.container():
                 col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([1, 2, 1, 1, 1, 1, 1, 1])
@@ -1163,28 +1142,32 @@ def show_closed_orders_page(closed_orders):
                             st.warning("אין טלפון")
                 
                 st.markdown("---")
+        
+        # ניווט בין עמודים
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if len(cursors) > 1 and st.button("➡️ הקודם", key="closed_prev_page"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            st.caption(f"עמוד {len(cursors)}")
+        with col3:
+            if page['next_cursor'] is not None and st.button("הבא ⬅️", key="closed_next_page"):
+                cursors.append(page['next_cursor'])
+                st.rerun()
     else:
         st.warning("לא נמצאו הזמנות סגורות לפי הסינונים שנבחרו")
     
     # סטטיסטיקות מהירות
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("סה״כ הזמנות סגורות", len(filtered_df))
+        st.metric("סה״כ הזמנות סגורות", counts['total'])
     with col2:
-        # חישוב סה"כ ערך
-        total_value = 0
-        for _, row in filtered_df.iterrows():
-            if 'total_amount' in row and pd.notna(row['total_amount']):
-                total_value += row['total_amount']
-            elif 'price' in row and 'quantity' in row and pd.notna(row['price']) and pd.notna(row['quantity']):
-                total_value += row['price'] * row['quantity']
         st.metric("ערך כולל (מוסתר)", "מוסתר בשלב זה")
     with col3:
-        completed_orders = len([o for o in filtered_df.to_dict('records') if o['status'] == 'completed'])
-        st.metric("הזמנות שהושלמו", completed_orders)
+        st.metric("הזמנות שהושלמו", counts.get('completed', 0))
     with col4:
-        cancelled_orders = len([o for o in filtered_df.to_dict('records') if o['status'] == 'cancelled'])
-        st.metric("הזמנות שבוטלו", cancelled_orders)
+        st.metric("הזמנות שבוטלו", counts.get('cancelled', 0))
     
     # בדיקה אם נבחרה הזמנה סגורה לצפייה
     if 'selected_closed_order' in st.session_state and st.session_state.selected_closed_order:
@@ -1353,7 +1336,7 @@ def show_closed_order_details(order):
     
     st.markdown("---")
 
-def show_add_order_page(orders):
+def show_add_order_page():
     """מציג את דף הוספת הזמנה חדשה"""
     st.header("➕ הוספת הזמנה חדשה")
     
@@ -1495,7 +1478,8 @@ def show_edit_orders_page(orders):
     selected_order_key = st.selectbox("בחר הזמנה לעריכה:", list(order_options.keys()))
     
     if selected_order_key:
-        selected_order = order_options[selected_order_key]
+        # השורות מהמטמון לקריאה בלבד - עותק למילון רק להזמנה שנערכת
+        selected_order = order_options[selected_order_key].to_dict()
         
         # בדיקה אם זו הזמנת לקוח או הזמנה רגילה
         is_customer_order = ('items' in selected_order and 
@@ -1702,10 +1686,11 @@ def show_edit_orders_page(orders):
                         st.success("ההזמנה נמחקה בהצלחה!")
                         st.rerun()
 
-def show_analytics_page(orders, closed_orders):
+def show_analytics_page():
     import pandas as pd
     import streamlit as st
     import matplotlib.pyplot as plt
+    from analytics import summarize
 
     st.header("📊 ניתוח סטטיסטי של הזמנות")
     
@@ -1715,36 +1700,21 @@ def show_analytics_page(orders, closed_orders):
         if st.button("🔄 רענן נתונים", type="secondary"):
             st.rerun()
 
-    # איסוף כל ההזמנות (פעילות וסגורות)
-    all_orders = (orders or []) + (closed_orders or [])
-    rows = []
-    for order in all_orders:
-        customer = order.get('customer_name', '')
-        phone = order.get('phone', '')
-        items = order.get('items', {})
-        if not isinstance(items, dict):
-            continue  # דלג על הזמנות לא תקינות
-        for product, details in items.items():
-            # תמיכה במבנה בו הפריט הוא dict עם מפתח quantity או מספר ישיר
-            quantity = details.get('quantity', details) if isinstance(details, dict) else details
-            # מצא קטגוריה
-            category = next((cat for cat, plist in PRODUCT_CATEGORIES.items() if product in plist), 'לא ידוע')
-            rows.append({
-                'customer': customer,
-                'phone': phone,
-                'product': product,
-                'category': category,
-                'quantity': quantity,
-                'date': order.get('created_at', '')
-            })
-    if not rows:
+    # טבלאות הסיכום (הזמנות פעילות וסגורות) - בלי לטעון את ההזמנות עצמן
+    products = pd.DataFrame(get_rollup_products(), columns=['product', 'quantity', 'orders', 'customers'])
+    if products.empty:
         st.info("אין נתונים לניתוח.")
         return
-    df = pd.DataFrame(rows)
+    customers = pd.DataFrame(get_rollup_customers(),
+                             columns=['customer', 'phone', 'customer_id', 'orders', 'quantity', 'revenue'])
+    daily = pd.DataFrame(get_rollup_daily_totals(), columns=['day', 'orders', 'quantity', 'revenue'])
+    # ימים עם תאריך לא תקין נשמרים בסיכום עם day ריק - לא נספרים בחודשים ובחגים
+    daily['date'] = pd.to_datetime(daily['day'], errors='coerce')
+    summaries = summarize(products, customers, daily, PRODUCT_CATEGORIES)
 
     # סיכום לפי קטגוריה
     st.subheader("סיכום כמויות לפי קטגוריה")
-    cat_sum = df.groupby('category')['quantity'].sum().reset_index().sort_values('quantity', ascending=False)
+    cat_sum = summaries['category']
     # הוספת עמודת יחידות
     cat_sum['יחידות'] = cat_sum['category'].apply(lambda x: "ק\"ג" if x in ["עופות", "בשר"] else "יחידות")
     st.dataframe(cat_sum)
@@ -1752,7 +1722,7 @@ def show_analytics_page(orders, closed_orders):
 
     # סיכום לפי פריט
     st.subheader("סיכום כמויות לפי פריט")
-    prod_sum = df.groupby('product')['quantity'].sum().reset_index().sort_values('quantity', ascending=False)
+    prod_sum = summaries['product']
     # הוספת עמודת יחידות
     prod_sum['יחידות'] = prod_sum['product'].apply(lambda x: get_product_unit(x))
     st.dataframe(prod_sum)
@@ -1760,20 +1730,15 @@ def show_analytics_page(orders, closed_orders):
 
     # סיכום לפי לקוח
     st.subheader("סיכום כמויות לפי לקוח")
-    cust_sum = df.groupby(['customer', 'phone'])['quantity'].sum().reset_index().sort_values('quantity', ascending=False)
+    cust_sum = summaries['customer']
     # הוספת עמודת יחידות (ברירת מחדל ליחידות)
     cust_sum['יחידות'] = "יחידות"
     st.dataframe(cust_sum)
     st.bar_chart(cust_sum.set_index('customer'))
 
-    # המרת עמודת תאריך
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df = df.dropna(subset=['date'])
-
     # פילוח לפי חודשים
     st.subheader("פילוח הזמנות לפי חודשים")
-    df['month'] = df['date'].dt.to_period('M').astype(str)
-    month_sum = df.groupby('month')['quantity'].sum().reset_index().sort_values('month')
+    month_sum = summaries['month']
     # הוספת עמודת יחידות (ברירת מחדל ליחידות)
     month_sum['יחידות'] = "יחידות"
     st.dataframe(month_sum)
@@ -1781,23 +1746,8 @@ def show_analytics_page(orders, closed_orders):
 
     # פילוח לפי חגי ישראל
     st.subheader("פילוח הזמנות לפי חגי ישראל")
-    # טווחי חגים (דוגמה לשנים 2023-2025, אפשר להרחיב)
-    holidays = [
-        ("פסח",    [("2023-04-05", "2023-04-13"), ("2024-04-22", "2024-04-30"), ("2025-04-12", "2025-04-20")]),
-        ("שבועות",  [("2023-05-25", "2023-05-27"), ("2024-06-11", "2024-06-13"), ("2025-06-01", "2025-06-03")]),
-        ("ראש השנה",[("2023-09-15", "2023-09-17"), ("2024-10-02", "2024-10-04"), ("2025-09-22", "2025-09-24")]),
-        ("סוכות",   [("2023-09-29", "2023-10-07"), ("2024-10-16", "2024-10-24"), ("2025-10-03", "2025-10-11")]),
-        ("חנוכה",  [("2023-12-07", "2023-12-15"), ("2024-12-25", "2025-01-02"), ("2025-12-14", "2025-12-22")]),
-        ("פורים",  [("2023-03-06", "2023-03-08"), ("2024-03-24", "2024-03-26"), ("2025-03-14", "2025-03-16")]),
-    ]
-    def get_holiday_name(date):
-        for name, ranges in holidays:
-            for start, end in ranges:
-                if pd.to_datetime(start) <= date <= pd.to_datetime(end):
-                    return name
-        return "לא חג"
-    df['holiday'] = df['date'].apply(get_holiday_name)
-    holiday_sum = df.groupby('holiday')['quantity'].sum().reset_index().sort_values('quantity', ascending=False)
+    # טווחי החגים מוגדרים ב-analytics.HOLIDAYS
+    holiday_sum = summaries['holiday']
     # הוספת עמודת יחידות (ברירת מחדל ליחידות)
     holiday_sum['יחידות'] = "יחידות"
     st.dataframe(holiday_sum)
@@ -1861,8 +1811,8 @@ def show_customers_page():
         mime="text/csv"
     )
 
-def show_enhanced_analytics_page(orders, closed_orders):
-    """מציג דף ניתוח מתקדם עם נתוני לקוחות"""
+def show_enhanced_analytics_page():
+    """מציג דף ניתוח מתקדם עם נתוני לקוחות (מטבלאות הסיכום)"""
     st.header("📊 ניתוח מתקדם")
     
     # כפתור רענן
@@ -1872,7 +1822,6 @@ def show_enhanced_analytics_page(orders, closed_orders):
             st.rerun()
     
     customers = load_customers()
-    all_orders = (orders or []) + (closed_orders or [])
     
     # ניתוח לקוחות
     if customers:
@@ -1880,12 +1829,9 @@ def show_enhanced_analytics_page(orders, closed_orders):
         
         # לקוחות לפי כמות הזמנות
         customer_orders = {}
-        for order in all_orders:
-            if 'customer_id' in order:
-                customer_id = order['customer_id']
-                if customer_id not in customer_orders:
-                    customer_orders[customer_id] = 0
-                customer_orders[customer_id] += 1
+        for row in get_rollup_customers():
+            if row['customer_id'] is not None:
+                customer_orders[row['customer_id']] = customer_orders.get(row['customer_id'], 0) + row['orders']
         
         if customer_orders:
             # גרף לקוחות לפי כמות הזמנות
@@ -1912,33 +1858,17 @@ def show_enhanced_analytics_page(orders, closed_orders):
     # ניתוח מוצרים עם קישור ללקוחות
     st.subheader("🛒 ניתוח מוצרים")
     
-    product_stats = {}
-    for order in all_orders:
-        for product, details in order.get('items', {}).items():
-            quantity = details.get('quantity', details) if isinstance(details, dict) else details
-            if product not in product_stats:
-                product_stats[product] = {
-                    'total_quantity': 0,
-                    'total_orders': 0,
-                    'customers': set()
-                }
-            try:
-                product_stats[product]['total_quantity'] += float(quantity)
-            except Exception:
-                continue
-            product_stats[product]['total_orders'] += 1
-            if 'customer_id' in order:
-                product_stats[product]['customers'].add(order['customer_id'])
+    product_stats = get_rollup_products()  # ממוין לפי כמות כוללת
     
     if product_stats:
         # טבלת מוצרים פופולריים
         product_data = []
-        for product, stats in sorted(product_stats.items(), key=lambda x: x[1]['total_quantity'], reverse=True):
+        for stats in product_stats:
             product_data.append({
-                'מוצר': product,
-                'כמות כוללת': f"{stats['total_quantity']} {get_product_unit(product)}",
-                'כמות הזמנות': stats['total_orders'],
-                'לקוחות ייחודיים': len(stats['customers'])
+                'מוצר': stats['product'],
+                'כמות כוללת': f"{stats['quantity']} {get_product_unit(stats['product'])}",
+                'כמות הזמנות': stats['orders'],
+                'לקוחות ייחודיים': stats['customers']
             })
         
         df_products = pd.DataFrame(product_data)
@@ -1947,19 +1877,15 @@ def show_enhanced_analytics_page(orders, closed_orders):
     # ניתוח זמנים
     st.subheader("📅 ניתוח זמנים")
     
-    if all_orders:
+    daily_totals = get_rollup_daily_totals()
+    if daily_totals:
         # הזמנות לפי חודש
         monthly_orders = {}
-        for order in all_orders:
-            if 'created_at' in order:
-                try:
-                    order_date = datetime.strptime(order['created_at'], '%Y-%m-%d %H:%M:%S')
-                    month_key = order_date.strftime('%Y-%m')
-                    if month_key not in monthly_orders:
-                        monthly_orders[month_key] = 0
-                    monthly_orders[month_key] += 1
-                except:
-                    continue
+        for row in daily_totals:
+            if not row['day']:
+                continue  # תאריך לא תקין
+            month_key = row['day'][:7]
+            monthly_orders[month_key] = monthly_orders.get(month_key, 0) + row['orders']
         
         if monthly_orders:
             fig, ax = plt.subplots(figsize=(12, 6))
@@ -2012,6 +1938,15 @@ def show_database_maintenance():
             except Exception as e:
                 st.error(f"שגיאה בניקוי הזמנות: {str(e)}")
         
+        # בנייה מחדש של טבלאות הסיכום לדפי הניתוח
+        if st.button("📊 בנה מחדש טבלאות סיכום", type="secondary"):
+            try:
+                from database import rebuild_rollups
+                rebuild_rollups()
+                st.success("טבלאות הסיכום נבנו מחדש מכל ההזמנות")
+            except Exception as e:
+                st.error(f"שגיאה בבניית טבלאות הסיכום: {str(e)}")
+        
         # ניקוי לקוחות ישנים
         if st.button("👥 נקה לקוחות ישנים", type="secondary"):
             try:
@@ -2025,39 +1960,86 @@ def show_database_maintenance():
         st.subheader("📈 מידע על מסד הנתונים")
         
         try:
-            from database import get_next_order_id, get_db_connection
-            import sqlite3
-            
+            from database import get_next_order_id, read_connection, get_pool_stats, get_cache_stats
+
             # מידע על מונה ההזמנות
             next_id = get_next_order_id()
             st.metric("מספר הזמנה הבא", next_id)
-            
+
             # מידע על הטבלאות
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # ספירת הזמנות פעילות
-            cursor.execute('SELECT COUNT(*) FROM orders')
-            active_count = cursor.fetchone()[0]
-            st.metric("הזמנות פעילות", active_count)
-            
-            # ספירת הזמנות סגורות
-            cursor.execute('SELECT COUNT(*) FROM closed_orders')
-            closed_count = cursor.fetchone()[0]
-            st.metric("הזמנות סגורות", closed_count)
-            
-            # ספירת לקוחות
-            cursor.execute('SELECT COUNT(*) FROM customers')
-            customers_count = cursor.fetchone()[0]
-            st.metric("לקוחות", customers_count)
-            
-            # גודל מסד הנתונים
-            cursor.execute('SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()')
-            db_size = cursor.fetchone()[0]
-            st.metric("גודל מסד הנתונים", f"{db_size / 1024:.1f} KB")
-            
-            conn.close()
-            
+            with read_connection() as conn:
+                cursor = conn.cursor()
+
+                # ספירת הזמנות פעילות
+                cursor.execute('SELECT COUNT(*) FROM orders')
+                active_count = cursor.fetchone()[0]
+                st.metric("הזמנות פעילות", active_count)
+
+                # ספירת הזמנות סגורות
+                cursor.execute('SELECT COUNT(*) FROM closed_orders')
+                closed_count = cursor.fetchone()[0]
+                st.metric("הזמנות סגורות", closed_count)
+
+                # ספירת לקוחות
+                cursor.execute('SELECT COUNT(*) FROM customers')
+                customers_count = cursor.fetchone()[0]
+                st.metric("לקוחות", customers_count)
+
+                # גודל מסד הנתונים
+                cursor.execute('SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()')
+                db_size = cursor.fetchone()[0]
+                st.metric("גודל מסד הנתונים", f"{db_size / 1024:.1f} KB")
+
+            # סטטיסטיקות מאגר החיבורים
+            pool_stats = get_pool_stats()
+            with st.expander("🔌 מאגר חיבורים"):
+                st.write(f"חיבורי קריאה פתוחים: {pool_stats['open_readers']} / {pool_stats['max_readers']} "
+                         f"(בשימוש: {pool_stats['readers_in_use']})")
+                st.write(f"שליפות קריאה: {pool_stats['read_checkouts']} (המתנות: {pool_stats['read_waits']})")
+                st.write(f"שליפות כתיבה: {pool_stats['write_checkouts']}")
+                st.write(f"חיבורים שנפתחו: {pool_stats['connections_created']}")
+
+            # סטטיסטיקות מטמון הטעינות
+            cache_stats = get_cache_stats()
+            with st.expander("⚡ מטמון טעינות"):
+                st.write(f"פגיעות: {cache_stats['hits']} | החטאות: {cache_stats['misses']}")
+                st.write(f"זמן טעינה מצטבר: {cache_stats['load_seconds']:.2f} שניות")
+
+            # מדדי תקשורת עם שרת ה-API
+            if API_AVAILABLE:
+                api_client = create_api_client()
+                health = api_client.get_health_state()
+                with st.expander("🌐 תקשורת עם השרת"):
+                    st.write(f"מחובר: {'כן' if health['healthy'] else 'לא'} | מפסק זרם: {health['circuit_state']}")
+                    for endpoint, metrics in sorted(api_client.get_transport_metrics().items()):
+                        st.write(
+                            f"`{endpoint}` - בקשות: {metrics['requests']}, שגיאות: {metrics['errors']}, "
+                            f"ניסיונות חוזרים: {metrics['retries']}, ממוצע: {metrics['avg_seconds'] * 1000:.0f}ms"
+                        )
+
+                # נתוני השרת - ארבע הקריאות נשלחות במקביל (fetch_dashboard) ולא בזו אחר זו
+                if st.button("📡 טען נתוני שרת", type="secondary"):
+                    dashboard = api_client.fetch_dashboard()
+                    with st.expander("📡 נתוני השרת", expanded=True):
+                        order_stats = dashboard['order_stats']
+                        if order_stats.ok and order_stats.value:
+                            st.write(f"הזמנות בשרת: {order_stats.value.get('total_orders', 0)} | "
+                                     f"היום: {order_stats.value.get('today', {}).get('orders', 0)} "
+                                     f"(₪{order_stats.value.get('today', {}).get('revenue', 0):,.0f})")
+                        customer_stats = dashboard['customer_stats']
+                        if customer_stats.ok and customer_stats.value:
+                            st.write(f"לקוחות בשרת: {customer_stats.value.get('total_customers', 0)} "
+                                     f"(פעילים: {customer_stats.value.get('active_customers', 0)})")
+                        if dashboard['orders'].ok:
+                            st.write(f"הזמנות אחרונות שנטענו: {len(dashboard['orders'].value or [])}")
+                        if dashboard['events'].ok:
+                            st.write(f"אירועי מערכת ב-24 השעות האחרונות: {len(dashboard['events'].value or [])}")
+                        for result in dashboard.values():
+                            if result.ok:
+                                st.caption(f"`{result.name}` - {result.seconds * 1000:.0f}ms")
+                            else:
+                                st.caption(f"`{result.name}` - שגיאה: {result.error}")
+
         except Exception as e:
             st.error(f"שגיאה בקבלת מידע על מסד הנתונים: {str(e)}")
     
@@ -1,25 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
+import functools
 import json
 import asyncio
+import os
 import time
 from datetime import datetime
 
-from database import get_db, create_tables, Customer, Order, Product, SystemEvent
+from database import get_db, create_tables, SessionLocal, Customer, Order, Product, SystemEvent
 from models import (
     CustomerCreate, CustomerUpdate, CustomerResponse,
     OrderCreate, OrderUpdate, OrderResponse,
     ProductCreate, ProductUpdate, ProductResponse,
+    OrderBatchCreate, OrderBatchItemResult, OrderBatchResponse,
     SearchRequest, SearchResponse, APIResponse,
     PaginationParams, PaginatedResponse
 )
 from services import (
     CustomerService, OrderService, ProductService, 
-    SearchService, SystemEventService
+    SearchService, SystemEventService, StatsService, product_catalog,
+    event_broadcaster, event_writer, event_to_dict, format_sse,
+    EVENT_RETENTION_DAYS
 )
+from notify import worker_notifier
 
 # Create FastAPI app
 app = FastAPI(
@@ -39,11 +47,87 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Database access mode for endpoints (API_DB_MODE):
+#   "threadpool" - endpoints are sync and run in the worker threadpool, so a slow
+#                  query does not hold the event loop (it still competes for the GIL)
+#   "inline"     - legacy behaviour: queries run directly on the event loop
+API_DB_MODE = os.getenv("API_DB_MODE", "threadpool").lower()
+# Concurrent DB-bound requests per worker. Threads beyond the SQLAlchemy pool
+# (5 + 10 overflow) wait for a connection, and SQLite serializes writers anyway.
+API_DB_THREADS = int(os.getenv("API_DB_THREADS", "40"))
+
+def db_endpoint(func):
+    """מריץ endpoint שניגש למסד הנתונים לפי API_DB_MODE"""
+    if API_DB_MODE == "threadpool":
+        # FastAPI runs plain (non-async) endpoints and their dependencies in the threadpool
+        return func
+    
+    @functools.wraps(func)
+    async def inline(*args, **kwargs):
+        return func(*args, **kwargs)
+    return inline
+
+# Server-Sent Events stream settings
+STREAM_BATCH_SIZE = 100  # events per query while replaying after a reconnect
+STREAM_HEARTBEAT_SECONDS = 20  # idle seconds between heartbeat comments
+# Ids below Last-Event-ID replayed again on reconnect: events from other workers can be
+# published out of id order, so a lower id may arrive after the client disconnected.
+# Clients de-duplicate by event id.
+STREAM_REPLAY_WINDOW = 100
+
+# System events retention job
+EVENT_RETENTION_INTERVAL_SECONDS = 6 * 3600
+EVENT_ARCHIVE_PATH = os.getenv("EVENT_ARCHIVE_PATH")  # JSON Lines archive of pruned events (optional)
+
 # Initialize database tables
 @app.on_event("startup")
 async def startup_event():
     create_tables()
     print("Database tables initialized successfully!")
+    await run_in_threadpool(_ensure_stats_counters)
+    if API_DB_MODE == "threadpool":
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = API_DB_THREADS
+    print(f"Database access mode: {API_DB_MODE}")
+    # Events committed by other workers are fanned out to this worker's stream subscribers
+    worker_notifier.start(event_broadcaster.publish)
+    asyncio.create_task(event_retention_loop())
+
+async def event_retention_loop():
+    """ניקוי תקופתי של אירועי מערכת ישנים (במנות, ב-threadpool)"""
+    while True:
+        try:
+            removed = await run_in_threadpool(_prune_events)
+            if removed:
+                print(f"Event retention: removed {removed} events older than {EVENT_RETENTION_DAYS} days")
+        except Exception as e:
+            print(f"ERROR in event retention: {str(e)}")
+        await asyncio.sleep(EVENT_RETENTION_INTERVAL_SECONDS)
+
+def _ensure_stats_counters():
+    db = SessionLocal()
+    try:
+        StatsService.ensure(db)
+    finally:
+        db.close()
+
+@app.post("/stats/rebuild")
+@db_endpoint
+def rebuild_stats(db: Session = Depends(get_db)):
+    """בניית מוני הסטטיסטיקה מחדש מהטבלאות"""
+    return {"counters": StatsService.rebuild(db)}
+
+def _prune_events() -> int:
+    db = SessionLocal()
+    try:
+        return SystemEventService.prune_events(db, EVENT_RETENTION_DAYS, archive_path=EVENT_ARCHIVE_PATH)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    worker_notifier.stop()
+    event_writer.stop()
 
 # Health check endpoint
 @app.get("/health")
@@ -52,7 +136,8 @@ async def health_check():
 
 # Customer endpoints
 @app.post("/customers/", response_model=CustomerResponse, status_code=status.HTTP_201_CREATED)
-async def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
     """יצירת לקוח חדש"""
     try:
         # Check if customer already exists
@@ -86,7 +171,8 @@ async def create_customer(customer: CustomerCreate, db: Session = Depends(get_db
         )
 
 @app.get("/customers/{customer_id}", response_model=CustomerResponse)
-async def get_customer(customer_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def get_customer(customer_id: int, db: Session = Depends(get_db)):
     """קבלת לקוח לפי מזהה"""
     try:
         # בדיקת תקינות מזהה לקוח
@@ -120,7 +206,8 @@ async def get_customer(customer_id: int, db: Session = Depends(get_db)):
         )
 
 @app.get("/customers/phone/{phone}", response_model=CustomerResponse)
-async def get_customer_by_phone(phone: str, db: Session = Depends(get_db)):
+@db_endpoint
+def get_customer_by_phone(phone: str, db: Session = Depends(get_db)):
     """קבלת לקוח לפי מספר טלפון"""
     try:
         # בדיקת תקינות מספר טלפון
@@ -154,7 +241,8 @@ async def get_customer_by_phone(phone: str, db: Session = Depends(get_db)):
         )
 
 @app.get("/customers/", response_model=List[CustomerResponse])
-async def get_customers(
+@db_endpoint
+def get_customers(
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db)
@@ -194,7 +282,8 @@ async def get_customers(
 
 # Order endpoints
 @app.post("/orders/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
-async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_order(order: OrderCreate, db: Session = Depends(get_db)):
     """יצירת הזמנה חדשה"""
     try:
         print(f"DEBUG: Received order data: {order}")
@@ -236,8 +325,47 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
             detail=user_message
         )
 
+@app.post("/orders/batch", response_model=OrderBatchResponse)
+@db_endpoint
+def create_orders_batch(batch: OrderBatchCreate, db: Session = Depends(get_db)):
+    """קליטת הזמנות רבות בבקשה אחת (טרנזקציה אחת) - תוצאה לכל הזמנה"""
+    results: List[Optional[OrderBatchItemResult]] = [None] * len(batch.orders)
+    valid_orders: List[OrderCreate] = []
+    valid_indexes: List[int] = []
+    
+    for index, payload in enumerate(batch.orders):
+        try:
+            valid_orders.append(OrderCreate(**payload))
+            valid_indexes.append(index)
+        except ValidationError as e:
+            fields = ", ".join(".".join(str(part) for part in error["loc"]) for error in e.errors())
+            results[index] = OrderBatchItemResult(index=index, success=False, error=f"נתונים לא תקינים: {fields}")
+    
+    try:
+        db_orders = OrderService.create_orders_batch(db, valid_orders)
+    except Exception as e:
+        print(f"ERROR in create_orders_batch: {str(e)}")
+        import traceback
+        print(f"ERROR traceback: {traceback.format_exc()}")
+        
+        # The batch is one transaction and create_orders_batch only raises before its commit -
+        # none of the valid orders were saved
+        for index in valid_indexes:
+            results[index] = OrderBatchItemResult(
+                index=index, success=False, error="שגיאה בשמירת האצווה. אף הזמנה לא נשמרה - נסה שוב."
+            )
+    else:
+        for index, db_order in zip(valid_indexes, db_orders):
+            results[index] = OrderBatchItemResult(
+                index=index, success=True, order_id=db_order.id, customer_id=db_order.customer_id
+            )
+    
+    created = sum(1 for result in results if result.success)
+    return OrderBatchResponse(total=len(results), created=created, failed=len(results) - created, results=results)
+
 @app.get("/orders/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def get_order(order_id: int, db: Session = Depends(get_db)):
     """קבלת הזמנה לפי מזהה"""
     try:
         # בדיקת תקינות מזהה הזמנה
@@ -271,7 +399,8 @@ async def get_order(order_id: int, db: Session = Depends(get_db)):
         )
 
 @app.get("/orders/customer/{phone}", response_model=List[OrderResponse])
-async def get_customer_orders(phone: str, db: Session = Depends(get_db)):
+@db_endpoint
+def get_customer_orders(phone: str, db: Session = Depends(get_db)):
     """קבלת הזמנות לפי מספר טלפון לקוח"""
     try:
         # בדיקת תקינות מספר טלפון
@@ -300,7 +429,8 @@ async def get_customer_orders(phone: str, db: Session = Depends(get_db)):
         )
 
 @app.put("/orders/{order_id}", response_model=OrderResponse)
-async def update_order(
+@db_endpoint
+def update_order(
     order_id: int, 
     order_update: OrderUpdate, 
     db: Session = Depends(get_db)
@@ -338,7 +468,8 @@ async def update_order(
         )
 
 @app.get("/orders/", response_model=List[OrderResponse])
-async def get_orders(
+@db_endpoint
+def get_orders(
     skip: int = 0, 
     limit: int = 100, 
     status: Optional[str] = None,
@@ -378,7 +509,8 @@ async def get_orders(
         )
 
 @app.get("/orders/next-id")
-async def get_next_order_id(db: Session = Depends(get_db)):
+@db_endpoint
+def get_next_order_id(db: Session = Depends(get_db)):
     """קבלת מזהה הזמנה הבא"""
     try:
         next_id = OrderService.get_next_order_id(db)
@@ -398,7 +530,8 @@ async def get_next_order_id(db: Session = Depends(get_db)):
 
 # Product endpoints
 @app.post("/products/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """יצירת מוצר חדש"""
     try:
         # Check if product already exists
@@ -428,7 +561,8 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
         )
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def get_product(product_id: int, db: Session = Depends(get_db)):
     """קבלת מוצר לפי מזהה"""
     try:
         # בדיקת תקינות מזהה מוצר
@@ -438,7 +572,7 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
                 detail="מזהה מוצר לא תקין. יש להזין מספר חיובי."
             )
         
-        product = db.query(Product).filter(Product.id == product_id).first()
+        product = ProductService.get_product_by_id(db, product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -462,7 +596,8 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
         )
 
 @app.get("/products/", response_model=List[ProductResponse])
-async def get_products(
+@db_endpoint
+def get_products(
     category: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -487,7 +622,8 @@ async def get_products(
         )
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
-async def update_product(
+@db_endpoint
+def update_product(
     product_id: int, 
     product_update: ProductUpdate, 
     db: Session = Depends(get_db)
@@ -526,7 +662,8 @@ async def update_product(
 
 # Search endpoints
 @app.post("/search/", response_model=SearchResponse)
-async def search_products(search_request: SearchRequest, db: Session = Depends(get_db)):
+@db_endpoint
+def search_products(search_request: SearchRequest, db: Session = Depends(get_db)):
     """חיפוש חכם במוצרים"""
     try:
         # בדיקת תקינות פרמטרי חיפוש
@@ -580,63 +717,81 @@ async def search_products(search_request: SearchRequest, db: Session = Depends(g
         )
 
 # Real-time updates endpoint
+def _load_events_after(last_event_id: int) -> List[dict]:
+    """אצוות אירועים לחידוש זרם (רץ ב-threadpool, עם session קצר)"""
+    db = SessionLocal()
+    try:
+        events = SystemEventService.get_events_after(db, last_event_id, STREAM_BATCH_SIZE)
+        return [event_to_dict(event) for event in events]
+    finally:
+        db.close()
+
 @app.get("/events/stream")
-async def stream_events(db: Session = Depends(get_db)):
-    """זרם אירועים בזמן אמת (Server-Sent Events)"""
+async def stream_events(last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """זרם אירועים בזמן אמת (Server-Sent Events)
+    
+    אירועים חדשים מגיעים מהמפיץ שבתהליך (ללא שאילתות). רק חיבור מחדש עם
+    Last-Event-ID קורא מהמסד את האירועים שפוספסו - החל מ-STREAM_REPLAY_WINDOW
+    מזהים מתחת לו, כך שאירועים עם מזהה נמוך יותר יכולים לחזור (הלקוח מסנן כפילויות).
+    """
     async def event_generator():
-        last_event_id = 0
-        
-        while True:
-            try:
-                # Get new events since last check
-                events = db.query(SystemEvent).filter(
-                    SystemEvent.id > last_event_id
-                ).order_by(SystemEvent.created_at.desc()).limit(10).all()
-                
-                if events:
-                    for event in events:
-                        event_data = {
-                            "id": event.id,
-                            "type": event.event_type,
-                            "entity_id": event.entity_id,
-                            "entity_type": event.entity_type,
-                            "data": json.loads(event.data) if event.data else None,
-                            "timestamp": event.created_at.isoformat()
-                        }
-                        
-                        yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-                        last_event_id = max(last_event_id, event.id)
+        subscription = event_broadcaster.subscribe()
+        sent_id = 0
+        replayed_ids = set()
+        try:
+            # Replay missed events, starting a window below Last-Event-ID because events
+            # from other workers may arrive out of id order. Live events queued meanwhile
+            # are skipped if they were already replayed.
+            if last_event_id is not None and last_event_id.isdigit():
+                sent_id = max(0, int(last_event_id) - STREAM_REPLAY_WINDOW)
+                while True:
+                    payloads = await run_in_threadpool(_load_events_after, sent_id)
+                    for payload in payloads:
+                        yield format_sse(payload)
+                        sent_id = payload["id"]
+                        replayed_ids.add(sent_id)
+                    if len(payloads) < STREAM_BATCH_SIZE:
+                        break
+                # Live events older than the window are not expected; keep the set small
+                replayed_ids = {event_id for event_id in replayed_ids if event_id > sent_id - STREAM_REPLAY_WINDOW}
+            
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Heartbeat comment keeps idle connections (and client read timeouts) alive
+                    yield ": heartbeat\n\n"
+                    continue
                 
-                # Wait before next check
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                print(f"ERROR in stream_events: {str(e)}")
-                import traceback
-                print(f"ERROR traceback: {traceback.format_exc()}")
-                
-                # הודעת שגיאה ידידותית למשתמש
-                error_data = {
-                    "error": "שגיאה בזרם האירועים",
-                    "message": "המערכת תנסה להתחבר מחדש",
-                    "retry_after": 5
-                }
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
-                await asyncio.sleep(5)
+                if item is None:
+                    # Slow consumer - disconnect; the client resumes with Last-Event-ID
+                    return
+                event_id, message = item
+                if event_id not in replayed_ids:
+                    yield message
+        finally:
+            event_broadcaster.unsubscribe(subscription)
     
     return StreamingResponse(
         event_generator(),
-        media_type="text/plain",
+        media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
+            "Connection": "keep-alive"
         }
     )
 
+@app.get("/stats/stream")
+async def get_stream_stats():
+    """סטטיסטיקות מפיץ האירועים (מנויים, אירועים, ניתוקים) וערוץ ה-workers"""
+    stats = event_broadcaster.get_stats()
+    stats["workers"] = worker_notifier.get_stats()
+    return stats
+
 # System events endpoint
 @app.get("/events/", response_model=List[dict])
-async def get_events(
+@db_endpoint
+def get_events(
     event_type: Optional[str] = None,
     hours: int = 24,
     limit: int = 100,
@@ -657,10 +812,13 @@ async def get_events(
                 detail="מספר התוצאות חייב להיות בין 1 ל-1000."
             )
         
+        # Read-your-writes: events still waiting in the write-behind buffer are written first
+        SystemEventService.flush_events()
+        
         if event_type:
-            events = SystemEventService.get_events_by_type(db, event_type, limit)
+            events = SystemEventService.get_events_by_type(db, event_type, limit, hours)
         else:
-            events = SystemEventService.get_recent_events(db, hours)
+            events = SystemEventService.get_recent_events(db, hours, limit)
         
         return [
             {
@@ -691,20 +849,12 @@ async def get_events(
 
 # Statistics endpoints
 @app.get("/stats/orders")
-async def get_order_stats(db: Session = Depends(get_db)):
+@db_endpoint
+def get_order_stats(db: Session = Depends(get_db)):
     """סטטיסטיקות הזמנות"""
     try:
-        total_orders = db.query(Order).count()
-        pending_orders = db.query(Order).filter(Order.status == "pending").count()
-        confirmed_orders = db.query(Order).filter(Order.status == "confirmed").count()
-        delivered_orders = db.query(Order).filter(Order.status == "delivered").count()
-        
-        return {
-            "total_orders": total_orders,
-            "pending_orders": pending_orders,
-            "confirmed_orders": confirmed_orders,
-            "delivered_orders": delivered_orders
-        }
+        # Counters are maintained with every order write - no table scans here
+        return StatsService.get_order_stats(db)
         
     except Exception as e:
         print(f"ERROR in get_order_stats: {str(e)}")
@@ -719,16 +869,11 @@ async def get_order_stats(db: Session = Depends(get_db)):
         )
 
 @app.get("/stats/customers")
-async def get_customer_stats(db: Session = Depends(get_db)):
+@db_endpoint
+def get_customer_stats(db: Session = Depends(get_db)):
     """סטטיסטיקות לקוחות"""
     try:
-        total_customers = db.query(Customer).count()
-        active_customers = db.query(Customer).filter(Customer.total_orders > 0).count()
-        
-        return {
-            "total_customers": total_customers,
-            "active_customers": active_customers
-        }
+        return StatsService.get_customer_stats(db)
         
     except Exception as e:
         print(f"ERROR in get_customer_stats: {str(e)}")
@@ -742,6 +887,16 @@ async def get_customer_stats(db: Session = Depends(get_db)):
             detail=user_message
         )
 
+@app.get("/stats/events")
+async def get_event_writer_stats():
+    """מדדי חוצץ כתיבת האירועים (עומק תור, אצוות, זמן כתיבה)"""
+    return event_writer.get_metrics()
+
+@app.get("/stats/catalog")
+async def get_catalog_stats():
+    """סטטיסטיקות מטמון קטלוג המוצרים"""
+    return product_catalog.get_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
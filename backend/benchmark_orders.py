@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+מדידת קצב יצירת הזמנות (הזמנות לשנייה) על מסד נתונים זמני
+משווה את המסלול הקודם (commit לסטטיסטיקות הלקוח, להזמנה ולאירוע) לטרנזקציה
+האחת של OrderService.create_order, ואת שניהם לקליטה באצווה (create_orders_batch).
+
+שימוש:
+    python benchmark_orders.py [--orders 500] [--batch-size 100] [--rounds 5]
+
+המסלולים רצים לסירוגין במנות (rounds), כדי שגדילת מסד הנתונים ורעש המערכת
+יתחלקו ביניהם באופן שווה ולא יטו את ההשוואה לטובת המסלול שרץ ראשון.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+# מסד נתונים זמני - חייב להיקבע לפני הייבוא של database
+_workdir = tempfile.mkdtemp(prefix="zoares-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ZOARES_EVENT_CHANNEL", os.path.join(_workdir, "events"))
+
+import json
+from typing import Callable, Dict, List
+
+from database import SessionLocal, create_tables, Customer, Order, SystemEvent
+from models import OrderCreate
+from services import CustomerService, OrderService, SystemEventService
+
+CUSTOMERS = 50
+
+def legacy_create_order(db, order_data: OrderCreate) -> Order:
+    """המסלול הקודם של create_order - שלושה commits ויותר לכל הזמנה (להשוואה בלבד)"""
+    items_json = json.dumps([item.dict() for item in order_data.items], ensure_ascii=False)
+    customer = CustomerService.get_customer_by_phone(db, order_data.customer_phone)
+    if customer:
+        customer_id = customer.id
+        CustomerService.update_customer_stats(db, customer.id, order_data.final_total)
+    else:
+        customer_id = None
+    db_order = Order(
+        customer_id=customer_id,
+        customer_name=order_data.customer_name,
+        customer_phone=order_data.customer_phone,
+        customer_address=order_data.customer_address,
+        items=items_json,
+        total_amount=order_data.total_amount,
+        delivery_cost=order_data.delivery_cost,
+        final_total=order_data.final_total,
+        notes=order_data.notes
+    )
+    db.add(db_order)
+    db.commit()
+    db.refresh(db_order)
+    # strict - the event commit the legacy path paid for (not the write-behind buffer)
+    SystemEventService.log_event(
+        db, "order_created", db_order.id, "order",
+        {"order_id": db_order.id, "customer_phone": db_order.customer_phone}, strict=True
+    )
+    return db_order
+
+def _sample_orders(count: int) -> List[OrderCreate]:
+    return [
+        OrderCreate(
+            customer_name=f"לקוח {i % CUSTOMERS}",
+            customer_phone=f"050{i % CUSTOMERS:07d}",
+            items=[{
+                "product_name": "שניצל עוף", "quantity": 1.5, "unit": "ק\"ג",
+                "price_per_unit": 60.0, "total_price": 90.0
+            }],
+            total_amount=90.0,
+            final_total=90.0
+        )
+        for i in range(count)
+    ]
+
+def _seed_customers(db):
+    for i in range(CUSTOMERS):
+        db.add(Customer(name=f"לקוח {i}", phone=f"050{i:07d}"))
+    db.commit()
+
+def _time_per_order(create: Callable, orders: List[OrderCreate]) -> float:
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for order_data in orders:
+            create(db, order_data)
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+def _time_batches(orders: List[OrderCreate], batch_size: int) -> float:
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for start in range(0, len(orders), batch_size):
+            OrderService.create_orders_batch(db, orders[start:start + batch_size])
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+def benchmark(order_count: int = 500, batch_size: int = 100, rounds: int = 5) -> Dict[str, float]:
+    """מחזיר הזמנות לשנייה לכל מסלול, ומוודא שכל המסלולים שמרו את אותו מצב"""
+    create_tables()
+    db = SessionLocal()
+    _seed_customers(db)
+    db.close()
+
+    orders = _sample_orders(order_count)
+    chunk_size = -(-order_count // max(1, rounds))
+    seconds = {"legacy": 0.0, "single_transaction": 0.0, "batch": 0.0}
+    for start in range(0, order_count, chunk_size):
+        chunk = orders[start:start + chunk_size]
+        seconds["legacy"] += _time_per_order(legacy_create_order, chunk)
+        seconds["single_transaction"] += _time_per_order(OrderService.create_order, chunk)
+        seconds["batch"] += _time_batches(chunk, batch_size)
+    results = {path: order_count / elapsed for path, elapsed in seconds.items()}
+
+    # אימות - כל מסלול יצר הזמנה ואירוע לכל הזמנה ועדכן את הלקוחות
+    db = SessionLocal()
+    try:
+        assert db.query(Order).count() == order_count * 3
+        assert db.query(SystemEvent).filter(SystemEvent.event_type == "order_created").count() == order_count * 3
+        total_orders = sum(c.total_orders for c in db.query(Customer).all())
+        assert total_orders == order_count * 3, total_orders
+    finally:
+        db.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="קצב יצירת הזמנות: לפני ואחרי טרנזקציה אחת")
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    result = benchmark(args.orders, args.batch_size, args.rounds)
+    print(f"הזמנות: {args.orders} לכל מסלול (מסד נתונים: {os.environ['DATABASE_URL']})")
+    print(f"מסלול קודם (כמה commits): {result['legacy']:.0f} הזמנות/שנייה")
+    print(f"טרנזקציה אחת:             {result['single_transaction']:.0f} הזמנות/שנייה "
+          f"(x{result['single_transaction'] / result['legacy']:.2f})")
+    print(f"אצוות של {args.batch_size}:              {result['batch']:.0f} הזמנות/שנייה "
+          f"(x{result['batch'] / result['legacy']:.2f})")
@@ -4,28 +4,290 @@ API Client for Streamlit Applications
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import re
 import json
 import time
-from typing import List, Dict, Any, Optional
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 import streamlit as st
 
+# ברירות מחדל (נדרסות ע"י ServerConfig אם זמין)
+HEALTH_CHECK_INTERVAL = 15  # שניות בין בדיקות בריאות ברקע
+HEALTH_CHECK_TIMEOUT = 3  # שניות לבדיקת בריאות בודדת
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_TIMEOUT = 30
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 20
+FETCH_MAX_WORKERS = 4  # בקשות קריאה מקבילות לכל קליינט ב-fetch_many
+STREAM_READ_TIMEOUT = 60  # שניות בלי נתונים בזרם האירועים עד לחיבור מחדש
+STREAM_RECONNECT_MIN = 1  # שניות - המתנה ראשונה לפני חיבור מחדש לזרם
+STREAM_RECONNECT_MAX = 30
+STREAM_SEEN_IDS = 1000  # מזהי אירועים אחרונים שנזכרים כדי לסנן אירועים שהשרת שולח שוב בחיבור מחדש
+
+# מצב לכל thread: שגיאת הבקשה האחרונה, והאם להציג שגיאות ב-Streamlit
+_request_context = threading.local()
+
+@dataclass
+class FetchResult:
+    """תוצאה של קריאה אחת ב-fetch_many"""
+    name: str
+    ok: bool
+    value: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+# שיטות שבטוח לשלוח שוב - בקשה חוזרת לא תיצור כפילות
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# סטטוסים זמניים שכדאי לנסות שוב
+RETRY_STATUSES = frozenset({502, 503, 504})
+# מקטע נתיב מספרי (מזהה / טלפון)
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+class HTTPTransport:
+    """שכבת תעבורה: מאגר חיבורים קבוע (keep-alive), זמני המתנה, ניסיונות חוזרים ומדדים לכל endpoint"""
+    
+    def __init__(self, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF,
+                 pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        
+        self.session = requests.Session()
+        # הניסיונות החוזרים מנוהלים כאן (לפי אידמפוטנטיות) ולא ע"י urllib3
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+        
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._metrics_lock = threading.Lock()
+    
+    @staticmethod
+    def endpoint_key(method: str, endpoint: str) -> str:
+        """מפתח המדדים - מזהים וטלפונים בנתיב מוחלפים ב-{id}"""
+        path = endpoint.split("?", 1)[0]
+        return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', path)}"
+    
+    def _record(self, key: str, seconds: float, error: bool, retries: int):
+        with self._metrics_lock:
+            metrics = self._metrics.setdefault(key, {
+                "requests": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0
+            })
+            metrics["requests"] += 1
+            metrics["errors"] += int(error)
+            metrics["retries"] += retries
+            metrics["total_seconds"] += seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+    
+    def _should_retry(self, method: str, attempt: int, error: Optional[Exception] = None,
+                      response: Optional[requests.Response] = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            # חיבור שלא הוקם - הבקשה לא נשלחה, בטוח לנסות שוב גם ב-POST
+            if isinstance(error, requests.exceptions.ConnectTimeout):
+                return True
+            return method in IDEMPOTENT_METHODS and isinstance(
+                error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+            )
+        return method in IDEMPOTENT_METHODS and response is not None and response.status_code in RETRY_STATUSES
+    
+    def _sleep_before_retry(self, attempt: int):
+        """המתנה אקספוננציאלית עם jitter - כדי שסשנים רבים לא ינסו שוב באותו רגע"""
+        time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+    
+    def request(self, method: str, url: str, endpoint: str, timeout: Optional[tuple] = None,
+                retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """שולח בקשה עם זמני המתנה וניסיונות חוזרים; זורק RequestException אם כל הניסיונות נכשלו"""
+        method = method.upper()
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        max_retries = self.max_retries if retries is None else retries
+        key = self.endpoint_key(method, endpoint)
+        started = time.perf_counter()
+        attempt = 0
+        
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if attempt < max_retries and self._should_retry(method, attempt, error=e):
+                    self._sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+                self._record(key, time.perf_counter() - started, True, attempt)
+                raise
+            
+            if attempt < max_retries and self._should_retry(method, attempt, response=response):
+                response.close()
+                self._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+            
+            self._record(key, time.perf_counter() - started, response.status_code >= 500, attempt)
+            return response
+    
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """מדדי השהיה ושגיאות לכל endpoint (כולל ממוצע)"""
+        with self._metrics_lock:
+            metrics = {key: dict(values) for key, values in self._metrics.items()}
+        for values in metrics.values():
+            values["avg_seconds"] = values["total_seconds"] / values["requests"] if values["requests"] else 0.0
+        return metrics
+
+class CircuitBreaker:
+    """מפסק זרם - אחרי כשלונות רצופים חוסם בקשות לשרת עד שהזמן עובר או שבדיקת בריאות מצליחה"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """האם מותר לשלוח בקשה (במצב half-open - בקשת ניסיון אחת בלבד)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
 class ZoaresAPIClient:
     """קליינט API למערכת זוארס"""
     
-    def __init__(self, base_url: str = "http://localhost:8001"):
+    def __init__(self, base_url: str = "http://localhost:8001",
+                 health_interval: float = HEALTH_CHECK_INTERVAL,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+                 transport_options: Optional[Dict[str, Any]] = None,
+                 fetch_workers: int = FETCH_MAX_WORKERS):
         self.base_url = base_url
-        self.session = requests.Session()
+        self.transport = HTTPTransport(**(transport_options or {}))
+        
+        # מאגר threads לקריאות מקבילות (נוצר בשימוש הראשון)
+        self.fetch_workers = fetch_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        
+        # מנוי לזרם האירועים (נוצר בשימוש הראשון, אחד לכל קליינט משותף)
+        self._event_subscriber: Optional["EventStreamSubscriber"] = None
+        self.session = self.transport.session
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         })
+        
+        # מצב בריאות שמור - מתעדכן ברקע, כך שבדיקה לא חוסמת את הרינדור
+        self.health_interval = health_interval
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._healthy: Optional[bool] = None
+        self._health_checked_at: Optional[datetime] = None
+        self._health_lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+    
+    def _probe_health(self) -> bool:
+        """בקשת /health אחת לשרת ועדכון המצב השמור ומפסק הזרם"""
+        try:
+            response = self.transport.request(
+                "GET", f"{self.base_url}/health", "/health",
+                timeout=(self.transport.connect_timeout, HEALTH_CHECK_TIMEOUT), retries=0
+            )
+            healthy = response.ok and response.json().get("status") == "healthy"
+        except (requests.exceptions.RequestException, ValueError):
+            healthy = False
+        
+        if healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        
+        with self._health_lock:
+            self._healthy = healthy
+            self._health_checked_at = datetime.now()
+        return healthy
+    
+    def _monitor_loop(self):
+        while not self._monitor_stop.wait(self.health_interval):
+            self._probe_health()
+    
+    def start_health_monitor(self):
+        """מפעיל בדיקת בריאות ברקע (פעם ב-health_interval שניות)"""
+        with self._health_lock:
+            if self._monitor is not None and self._monitor.is_alive():
+                return
+            self._monitor_stop.clear()
+            self._monitor = threading.Thread(target=self._monitor_loop, name="zoares-health-monitor", daemon=True)
+            self._monitor.start()
+    
+    def stop_health_monitor(self):
+        """עוצר את בדיקת הבריאות ברקע"""
+        self._monitor_stop.set()
+    
+    def get_event_subscriber(self) -> "EventStreamSubscriber":
+        """מחזיר את מנוי זרם האירועים של הקליינט ומפעיל אותו"""
+        with self._health_lock:
+            if self._event_subscriber is None:
+                self._event_subscriber = EventStreamSubscriber(self)
+            subscriber = self._event_subscriber
+        subscriber.start()
+        return subscriber
+    
+    def get_transport_metrics(self) -> Dict[str, Dict[str, float]]:
+        """מדדי השהיה ושגיאות לכל endpoint"""
+        return self.transport.get_metrics()
+    
+    def get_health_state(self) -> Dict[str, Any]:
+        """מחזיר את מצב הבריאות השמור ואת מצב מפסק הזרם"""
+        with self._health_lock:
+            return {
+                "healthy": bool(self._healthy),
+                "checked_at": self._health_checked_at,
+                "circuit_state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures
+            }
     
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None) -> Dict:
         """ביצוע בקשת HTTP"""
         url = f"{self.base_url}{endpoint}"
         
+        # מפסק פתוח - לא שולחים בקשה לשרת שלא זמין
+        if not self.breaker.allow_request():
+            _request_context.last_error = "השרת אינו זמין כרגע (מפסק זרם פתוח)"
+            return {"error": _request_context.last_error}
+        
         print(f"DEBUG: Making {method} request to {url}")
         if data:
             print(f"DEBUG: Request data: {data}")
@@ -33,14 +295,14 @@ class ZoaresAPIClient:
         
         try:
             if method.upper() == "GET":
-                response = self.session.get(url, params=params)
+                response = self.transport.request("GET", url, endpoint, params=params)
             elif method.upper() == "POST":
                 print(f"DEBUG: Sending POST with json data: {data}")
-                response = self.session.post(url, json=data)
+                response = self.transport.request("POST", url, endpoint, json=data)
             elif method.upper() == "PUT":
-                response = self.session.put(url, json=data)
+                response = self.transport.request("PUT", url, endpoint, json=data)
             elif method.upper() == "DELETE":
-                response = self.session.delete(url)
+                response = self.transport.request("DELETE", url, endpoint)
             else:
                 raise ValueError(f"Method {method} not supported")
             
@@ -48,6 +310,12 @@ class ZoaresAPIClient:
             print(f"DEBUG: Response headers: {response.headers}")
             print(f"DEBUG: Response content: {response.text}")
             
+            # שגיאת שרת (5xx) נספרת ככשלון; שגיאת לקוח (4xx) אומרת שהשרת עונה
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            
             response.raise_for_status()
             
             if response.content:
@@ -55,25 +323,74 @@ class ZoaresAPIClient:
             return {}
             
         except requests.exceptions.RequestException as e:
+            if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                self.breaker.record_failure()
             print(f"ERROR: Request failed: {str(e)}")
-            st.error(f"שגיאה בתקשורת עם השרת: {str(e)}")
+            self._report_error(f"שגיאה בתקשורת עם השרת: {str(e)}")
             return {"error": str(e)}
         except json.JSONDecodeError as e:
             print(f"ERROR: JSON decode failed: {str(e)}")
-            st.error(f"שגיאה בפענוח תגובת השרת: {str(e)}")
+            self._report_error(f"שגיאה בפענוח תגובת השרת: {str(e)}")
             return {"error": f"JSON decode error: {str(e)}"}
         except Exception as e:
             print(f"ERROR: Unexpected error: {str(e)}")
-            st.error(f"שגיאה לא צפויה: {str(e)}")
+            self._report_error(f"שגיאה לא צפויה: {str(e)}")
             return {"error": str(e)}
     
-    def health_check(self) -> bool:
-        """בדיקת בריאות השרת"""
-        try:
-            response = self._make_request("GET", "/health")
-            return "status" in response and response["status"] == "healthy"
-        except:
-            return False
+    @staticmethod
+    def _report_error(message: str):
+        """שומר את השגיאה ל-thread הנוכחי ומציג אותה (לא מתוך threads של fetch_many)"""
+        _request_context.last_error = message
+        if not getattr(_request_context, "quiet", False):
+            st.error(message)
+    
+    def fetch_many(self, calls: Dict[str, Callable[[], Any]], timeout: Optional[float] = None) -> Dict[str, FetchResult]:
+        """מריץ קריאות קריאה בלתי תלויות במקביל על מאגר threads חסום ועל אותו session
+        
+        calls: {שם: פונקציה ללא ארגומנטים}, למשל {"orders": lambda: client.get_all_orders(limit=50)}.
+        כשלון בקריאה אחת לא מבטל את האחרות - כל תוצאה מסומנת ok/error בנפרד.
+        """
+        def run(name: str, call: Callable[[], Any]) -> FetchResult:
+            _request_context.quiet = True
+            _request_context.last_error = None
+            started = time.perf_counter()
+            try:
+                value = call()
+            except Exception as e:
+                return FetchResult(name, False, error=str(e), seconds=time.perf_counter() - started)
+            error = _request_context.last_error
+            return FetchResult(name, error is None, value, error, time.perf_counter() - started)
+        
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="zoares-fetch")
+        
+        futures = {name: self._executor.submit(run, name, call) for name, call in calls.items()}
+        results = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name, future in futures.items():
+            try:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                results[name] = future.result(timeout=remaining)
+            except Exception as e:
+                future.cancel()
+                results[name] = FetchResult(name, False, error=str(e) or type(e).__name__)
+        return results
+    
+    def fetch_dashboard(self, orders_limit: int = 100, events_hours: int = 24) -> Dict[str, FetchResult]:
+        """טוען במקביל את נתוני לוח הבקרה: הזמנות, סטטיסטיקות הזמנות ולקוחות ואירועים אחרונים"""
+        return self.fetch_many({
+            "orders": lambda: self.get_all_orders(limit=orders_limit),
+            "order_stats": self.get_order_stats,
+            "customer_stats": self.get_customer_stats,
+            "events": lambda: self.get_recent_events(hours=events_hours),
+        })
+    
+    def health_check(self, force: bool = False) -> bool:
+        """בדיקת בריאות השרת - מחזיר את המצב השמור (בקשה לשרת רק בפעם הראשונה או עם force)"""
+        if force or self._healthy is None:
+            return self._probe_health()
+        return self._healthy
     
     # Customer methods
     def create_customer(self, name: str, phone: str, address: str = None) -> Dict:
@@ -136,6 +453,11 @@ class ZoaresAPIClient:
             print(f"ERROR in create_order: {str(e)}")
             return {"error": f"שגיאה ביצירת הזמנה: {str(e)}"}
     
+    def create_orders_batch(self, orders: List[Dict]) -> Dict:
+        """קליטת הזמנות רבות בבקשה אחת - מחזיר תוצאה לכל הזמנה (results) לפי הסדר"""
+        formatted_orders = [self._format_order_for_server(order_data) for order_data in orders]
+        return self._make_request("POST", "/orders/batch", {"orders": formatted_orders})
+    
     def _format_order_for_server(self, order_data: Dict) -> Dict:
         """מהמר את נתוני ההזמנה לפורמט שהשרת מצפה"""
         try:
@@ -332,53 +654,202 @@ class ZoaresAPIClient:
         response = self._make_request("GET", "/events/", params=params)
         return response if isinstance(response, list) else []
 
+class EventStreamSubscriber:
+    """מנוי ברקע לזרם האירועים (/events/stream) - חיבור אחד לכל תהליך
+    
+    כל אירוע מקדם מונה גרסה לסוג הישות שלו (order, customer, product...).
+    הסשנים משווים את המונים לגרסה שכבר ראו - בדיקה בזיכרון, בלי בקשה לשרת.
+    אחרי ניתוק מתחבר מחדש עם Last-Event-ID (המזהה הגבוה ביותר שהתקבל). השרת שולח
+    שוב גם חלון של מזהים מתחתיו, כי אירועים מ-workers אחרים מגיעים לא לפי הסדר -
+    אירועים שכבר התקבלו מסוננים לפי המזהה.
+    """
+    
+    def __init__(self, api_client: ZoaresAPIClient, read_timeout: float = STREAM_READ_TIMEOUT):
+        self.api_client = api_client
+        self.read_timeout = read_timeout
+        self.last_event_id: Optional[str] = None
+        self.last_event_time: Optional[datetime] = None
+        self.connected = False
+        self.reconnects = 0
+        self._versions: Dict[str, int] = {}
+        self._seen_ids = set()
+        self._seen_order = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """מפעיל את ה-thread של המנוי (אם עוד לא רץ)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="zoares-event-stream", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """עוצר את המנוי (החיבור נסגר בקריאה הבאה מהזרם)"""
+        self._stop.set()
+    
+    def versions(self) -> Dict[str, int]:
+        """מוני הגרסה הנוכחיים לכל סוג ישות"""
+        with self._lock:
+            return dict(self._versions)
+    
+    def _run(self):
+        delay = STREAM_RECONNECT_MIN
+        while not self._stop.is_set():
+            # לא מתחברים כשהשרת ידוע כלא זמין - בדיקת הבריאות ברקע תעדכן
+            if self.api_client.health_check():
+                try:
+                    self._consume()
+                    delay = STREAM_RECONNECT_MIN
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    print(f"DEBUG: Event stream disconnected: {str(e)}")
+                finally:
+                    self.connected = False
+                self.reconnects += 1
+            self._stop.wait(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, STREAM_RECONNECT_MAX)
+    
+    def _consume(self):
+        """מחזיק חיבור אחד לזרם ומעבד אירועים עד לניתוק"""
+        headers = {"Accept": "text/event-stream"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = self.last_event_id
+        
+        with self.api_client.session.get(
+            f"{self.api_client.base_url}/events/stream",
+            headers=headers,
+            stream=True,
+            timeout=(self.api_client.transport.connect_timeout, self.read_timeout),
+        ) as response:
+            response.raise_for_status()
+            self.connected = True
+            
+            # chunk_size=None - כל chunk מהשרת מעובד מיד, בלי לחכות למילוי באפר
+            event_id, data_lines = None, []
+            for raw_line in response.iter_lines(chunk_size=None):
+                if self._stop.is_set():
+                    return
+                line = raw_line.decode("utf-8")
+                if line == "":
+                    # שורה ריקה - סוף אירוע
+                    if data_lines:
+                        self._dispatch(event_id, "\n".join(data_lines))
+                    event_id, data_lines = None, []
+                elif line.startswith(":"):
+                    continue  # הערה / heartbeat
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "id":
+                        event_id = value
+                    elif field == "data":
+                        data_lines.append(value)
+    
+    def _dispatch(self, event_id: Optional[str], data: str):
+        event = json.loads(data)
+        if "error" in event:
+            return
+        entity_type = event.get("entity_type") or "system"
+        with self._lock:
+            if event_id is not None and event_id.isdigit():
+                numeric_id = int(event_id)
+                if numeric_id in self._seen_ids:
+                    return  # נשלח שוב בחלון של החיבור מחדש
+                self._seen_ids.add(numeric_id)
+                self._seen_order.append(numeric_id)
+                if len(self._seen_order) > STREAM_SEEN_IDS:
+                    self._seen_ids.discard(self._seen_order.popleft())
+                # אירועים מגיעים לא לפי הסדר - שומרים את הגבוה ביותר, לא את האחרון
+                if self.last_event_id is None or not self.last_event_id.isdigit() or numeric_id > int(self.last_event_id):
+                    self.last_event_id = event_id
+            elif event_id is not None:
+                self.last_event_id = event_id
+            self._versions[entity_type] = self._versions.get(entity_type, 0) + 1
+            self.last_event_time = datetime.now()
+
 class RealTimeSync:
-    """מחלקה לסנכרון בזמן אמת"""
+    """מחלקה לסנכרון בזמן אמת - דגלי "מלוכלך" לכל סוג ישות, לפי זרם האירועים"""
     
     def __init__(self, api_client: ZoaresAPIClient):
         self.api_client = api_client
-        self.last_event_id = 0
+        self.subscriber = api_client.get_event_subscriber()
+        self.seen_versions = self.subscriber.versions()
         self.last_sync_time = None
     
-    def check_for_updates(self) -> bool:
-        """בדיקה אם יש עדכונים חדשים"""
-        try:
-            # Get recent events
-            events = self.api_client.get_recent_events(hours=1, limit=10)
-            
-            if not events:
-                return False
-            
-            # Check if there are new events
-            latest_event_id = max(event.get("id", 0) for event in events)
-            
-            if latest_event_id > self.last_event_id:
-                self.last_event_id = latest_event_id
-                self.last_sync_time = datetime.now()
-                return True
-            
-            return False
-            
-        except Exception as e:
-            st.warning(f"שגיאה בבדיקת עדכונים: {str(e)}")
+    @property
+    def last_event_id(self):
+        return self.subscriber.last_event_id
+    
+    def dirty_entity_types(self, versions: Optional[Dict[str, int]] = None) -> List[str]:
+        """סוגי הישויות שהשתנו מאז הבדיקה האחרונה של הסשן"""
+        if versions is None:
+            versions = self.subscriber.versions()
+        return [entity_type for entity_type, version in versions.items()
+                if version != self.seen_versions.get(entity_type, 0)]
+    
+    def check_for_updates(self, entity_types: Optional[List[str]] = None) -> bool:
+        """בדיקה אם יש עדכונים חדשים (בזיכרון בלבד); entity_types מגביל לסוגים הרלוונטיים"""
+        versions = self.subscriber.versions()
+        changed = [entity_type for entity_type in self.dirty_entity_types(versions)
+                   if entity_types is None or entity_type in entity_types]
+        if not changed:
             return False
+        
+        # רק הסוגים שנבדקו מסומנים כנקיים - השאר ממתינים לעמוד שצריך אותם
+        for entity_type in changed:
+            self.seen_versions[entity_type] = versions[entity_type]
+        self.last_sync_time = datetime.now()
+        return True
     
     def get_last_sync_info(self) -> Dict:
         """קבלת מידע על הסנכרון האחרון"""
         return {
             "last_event_id": self.last_event_id,
-            "last_sync_time": self.last_sync_time,
-            "is_connected": self.api_client.health_check()
+            "last_sync_time": self.last_sync_time or self.subscriber.last_event_time,
+            "is_connected": self.api_client.health_check(),
+            "stream_connected": self.subscriber.connected
         }
 
+# קליינט משותף לכל התהליך (לכל כתובת שרת) - נשמר בין ריצות של הסקריפט ובין סשנים
+_shared_clients: Dict[str, ZoaresAPIClient] = {}
+_shared_clients_lock = threading.Lock()
+
+def get_shared_client(api_url: str, **client_options) -> ZoaresAPIClient:
+    """מחזיר את הקליינט המשותף לכתובת (נוצר פעם אחת, עם בדיקת בריאות ברקע)"""
+    with _shared_clients_lock:
+        client = _shared_clients.get(api_url)
+        if client is None:
+            client = ZoaresAPIClient(api_url, **client_options)
+            client.start_health_monitor()
+            _shared_clients[api_url] = client
+    return client
+
 # Utility functions for Streamlit
 def create_api_client() -> ZoaresAPIClient:
-    """יצירת קליינט API עם הגדרות ברירת מחדל"""
+    """מחזיר את קליינט ה-API המשותף עם הגדרות ברירת מחדל"""
+    client_options = {}
     try:
         # נסה להשתמש בקובץ ההגדרות
         from config import ServerConfig
         api_url = ServerConfig.get_api_url()
         is_external = ServerConfig.is_external_server()
+        client_options = {
+            "health_interval": ServerConfig.HEALTH_CHECK_INTERVAL,
+            "failure_threshold": ServerConfig.CIRCUIT_FAILURE_THRESHOLD,
+            "reset_timeout": ServerConfig.CIRCUIT_RESET_TIMEOUT,
+            "fetch_workers": ServerConfig.FETCH_MAX_WORKERS,
+            "transport_options": {
+                "connect_timeout": ServerConfig.CONNECT_TIMEOUT,
+                "read_timeout": ServerConfig.TIMEOUT,
+                "max_retries": ServerConfig.MAX_RETRIES,
+                "backoff": ServerConfig.RETRY_BACKOFF,
+                "pool_connections": ServerConfig.POOL_CONNECTIONS,
+                "pool_maxsize": ServerConfig.POOL_MAXSIZE
+            }
+        }
     except ImportError:
         # אם קובץ ההגדרות לא זמין, השתמש בהגדרות ישנות
         api_url = (
@@ -389,8 +860,8 @@ def create_api_client() -> ZoaresAPIClient:
         )
         is_external = False
     
-    # Create client
-    client = ZoaresAPIClient(api_url)
+    # Shared client (health state is cached and refreshed in the background)
+    client = get_shared_client(api_url, **client_options)
     
     # Test connection
     if not client.health_check():
@@ -409,21 +880,24 @@ def setup_real_time_sync(api_client: ZoaresAPIClient) -> RealTimeSync:
     
     return st.session_state.realtime_sync
 
-def auto_refresh_on_updates(api_client: ZoaresAPIClient, refresh_interval: int = 10):
-    """רענון אוטומטי כאשר יש עדכונים"""
+def auto_refresh_on_updates(api_client: ZoaresAPIClient, refresh_interval: int = 10,
+                            entity_types: Optional[List[str]] = None):
+    """רענון אוטומטי כאשר יש עדכונים רלוונטיים
+    
+    הבדיקה היא בזיכרון (לפי זרם האירועים), ולכן נעשית בכל ריצה של העמוד.
+    refresh_interval הוא המרווח המינימלי בין שני רענונים אוטומטיים.
+    """
     sync = setup_real_time_sync(api_client)
     
-    # Check for updates every refresh_interval seconds
-    if "last_refresh_check" not in st.session_state:
-        st.session_state.last_refresh_check = time.time()
+    if "last_auto_refresh" not in st.session_state:
+        st.session_state.last_auto_refresh = 0.0
     
     current_time = time.time()
-    if current_time - st.session_state.last_refresh_check >= refresh_interval:
-        if sync.check_for_updates():
+    if current_time - st.session_state.last_auto_refresh >= refresh_interval:
+        if sync.check_for_updates(entity_types):
+            st.session_state.last_auto_refresh = current_time
             st.info("🔄 התגלו עדכונים חדשים! מרענן את העמוד...")
             st.rerun()
-        
-        st.session_state.last_refresh_check = current_time
     
     # Display sync status
     sync_info = sync.get_last_sync_info()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
@@ -77,10 +77,31 @@ class SystemEvent(Base):
     entity_type = Column(String, nullable=False)  # order, customer, product
     data = Column(Text)  # JSON string with event data
     created_at = Column(DateTime, default=func.now())
+    
+    # Access paths of /events/: recent events, and recent events of one type
+    __table_args__ = (
+        Index("ix_system_events_created_at", "created_at"),
+        Index("ix_system_events_type_created", "event_type", "created_at"),
+    )
+
+class StatsCounter(Base):
+    __tablename__ = "stats_counters"
+    
+    # orders:status:<status>, orders:day:<YYYY-MM-DD>, customers:total, customers:active
+    key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
 
 # Create tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    ensure_indexes()
+
+def ensure_indexes():
+    """יוצר אינדקסים שנוספו למודלים גם בטבלאות שכבר קיימות"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 # Database dependency
 def get_db():
@@ -0,0 +1,141 @@
+"""
+מרחק עריכה (Levenshtein) משותף לשרת ה-API ולאפליקציית הלקוחות
+משווה שאילתה אחת מול רשימת מועמדים: טבלת הביטים של השאילתה נבנית פעם אחת,
+וכל מועמד מחושב באלגוריתם bit-parallel (Myers/Hyyrö) עם יציאה מוקדמת מעבר ל-max_distance.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional
+
+def _query_masks(query: str) -> Dict[str, int]:
+    """מסכות הביטים של השאילתה - ביט i דולק אם query[i] הוא התו"""
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(query):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+def _distance(masks: Dict[str, int], query_len: int, text: str, max_distance: Optional[int]) -> int:
+    """מרחק עריכה בין השאילתה (כמסכות) לטקסט - עמודה שלמה של טבלת ה-DP בכל צעד"""
+    text_len = len(text)
+    if max_distance is not None and abs(query_len - text_len) > max_distance:
+        return max_distance + 1
+    if query_len == 0:
+        return text_len
+
+    full = (1 << query_len) - 1
+    high = 1 << (query_len - 1)
+    plus_vertical = full
+    minus_vertical = 0
+    score = query_len
+
+    for position, char in enumerate(text, 1):
+        equal = masks.get(char, 0)
+        x_vertical = equal | minus_vertical
+        x_horizontal = ((((equal & plus_vertical) + plus_vertical) & full) ^ plus_vertical) | equal
+        plus_horizontal = minus_vertical | (~(x_horizontal | plus_vertical) & full)
+        minus_horizontal = plus_vertical & x_horizontal
+
+        if plus_horizontal & high:
+            score += 1
+        elif minus_horizontal & high:
+            score -= 1
+
+        # יציאה מוקדמת - כל תו שנשאר יכול להוריד את המרחק לכל היותר ב-1
+        if max_distance is not None and score - (text_len - position) > max_distance:
+            return max_distance + 1
+
+        plus_horizontal = ((plus_horizontal << 1) | 1) & full
+        minus_horizontal = (minus_horizontal << 1) & full
+        plus_vertical = minus_horizontal | (~(x_vertical | plus_horizontal) & full)
+        minus_vertical = plus_horizontal & x_vertical
+
+    if max_distance is not None and score > max_distance:
+        return max_distance + 1
+    return score
+
+def bounded_distances(query: str, candidates: Iterable[str], max_distance: Optional[int] = None) -> List[int]:
+    """מחשב את מרחק העריכה בין השאילתה לכל מועמד במעבר אחד
+
+    מרחק שגדול מ-max_distance מוחזר כ-max_distance + 1 (בלי לחשב אותו עד הסוף).
+    """
+    masks = _query_masks(query)
+    query_len = len(query)
+    return [_distance(masks, query_len, text, max_distance) for text in candidates]
+
+def levenshtein_distance(s1: str, s2: str, max_distance: Optional[int] = None) -> int:
+    """חישוב מרחק Levenshtein בין שתי מחרוזות"""
+    return _distance(_query_masks(s1), len(s1), s2, max_distance)
+
+def _reference_distance(s1: str, s2: str) -> int:
+    """המימוש הקודם (טבלה מלאה) - לאימות ולהשוואת ביצועים"""
+    if len(s1) < len(s2):
+        return _reference_distance(s2, s1)
+
+    if len(s2) == 0:
+        return len(s1)
+
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+
+    return previous_row[-1]
+
+def benchmark(catalog: List[str], queries: List[str], max_distance: int = 2, repeat: int = 20) -> Dict[str, float]:
+    """משווה את הקרנל למימוש הקודם על הקטלוג - מחזיר זמנים (שניות) ויחס האצה"""
+    lowered = [name.lower() for name in catalog]
+
+    # אימות - אותן תוצאות (עד לגבול) כמו המימוש הקודם
+    for query in queries:
+        expected = [min(_reference_distance(query, name), max_distance + 1) for name in lowered]
+        if bounded_distances(query, lowered, max_distance) != expected:
+            raise AssertionError(f"bounded_distances mismatch for {query!r}")
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            [_reference_distance(query, name) for name in lowered]
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            bounded_distances(query, lowered, max_distance)
+    kernel_seconds = time.perf_counter() - started
+
+    return {
+        'candidates': len(lowered),
+        'queries': len(queries) * repeat,
+        'reference_seconds': reference_seconds,
+        'kernel_seconds': kernel_seconds,
+        'speedup': reference_seconds / kernel_seconds if kernel_seconds else float('inf'),
+    }
+
+def _load_customer_catalog() -> List[str]:
+    """קורא את PRODUCT_CATEGORIES מ-customer_app.py בלי לייבא את streamlit"""
+    import ast
+    import os
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'customer_app.py')
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == 'PRODUCT_CATEGORIES' for target in node.targets
+        ):
+            categories = ast.literal_eval(node.value)
+            return [product for products in categories.values() for product in products]
+    return []
+
+if __name__ == '__main__':
+    catalog = _load_customer_catalog()
+    queries = ['שניצל', 'שניצל עוף', 'שנצל', 'המבורגר', 'טחון עגל', 'כנפים', 'פרגית', 'צלעות כבש']
+    result = benchmark(catalog, queries)
+    print(f"קטלוג: {result['candidates']} מוצרים, {result['queries']} שאילתות")
+    print(f"מימוש קודם: {result['reference_seconds']:.3f}s")
+    print(f"קרנל:       {result['kernel_seconds']:.3f}s")
+    print(f"האצה:       x{result['speedup']:.1f}")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+בדיקת עומס לשרת ה-API - משווה בין מצבי הגישה למסד הנתונים (API_DB_MODE)
+מריץ את השרת על מסד נתונים זמני, שולח בקשות כבדות במקביל ומודד תפוקה,
+ובמקביל מודד את זמן התגובה של /health (שלא אמור להיחסם ע"י שאילתות איטיות).
+
+שימוש:
+    python load_test.py [--orders 200000] [--concurrency 16] [--requests 64]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import requests
+
+HEAVY_ENDPOINT = "/stats/orders"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not start")
+
+def _seed_orders(db_file: str, count: int):
+    """מכניס הזמנות ישירות ל-SQLite (הטבלאות נוצרות בעליית השרת)"""
+    statuses = ["pending", "confirmed", "delivered"]
+    items = json.dumps([{"name": "שניצל עוף", "quantity": 1}], ensure_ascii=False)
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.executemany(
+            "INSERT INTO orders (customer_name, customer_phone, items, status, total_amount, final_total) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((f"לקוח {i}", f"050{i:07d}", items, statuses[i % 3], 100.0, 100.0) for i in range(count))
+        )
+    conn.close()
+
+def _measure(base_url: str, concurrency: int, total_requests: int) -> Dict[str, float]:
+    """תפוקה של בקשות כבדות במקביל + השהיית /health בזמן העומס"""
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency + 1))
+    health_latencies = []
+    stop = threading.Event()
+
+    def probe_health():
+        while not stop.is_set():
+            started = time.perf_counter()
+            requests.get(f"{base_url}/health", timeout=60)
+            health_latencies.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    def heavy(_):
+        return session.get(f"{base_url}{HEAVY_ENDPOINT}", timeout=120).status_code
+
+    session.get(f"{base_url}{HEAVY_ENDPOINT}", timeout=120)  # חימום
+
+    prober = threading.Thread(target=probe_health, daemon=True)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(heavy, range(total_requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    health_latencies.sort()
+    return {
+        "requests": total_requests,
+        "errors": sum(1 for code in statuses if code != 200),
+        "seconds": elapsed,
+        "throughput": total_requests / elapsed,
+        "health_p50_ms": health_latencies[len(health_latencies) // 2] * 1000 if health_latencies else 0.0,
+        "health_max_ms": health_latencies[-1] * 1000 if health_latencies else 0.0,
+    }
+
+def run_mode(mode: str, orders: int, concurrency: int, total_requests: int) -> Dict[str, Dict[str, float]]:
+    """מריץ שרת במצב נתון ומודד עם בקשה אחת בכל פעם ועם concurrency בקשות במקביל"""
+    workdir = tempfile.mkdtemp(prefix=f"zoares-load-{mode}-")
+    db_file = os.path.join(workdir, "load.db")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, API_DB_MODE=mode, DATABASE_URL=f"sqlite:///{db_file}",
+               ZOARES_EVENT_CHANNEL=os.path.join(workdir, "events"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_until_up(base_url)
+        _seed_orders(db_file, orders)
+        return {
+            "serial": _measure(base_url, 1, total_requests),
+            "concurrent": _measure(base_url, concurrency, total_requests),
+        }
+    finally:
+        server.terminate()
+        server.wait(10)
+
+def main():
+    parser = argparse.ArgumentParser(description="בדיקת עומס: inline מול threadpool")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    args = parser.parse_args()
+
+    for mode in ("inline", "threadpool"):
+        result = run_mode(mode, args.orders, args.concurrency, args.requests)
+        serial, concurrent = result["serial"], result["concurrent"]
+        print(f"[{mode}]")
+        print(f"  בקשה אחת בכל פעם: {serial['throughput']:.1f} req/s")
+        print(f"  {args.concurrency} במקביל:        {concurrent['throughput']:.1f} req/s "
+              f"(x{concurrent['throughput'] / serial['throughput']:.2f}), שגיאות: {concurrent['errors']}")
+        print(f"  /health בזמן עומס:  p50 {concurrent['health_p50_ms']:.1f}ms, max {concurrent['health_max_ms']:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import sqlite3
 import json
 from datetime import datetime
 from database import SessionLocal, Customer, Order, Product, SystemEvent
-from services import CustomerService, ProductService
+from services import CustomerService, ProductService, StatsService
 
 def migrate_customers():
     """העברת לקוחות ממסד הנתונים הישן"""
@@ -332,6 +332,13 @@ def main():
         # Create system events
         create_system_events()
         
+        # Rows were written directly - rebuild the dashboard counters
+        db = SessionLocal()
+        try:
+            StatsService.rebuild(db)
+        finally:
+            db.close()
+        
         print("=" * 50)
         print("תהליך ההעברה הושלם בהצלחה!")
         print(f"סה\"כ הועברו:")
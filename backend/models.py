@@ -106,6 +106,27 @@ class OrderResponse(OrderBase):
                 return []
         return v
 
+# Batch order ingestion
+MAX_ORDER_BATCH_SIZE = 500
+
+class OrderBatchCreate(BaseModel):
+    # Raw payloads - each one is validated as OrderCreate separately so one bad
+    # order is reported in its own result instead of rejecting the whole batch
+    orders: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_ORDER_BATCH_SIZE, description="הזמנות לקליטה")
+
+class OrderBatchItemResult(BaseModel):
+    index: int = Field(..., description="מיקום ההזמנה בבקשה")
+    success: bool = Field(..., description="האם ההזמנה נקלטה")
+    order_id: Optional[int] = Field(None, description="מזהה ההזמנה שנוצרה")
+    customer_id: Optional[int] = Field(None, description="מזהה הלקוח המקושר")
+    error: Optional[str] = Field(None, description="סיבת הכשלון")
+
+class OrderBatchResponse(BaseModel):
+    total: int = Field(..., description="הזמנות בבקשה")
+    created: int = Field(..., description="הזמנות שנקלטו")
+    failed: int = Field(..., description="הזמנות שנדחו")
+    results: List[OrderBatchItemResult] = Field(..., description="תוצאה לכל הזמנה, לפי הסדר")
+
 # Product Models
 class ProductBase(BaseModel):
     name: str = Field(..., description="שם המוצר")
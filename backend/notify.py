@@ -0,0 +1,195 @@
+"""
+התראות בין תהליכי שרת ה-API (כמה workers של uvicorn) - בלי מתווך חיצוני
+כל worker מאזין ב-Unix datagram socket משלו בתיקייה משותפת. אחרי שמירת אירוע,
+ה-worker ששמר שולח את האירוע לכל השאר, וכל אחד מפיץ אותו למנויי הזרם שלו.
+"""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_CHANNEL_DIR = os.getenv(
+    "ZOARES_EVENT_CHANNEL", os.path.join(tempfile.gettempdir(), "zoares-events")
+)
+MAX_DATAGRAM_SIZE = 60000  # אירוע גדול יותר נשלח בלי שדה data
+SEND_TIMEOUT = 0.05  # שניות להמתנה כשתור ה-socket של worker מלא (פרץ אירועים)
+SOCKET_PREFIX = "worker-"
+SUPPORTED = hasattr(socket, "AF_UNIX")  # בלי Unix sockets (Windows ישן) - worker יחיד, בלי התראות
+
+class WorkerNotifier:
+    """ערוץ התראות בין workers באותו מחשב (תיקייה אחת = ערוץ אחד)"""
+
+    def __init__(self, channel_dir: str = DEFAULT_CHANNEL_DIR):
+        self.channel_dir = channel_dir
+        self.path: Optional[str] = None
+        self._sock: Optional[socket.socket] = None
+        self._sender: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {'sent': 0, 'received': 0, 'dropped': 0, 'stale_removed': 0}
+
+    def start(self, on_event: Callable[[Dict[str, Any]], None]):
+        """מאזין להתראות מ-workers אחרים ומעביר כל אירוע ל-on_event"""
+        if not SUPPORTED:
+            return
+        with self._lock:
+            if self._sock is not None:
+                return
+            os.makedirs(self.channel_dir, exist_ok=True)
+            self.path = os.path.join(self.channel_dir, f"{SOCKET_PREFIX}{os.getpid()}.sock")
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            self._sock = sock
+            self._thread = threading.Thread(
+                target=self._listen, args=(sock, on_event), name="zoares-worker-notifier", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """סוגר את ה-socket ומוחק אותו מהתיקייה"""
+        with self._lock:
+            sock, self._sock = self._sock, None
+            path, self.path = self.path, None
+        if sock is not None:
+            sock.close()
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+    def _listen(self, sock: socket.socket, on_event: Callable[[Dict[str, Any]], None]):
+        while True:
+            try:
+                datagram = sock.recv(MAX_DATAGRAM_SIZE + 1024)
+            except OSError:
+                return  # socket נסגר ב-stop()
+            try:
+                event = json.loads(datagram.decode("utf-8"))
+            except ValueError:
+                continue
+            self._stats['received'] += 1
+            try:
+                on_event(event)
+            except Exception as e:
+                print(f"ERROR: worker notification handler failed: {str(e)}")
+
+    def notify(self, event: Dict[str, Any]):
+        """שולח את האירוע לכל ה-workers האחרים (המתנה קצרה בלבד; worker שמת מוסר מהתיקייה)"""
+        if not SUPPORTED or not os.path.isdir(self.channel_dir):
+            return
+        payload = json.dumps(event, ensure_ascii=False).encode("utf-8")
+        if len(payload) > MAX_DATAGRAM_SIZE:
+            payload = json.dumps(dict(event, data=None), ensure_ascii=False).encode("utf-8")
+
+        with self._lock:
+            if self._sender is None:
+                self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sender.settimeout(SEND_TIMEOUT)
+            sender = self._sender
+            own_path = self.path
+
+        for name in os.listdir(self.channel_dir):
+            if not name.startswith(SOCKET_PREFIX):
+                continue
+            target = os.path.join(self.channel_dir, name)
+            if target == own_path:
+                continue
+            try:
+                sender.sendto(payload, target)
+                self._stats['sent'] += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # אין מאזין - socket של worker שכבר לא רץ
+                try:
+                    os.unlink(target)
+                    self._stats['stale_removed'] += 1
+                except OSError:
+                    pass
+            except (BlockingIOError, TimeoutError):
+                # ה-worker לא מרוקן את התור - מוותרים; הלקוחות שלו ישלימו עם Last-Event-ID
+                self._stats['dropped'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['listening'] = self._sock is not None
+        return stats
+
+worker_notifier = WorkerNotifier()
+
+def _self_test_worker(channel_dir: str, ready, results, expected: int):
+    """worker בבדיקה - מאזין ומדווח את זמן ההגעה של כל אירוע"""
+    received = threading.Event()
+    count = [0]
+
+    def on_event(event):
+        results.put((os.getpid(), event['id'], time.time() - event['sent_at']))
+        count[0] += 1
+        if count[0] >= expected:
+            received.set()
+
+    notifier = WorkerNotifier(channel_dir)
+    notifier.start(on_event)
+    ready.release()
+    received.wait(10)
+    notifier.stop()
+
+def self_test(workers: int = 4, events: int = 20) -> Dict[str, Any]:
+    """מריץ כמה תהליכים מקומיים, שולח אירועים מתהליך נוסף ובודק שכולם קיבלו את כולם"""
+    import multiprocessing
+    import shutil
+
+    channel_dir = tempfile.mkdtemp(prefix="zoares-notify-test-")
+    context = multiprocessing.get_context("spawn")
+    ready = context.Semaphore(0)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_self_test_worker, args=(channel_dir, ready, results, events))
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            if not ready.acquire(timeout=30):
+                raise AssertionError("worker did not start")
+
+        # תהליך שכותב אירועים (בלי מאזין משלו - כמו סקריפט מיגרציה)
+        publisher = WorkerNotifier(channel_dir)
+        for event_id in range(1, events + 1):
+            publisher.notify({'id': event_id, 'entity_type': 'order', 'sent_at': time.time()})
+
+        latencies = []
+        seen = set()
+        for _ in range(workers * events):
+            pid, event_id, latency = results.get(timeout=10)
+            seen.add((pid, event_id))
+            latencies.append(latency)
+        for process in processes:
+            process.join(10)
+        if len(seen) != workers * events:
+            raise AssertionError(f"expected {workers * events} deliveries, got {len(seen)}")
+        latencies.sort()
+        return {
+            'workers': workers,
+            'events': events,
+            'deliveries': len(seen),
+            'median_ms': latencies[len(latencies) // 2] * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        shutil.rmtree(channel_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    import sys
+    if '--self-test' in sys.argv:
+        result = self_test()
+        print(f"workers: {result['workers']}, אירועים: {result['events']}, מסירות: {result['deliveries']}")
+        print(f"השהיה חציונית: {result['median_ms']:.2f}ms, מקסימלית: {result['max_ms']:.2f}ms")
+    else:
+        print("שימוש: python notify.py --self-test")
@@ -1,9 +1,19 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, case
+from sqlalchemy import exc as sa_exc
 from typing import List, Optional, Tuple, Dict, Any
+import asyncio
+import atexit
 import json
-from datetime import datetime, timedelta
-from database import Customer, Order, Product, SystemEvent
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from database import SessionLocal, engine, Customer, Order, Product, StatsCounter, SystemEvent
+from fuzzy import bounded_distances, levenshtein_distance
+from notify import worker_notifier
 from models import CustomerCreate, CustomerUpdate, OrderCreate, OrderUpdate, ProductCreate, ProductUpdate
 
 # Customer Services
@@ -13,6 +23,7 @@ class CustomerService:
         """יצירת לקוח חדש"""
         db_customer = Customer(**customer_data.dict())
         db.add(db_customer)
+        StatsService.apply(db, {StatsService.CUSTOMERS_TOTAL: (1, 0.0)})
         db.commit()
         db.refresh(db_customer)
         
@@ -37,12 +48,26 @@ class CustomerService:
     @staticmethod
     def update_customer_stats(db: Session, customer_id: int, order_amount: float):
         """עדכון סטטיסטיקות לקוח"""
-        customer = db.query(Customer).filter(Customer.id == customer_id).first()
-        if customer:
-            customer.total_orders += 1
-            customer.total_amount += order_amount
-            customer.updated_at = datetime.now()
-            db.commit()
+        CustomerService.add_order_stats(db, customer_id, 1, order_amount)
+        db.commit()
+    
+    @staticmethod
+    def add_order_stats(db: Session, customer_id: int, orders_count: int, amount: float,
+                        previous_orders: Optional[int] = None):
+        """הוספת הזמנות לסטטיסטיקות הלקוח בתוך הטרנזקציה הפתוחה (UPDATE אחד, בלי commit)
+        
+        previous_orders - מספר ההזמנות של הלקוח לפני העדכון, אם כבר ידוע (חוסך שאילתה).
+        """
+        if previous_orders is None:
+            previous_orders = db.query(Customer.total_orders).filter(Customer.id == customer_id).scalar()
+        if previous_orders == 0 and orders_count > 0:
+            # First order - the customer becomes active
+            StatsService.apply(db, {StatsService.CUSTOMERS_ACTIVE: (1, 0.0)})
+        db.query(Customer).filter(Customer.id == customer_id).update({
+            Customer.total_orders: Customer.total_orders + orders_count,
+            Customer.total_amount: Customer.total_amount + amount,
+            Customer.updated_at: datetime.now()
+        }, synchronize_session=False)
     
     @staticmethod
     def get_all_customers(db: Session, skip: int = 0, limit: int = 100) -> List[Customer]:
@@ -53,43 +78,125 @@ class CustomerService:
 class OrderService:
     @staticmethod
     def create_order(db: Session, order_data: OrderCreate) -> Order:
-        """יצירת הזמנה חדשה"""
+        """יצירת הזמנה חדשה - לקוח, הזמנה ואירוע בטרנזקציה אחת (commit יחיד)"""
         # Convert items to JSON string
         items_json = json.dumps([item.dict() for item in order_data.items], ensure_ascii=False)
         
-        # Find or create customer
+        # Find customer
         customer = CustomerService.get_customer_by_phone(db, order_data.customer_phone)
+        customer_id = customer.id if customer else None
         
-        if customer:
-            customer_id = customer.id
-            # Update customer stats
-            CustomerService.update_customer_stats(db, customer.id, order_data.final_total)
-        else:
-            customer_id = None
-        
-        db_order = Order(
-            customer_id=customer_id,
-            customer_name=order_data.customer_name,
-            customer_phone=order_data.customer_phone,
-            customer_address=order_data.customer_address,
-            items=items_json,
-            total_amount=order_data.total_amount,
-            delivery_cost=order_data.delivery_cost,
-            final_total=order_data.final_total,
-            notes=order_data.notes
-        )
+        try:
+            # Update customer stats (no commit - part of the order's transaction)
+            if customer_id is not None:
+                CustomerService.add_order_stats(db, customer_id, 1, order_data.final_total,
+                                                previous_orders=customer.total_orders or 0)
+            
+            db_order = Order(
+                customer_id=customer_id,
+                customer_name=order_data.customer_name,
+                customer_phone=order_data.customer_phone,
+                customer_address=order_data.customer_address,
+                items=items_json,
+                total_amount=order_data.total_amount,
+                delivery_cost=order_data.delivery_cost,
+                final_total=order_data.final_total,
+                notes=order_data.notes
+            )
+            db.add(db_order)
+            db.flush()
+            StatsService.apply(db, StatsService.order_deltas(StatsService.NEW_ORDER_STATUS, order_data.final_total))
+            
+            # Log system event in the same transaction
+            events = SystemEventService.add_events(db, [(
+                "order_created", db_order.id, "order",
+                {"order_id": db_order.id, "customer_phone": db_order.customer_phone}
+            )])
+            event_ids = [event.id for event in events]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
-        db.add(db_order)
-        db.commit()
+        # Subscribers are notified only after the order is durable
+        SystemEventService.publish_events(db, event_ids)
         db.refresh(db_order)
+        return db_order
+    
+    @staticmethod
+    def create_orders_batch(db: Session, orders_data: List[OrderCreate]) -> List[Order]:
+        """יצירת הזמנות רבות בטרנזקציה אחת (שאילתת לקוחות אחת, עדכון סטטיסטיקות מצטבר)"""
+        if not orders_data:
+            return []
         
-        # Log system event
-        SystemEventService.log_event(
-            db, "order_created", db_order.id, "order",
-            {"order_id": db_order.id, "customer_phone": db_order.customer_phone}
-        )
+        # Resolve all customer phones in one query
+        phones = {order_data.customer_phone for order_data in orders_data}
+        customers = {c.phone: c for c in db.query(Customer).filter(Customer.phone.in_(phones)).all()}
         
-        return db_order
+        try:
+            db_orders = []
+            totals: Dict[int, Tuple[int, float]] = {}
+            for order_data in orders_data:
+                customer = customers.get(order_data.customer_phone)
+                if customer:
+                    count, amount = totals.get(customer.id, (0, 0.0))
+                    totals[customer.id] = (count + 1, amount + order_data.final_total)
+                db_orders.append(Order(
+                    customer_id=customer.id if customer else None,
+                    customer_name=order_data.customer_name,
+                    customer_phone=order_data.customer_phone,
+                    customer_address=order_data.customer_address,
+                    items=json.dumps([item.dict() for item in order_data.items], ensure_ascii=False),
+                    total_amount=order_data.total_amount,
+                    delivery_cost=order_data.delivery_cost,
+                    final_total=order_data.final_total,
+                    notes=order_data.notes
+                ))
+            
+            # One flush = batched INSERT for all orders (ids come back for the events)
+            db.add_all(db_orders)
+            db.flush()
+            
+            # Customer stats - one update per customer, not per order
+            previous = {c.id: c.total_orders or 0 for c in customers.values()}
+            for customer_id, (count, amount) in totals.items():
+                CustomerService.add_order_stats(db, customer_id, count, amount, previous_orders=previous[customer_id])
+            
+            # Dashboard counters - one upsert for the whole batch
+            deltas: Dict[str, Tuple[int, float]] = {}
+            for order_data in orders_data:
+                StatsService.merge(deltas, StatsService.order_deltas(StatsService.NEW_ORDER_STATUS, order_data.final_total))
+            StatsService.apply(db, deltas)
+            
+            events = SystemEventService.add_events(db, [
+                ("order_created", db_order.id, "order",
+                 {"order_id": db_order.id, "customer_phone": db_order.customer_phone, "batch": True})
+                for db_order in db_orders
+            ])
+            event_ids = [event.id for event in events]
+            created = [(db_order.id, db_order.customer_id) for db_order in db_orders]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        # Every order is committed from here on - post-commit failures are logged, never raised,
+        # so callers don't report the batch as failed (and clients don't retry into duplicates)
+        try:
+            SystemEventService.publish_events(db, event_ids)
+        except Exception as e:
+            print(f"ERROR: publishing batch order events failed: {str(e)}")
+        
+        # Reload the committed orders in one query, in request order
+        order_ids = [order_id for order_id, _ in created]
+        try:
+            by_id = {o.id: o for o in db.query(Order).filter(Order.id.in_(order_ids)).all()}
+            return [by_id[order_id] for order_id in order_ids]
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: reloading {len(order_ids)} committed batch orders failed: {str(e)}")
+            # Detached orders carrying the committed ids
+            return [Order(id=order_id, customer_id=customer_id) for order_id, customer_id in created]
     
     @staticmethod
     def get_order_by_id(db: Session, order_id: int) -> Optional[Order]:
@@ -108,6 +215,8 @@ class OrderService:
         if not db_order:
             return None
         
+        old_status, old_total = db_order.status, db_order.final_total or 0.0
+        
         # Update fields
         update_data = order_data.dict(exclude_unset=True)
         for field, value in update_data.items():
@@ -116,6 +225,11 @@ class OrderService:
             else:
                 setattr(db_order, field, value)
         
+        # Move the order between status/day counters in the same transaction
+        deltas = StatsService.order_deltas(old_status, old_total, db_order.created_at, sign=-1)
+        StatsService.merge(deltas, StatsService.order_deltas(db_order.status, db_order.final_total or 0.0, db_order.created_at))
+        StatsService.apply(db, deltas)
+        
         db_order.updated_at = datetime.now()
         db.commit()
         db.refresh(db_order)
@@ -142,6 +256,137 @@ class OrderService:
         result = db.query(func.max(Order.id)).scalar()
         return (result or 0) + 1
 
+# Product Catalog Snapshot
+CATALOG_REVALIDATE_SECONDS = 30  # כל כמה זמן לבדוק אם עובד אחר שינה את הקטלוג
+
+@dataclass(frozen=True)
+class CatalogProduct:
+    """מוצר בתמונת המצב של הקטלוג (מנותק מה-Session, בלתי משתנה)"""
+    id: int
+    name: str
+    category: str
+    price_per_kg: Optional[float]
+    price_per_unit: Optional[float]
+    unit_type: str
+    is_weight_product: bool
+    is_unit_product: bool
+    created_at: datetime
+    updated_at: datetime
+
+class CatalogSnapshot:
+    """תמונת מצב בלתי משתנה של קטלוג המוצרים עם אינדקסים לפי מזהה, קטגוריה, שם וטריגרמות
+    
+    החיפוש המטושטש מחשב מרחק עריכה רק למוצרים שחולקים לפחות טריגרמה אחת עם השאילתה,
+    כך שהעלות תלויה במספר המועמדים ולא בגודל הקטלוג.
+    """
+    
+    def __init__(self, products: List[CatalogProduct], signature):
+        self.signature = signature
+        self.products = tuple(products)
+        self.by_id = {product.id: product for product in self.products}
+        self.by_name = {product.name: product for product in self.products}
+        by_category: Dict[str, List[CatalogProduct]] = {}
+        postings: Dict[str, List[int]] = {}
+        self._lowered = {}
+        for product in self.products:
+            by_category.setdefault(product.category, []).append(product)
+            name_lower = product.name.lower()
+            self._lowered[product.id] = name_lower
+            for gram in self.trigrams(name_lower):
+                postings.setdefault(gram, []).append(product.id)
+        self.by_category = {category: tuple(items) for category, items in by_category.items()}
+        self._postings = {gram: tuple(ids) for gram, ids in postings.items()}
+    
+    @staticmethod
+    def trigrams(text: str) -> set:
+        """טריגרמות עם ריפוד - גם מילים קצרות ותחילת המחרוזת מקבלות טריגרמות"""
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    def candidates(self, query_lower: str, category: Optional[str] = None) -> List[Tuple[CatalogProduct, str]]:
+        """מחזיר (מוצר, שם באותיות קטנות) של המוצרים שחולקים טריגרמה עם השאילתה"""
+        ids = set()
+        for gram in self.trigrams(query_lower):
+            ids.update(self._postings.get(gram, ()))
+        result = []
+        for product_id in sorted(ids):
+            product = self.by_id[product_id]
+            if category and product.category != category:
+                continue
+            result.append((product, self._lowered[product_id]))
+        return result
+
+class ProductCatalogCache:
+    """מטמון תהליך לתמונת המצב של הקטלוג - מוחלף באופן אטומי אחרי יצירה/עדכון מוצר"""
+    
+    def __init__(self, revalidate_seconds: float = CATALOG_REVALIDATE_SECONDS):
+        self.revalidate_seconds = revalidate_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'rebuilds': 0}
+    
+    @staticmethod
+    def _signature(db: Session):
+        """חתימת הקטלוג (כמות + עדכון אחרון) - משתנה גם כשעובד אחר שינה מוצר"""
+        return tuple(db.query(func.count(Product.id), func.max(Product.updated_at)).one())
+    
+    def _build(self, db: Session) -> CatalogSnapshot:
+        signature = self._signature(db)
+        products = [
+            CatalogProduct(
+                id=p.id, name=p.name, category=p.category,
+                price_per_kg=p.price_per_kg, price_per_unit=p.price_per_unit,
+                unit_type=p.unit_type, is_weight_product=p.is_weight_product,
+                is_unit_product=p.is_unit_product,
+                created_at=p.created_at, updated_at=p.updated_at
+            )
+            for p in db.query(Product).order_by(Product.id).all()
+        ]
+        self._stats['rebuilds'] += 1
+        return CatalogSnapshot(products, signature)
+    
+    def get(self, db: Session, revalidate: bool = False) -> CatalogSnapshot:
+        """מחזיר את תמונת המצב הנוכחית (בודק מול מסד הנתונים לכל היותר פעם ב-revalidate_seconds)"""
+        snapshot = self._snapshot
+        if snapshot is not None and not revalidate and time.monotonic() - self._checked_at < self.revalidate_seconds:
+            self._stats['hits'] += 1
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                self._stats['revalidations'] += 1
+                if self._signature(db) == snapshot.signature:
+                    self._checked_at = time.monotonic()
+                    self._stats['hits'] += 1
+                    return snapshot
+            self._stats['misses'] += 1
+            snapshot = self._build(db)
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+    
+    def refresh(self, db: Session):
+        """בונה תמונת מצב חדשה ומחליף אותה באופן אטומי"""
+        with self._lock:
+            self._snapshot = self._build(db)
+            self._checked_at = time.monotonic()
+    
+    def invalidate(self):
+        """מבטל את תמונת המצב - הקריאה הבאה תבנה חדשה"""
+        with self._lock:
+            self._snapshot = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """מחזיר מוני פגיעות/החטאות ואת גודל הקטלוג"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['products'] = len(self._snapshot.products) if self._snapshot else 0
+        return stats
+
+product_catalog = ProductCatalogCache()
+
 # Product Services
 class ProductService:
     @staticmethod
@@ -151,6 +396,7 @@ class ProductService:
         db.add(db_product)
         db.commit()
         db.refresh(db_product)
+        product_catalog.refresh(db)
         
         # Log system event
         SystemEventService.log_event(
@@ -161,19 +407,28 @@ class ProductService:
         return db_product
     
     @staticmethod
-    def get_product_by_name(db: Session, name: str) -> Optional[Product]:
+    def get_product_by_id(db: Session, product_id: int) -> Optional[CatalogProduct]:
+        """קבלת מוצר לפי מזהה"""
+        product = product_catalog.get(db).by_id.get(product_id)
+        if product is None:
+            # ייתכן שהמוצר נוצר בעובד אחר - בדיקה מול מסד הנתונים
+            product = product_catalog.get(db, revalidate=True).by_id.get(product_id)
+        return product
+    
+    @staticmethod
+    def get_product_by_name(db: Session, name: str) -> Optional[CatalogProduct]:
         """קבלת מוצר לפי שם"""
-        return db.query(Product).filter(Product.name == name).first()
+        return product_catalog.get(db).by_name.get(name)
     
     @staticmethod
-    def get_products_by_category(db: Session, category: str) -> List[Product]:
+    def get_products_by_category(db: Session, category: str) -> List[CatalogProduct]:
         """קבלת מוצרים לפי קטגוריה"""
-        return db.query(Product).filter(Product.category == category).all()
+        return list(product_catalog.get(db).by_category.get(category, ()))
     
     @staticmethod
-    def get_all_products(db: Session) -> List[Product]:
+    def get_all_products(db: Session) -> List[CatalogProduct]:
         """קבלת כל המוצרים"""
-        return db.query(Product).all()
+        return list(product_catalog.get(db).products)
     
     @staticmethod
     def update_product(db: Session, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
@@ -190,6 +445,7 @@ class ProductService:
         db_product.updated_at = datetime.now()
         db.commit()
         db.refresh(db_product)
+        product_catalog.refresh(db)
         
         # Log system event
         SystemEventService.log_event(
@@ -204,40 +460,30 @@ class SearchService:
     @staticmethod
     def levenshtein_distance(s1: str, s2: str) -> int:
         """חישוב מרחק Levenshtein בין שתי מחרוזות"""
-        if len(s1) < len(s2):
-            return SearchService.levenshtein_distance(s2, s1)
-        
-        if len(s2) == 0:
-            return len(s1)
-        
-        previous_row = list(range(len(s2) + 1))
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        
-        return previous_row[-1]
+        return levenshtein_distance(s1, s2)
     
     @staticmethod
     def smart_search(db: Session, query: str, category: Optional[str] = None, limit: int = 10) -> Tuple[List[Dict], List[str]]:
         """חיפוש חכם עם תיקון שגיאות כתיב והצעות"""
-        # Get products to search in
-        if category and category != "כל הקטגוריות":
-            products = ProductService.get_products_by_category(db, category)
-        else:
-            products = ProductService.get_all_products(db)
+        if category == "כל הקטגוריות":
+            category = None
         
-        if not products:
+        # Get candidate products from the catalog snapshot
+        query_lower = query.lower()
+        candidates = product_catalog.get(db).candidates(query_lower, category)
+        
+        if not candidates:
             return [], []
         
+        # Calculate all distances in one pass, bounded by the largest distance
+        # that can still pass the similarity threshold (or make a suggestion)
+        longest = max(len(query), max(len(product.name) for product, _ in candidates))
+        max_distance = max(3, int(0.6 * longest))
+        distances = bounded_distances(query_lower, [name_lower for _, name_lower in candidates], max_distance)
+        
         # Calculate similarities
         results = []
-        for product in products:
-            distance = SearchService.levenshtein_distance(query.lower(), product.name.lower())
+        for (product, _name_lower), distance in zip(candidates, distances):
             max_len = max(len(query), len(product.name))
             similarity = 1 - (distance / max_len)
             
@@ -263,24 +509,118 @@ class SearchService:
         results.sort(key=lambda x: x["similarity"], reverse=True)
         results = results[:limit]
         
-        # Generate suggestions
+        # Generate suggestions (from the distances already computed)
         suggestions = []
         if not results:
-            # Find similar product names for suggestions
-            all_product_names = [p.name for p in products]
-            for name in all_product_names:
-                if len(name) >= 3:  # Only suggest names with 3+ characters
-                    distance = SearchService.levenshtein_distance(query.lower(), name.lower())
+            for (product, _name_lower), distance in zip(candidates, distances):
+                if len(product.name) >= 3:  # Only suggest names with 3+ characters
                     if distance <= 3:  # Suggest if distance is small
-                        suggestions.append(f"האם התכוונת ל: {name}")
+                        suggestions.append(f"האם התכוונת ל: {product.name}")
         
         return results, suggestions
 
 # System Event Services
+STREAM_QUEUE_SIZE = 256  # הודעות ממתינות למנוי איטי לפני שהוא מנותק
+
+# System events retention and query caps
+EVENT_QUERY_MAX_RESULTS = 1000  # hard cap for any events query
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "180"))
+EVENT_PRUNE_CHUNK_SIZE = 5000  # rows deleted per transaction
+
+def event_to_dict(event: SystemEvent) -> Dict[str, Any]:
+    """אירוע מערכת בפורמט שנשלח ללקוחות"""
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "entity_id": event.entity_id,
+        "entity_type": event.entity_type,
+        "data": json.loads(event.data) if event.data else None,
+        "timestamp": event.created_at.isoformat() if event.created_at else None
+    }
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """הודעת Server-Sent Events אחת (עם id: לחידוש החיבור)"""
+    return f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+class EventSubscription:
+    """מנוי אחד לזרם - תור חסום בלולאת האירועים של החיבור"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+    
+    def offer(self, item: Tuple[int, str]):
+        """Runs on the subscriber's loop; a full queue disconnects the subscriber"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and end the stream - it reconnects
+            # with Last-Event-ID and catches up from the database
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+class EventBroadcaster:
+    """מפיץ אירועים בתוך התהליך - כל אירוע נשלח לכל המנויים בלי שאילתה למסד הנתונים"""
+    
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: set = set()
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'disconnected_slow': 0}
+    
+    def subscribe(self) -> EventSubscription:
+        """Must be called from the connection's event loop"""
+        subscription = EventSubscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: EventSubscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if subscription.overflowed:
+                self._stats['disconnected_slow'] += 1
+    
+    def publish(self, event: Dict[str, Any]):
+        """שולח אירוע לכל המנויים (בטוח לקריאה מכל thread)"""
+        item = (event['id'], format_sse(event))
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, item)
+            except RuntimeError:
+                # Loop already closed - the connection is gone
+                self.unsubscribe(subscription)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+        return stats
+
+event_broadcaster = EventBroadcaster()
+
 class SystemEventService:
     @staticmethod
-    def log_event(db: Session, event_type: str, entity_id: Optional[int], entity_type: str, data: Optional[Dict] = None):
-        """תיעוד אירוע מערכת"""
+    def log_event(db: Session, event_type: str, entity_id: Optional[int], entity_type: str,
+                  data: Optional[Dict] = None, strict: bool = False):
+        """תיעוד אירוע מערכת ופרסומו למנויי הזרם (בתהליך הזה ובשאר ה-workers)
+        
+        ברירת המחדל - האירוע נכנס לחוצץ ונכתב באצווה ברקע (בלי commit נוסף לכל פעולה).
+        strict=True (או EVENT_WRITE_MODE=sync) - נכתב מיד בטרנזקציה של הקורא, לפי הסדר.
+        """
+        if not strict and event_writer.enabled:
+            event_writer.submit(event_type, entity_id, entity_type, data)
+            return
+        
         event_data = json.dumps(data, ensure_ascii=False) if data else None
         db_event = SystemEvent(
             event_type=event_type,
@@ -290,14 +630,490 @@ class SystemEventService:
         )
         db.add(db_event)
         db.commit()
+        
+        # Load id/created_at once per event, independent of the number of subscribers
+        db.refresh(db_event)
+        event = event_to_dict(db_event)
+        event_broadcaster.publish(event)
+        worker_notifier.notify(event)
     
     @staticmethod
-    def get_recent_events(db: Session, hours: int = 24) -> List[SystemEvent]:
-        """קבלת אירועים אחרונים"""
+    def add_events(db: Session, events: List[Tuple[str, Optional[int], str, Optional[Dict]]]) -> List[SystemEvent]:
+        """הוספת אירועים רבים לטרנזקציה הפתוחה (בלי commit) - לפרסם אחרי ה-commit עם publish_events"""
+        db_events = [
+            SystemEvent(
+                event_type=event_type,
+                entity_id=entity_id,
+                entity_type=entity_type,
+                data=json.dumps(data, ensure_ascii=False) if data else None
+            )
+            for event_type, entity_id, entity_type, data in events
+        ]
+        db.add_all(db_events)
+        db.flush()
+        return db_events
+    
+    @staticmethod
+    def publish_events(db: Session, event_ids: List[int]):
+        """פרסום אירועים שכבר נשמרו למנויי הזרם (שאילתה אחת לכל האצווה)"""
+        if not event_ids:
+            return
+        for db_event in db.query(SystemEvent).filter(SystemEvent.id.in_(event_ids)).order_by(SystemEvent.id.asc()).all():
+            event = event_to_dict(db_event)
+            event_broadcaster.publish(event)
+            worker_notifier.notify(event)
+    
+    @staticmethod
+    def get_events_after(db: Session, last_event_id: int, limit: int = 100) -> List[SystemEvent]:
+        """אירועים שאחרי מזהה נתון (לחידוש זרם), מהישן לחדש"""
+        return db.query(SystemEvent).filter(SystemEvent.id > last_event_id).order_by(SystemEvent.id.asc()).limit(limit).all()
+    
+    @staticmethod
+    def flush_events():
+        """כתיבת האירועים שבחוצץ מיד (למשל לפני קריאת אירועים מהמסד)"""
+        event_writer.flush()
+    
+    @staticmethod
+    def get_recent_events(db: Session, hours: int = 24, limit: int = EVENT_QUERY_MAX_RESULTS) -> List[SystemEvent]:
+        """קבלת אירועים אחרונים (לכל היותר EVENT_QUERY_MAX_RESULTS)"""
         since = datetime.now() - timedelta(hours=hours)
-        return db.query(SystemEvent).filter(SystemEvent.created_at >= since).order_by(SystemEvent.created_at.desc()).all()
+        return db.query(SystemEvent).filter(
+            SystemEvent.created_at >= since
+        ).order_by(SystemEvent.created_at.desc()).limit(min(limit, EVENT_QUERY_MAX_RESULTS)).all()
+    
+    @staticmethod
+    def get_events_by_type(db: Session, event_type: str, limit: int = 100, hours: Optional[int] = None) -> List[SystemEvent]:
+        """קבלת אירועים לפי סוג (לכל היותר EVENT_QUERY_MAX_RESULTS)"""
+        query = db.query(SystemEvent).filter(SystemEvent.event_type == event_type)
+        if hours is not None:
+            query = query.filter(SystemEvent.created_at >= datetime.now() - timedelta(hours=hours))
+        return query.order_by(SystemEvent.created_at.desc()).limit(min(limit, EVENT_QUERY_MAX_RESULTS)).all()
+    
+    @staticmethod
+    def prune_events(db: Session, retention_days: int = EVENT_RETENTION_DAYS,
+                     chunk_size: int = EVENT_PRUNE_CHUNK_SIZE, archive_path: Optional[str] = None) -> int:
+        """מחיקת אירועים ישנים מ-retention_days, במנות קטנות (טרנזקציה קצרה לכל מנה)
+        
+        archive_path - אם ניתן, האירועים נכתבים קודם לקובץ JSON Lines (שורה לאירוע).
+        """
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        removed = 0
+        while True:
+            if archive_path:
+                # Oldest first, through ix_system_events_created_at - full rows only for the archive
+                chunk = db.query(SystemEvent).filter(
+                    SystemEvent.created_at < cutoff
+                ).order_by(SystemEvent.created_at.asc()).limit(chunk_size).all()
+                if not chunk:
+                    return removed
+                
+                with open(archive_path, "a", encoding="utf-8") as archive:
+                    for event in chunk:
+                        archive.write(json.dumps(event_to_dict(event), ensure_ascii=False) + "\n")
+                
+                ids = [event.id for event in chunk]
+                deleted = db.query(SystemEvent).filter(SystemEvent.id.in_(ids)).delete(synchronize_session=False)
+            else:
+                # No archive - the rows are never loaded, the oldest chunk is deleted through a subquery
+                oldest = db.query(SystemEvent.id).filter(
+                    SystemEvent.created_at < cutoff
+                ).order_by(SystemEvent.created_at.asc()).limit(chunk_size).scalar_subquery()
+                deleted = db.query(SystemEvent).filter(SystemEvent.id.in_(oldest)).delete(synchronize_session=False)
+            db.commit()
+            removed += deleted
+            if deleted < chunk_size:
+                return removed
+
+# Write-behind event buffer
+EVENT_WRITE_MODE = os.getenv("EVENT_WRITE_MODE", "buffered").lower()  # buffered / sync
+EVENT_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_FLUSH_INTERVAL_MS", "50"))
+EVENT_FLUSH_MAX_EVENTS = int(os.getenv("EVENT_FLUSH_MAX_EVENTS", "200"))
+EVENT_BUFFER_MAX_PENDING = 10000  # beyond this the oldest pending events are dropped
+EVENT_FLUSH_MAX_RETRIES = 3  # consecutive failures of a batch before it is written one event at a time
+
+def is_transient_db_error(error: Exception) -> bool:
+    """שגיאה זמנית (מסד נעול, חיבור שנפל, המתנה למאגר) - שווה לנסות שוב את אותה כתיבה"""
+    if isinstance(error, (sa_exc.OperationalError, sa_exc.TimeoutError)):
+        return True
+    return isinstance(error, sa_exc.DBAPIError) and error.connection_invalidated
+
+class EventWriteBuffer:
+    """חוצץ כתיבה לאירועי מערכת - אוסף בזיכרון וכותב ב-INSERT מרובה שורות
+    כל EVENT_FLUSH_INTERVAL_MS מילישניות או כש-EVENT_FLUSH_MAX_EVENTS ממתינים"""
+    
+    def __init__(self, session_factory=SessionLocal, enabled: bool = EVENT_WRITE_MODE != "sync",
+                 flush_interval_ms: int = EVENT_FLUSH_INTERVAL_MS, max_batch: int = EVENT_FLUSH_MAX_EVENTS,
+                 max_pending: int = EVENT_BUFFER_MAX_PENDING):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one writer at a time keeps event ids in submit order
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._atexit_registered = False
+        self._failures = 0  # consecutive failed flushes of the batch at the front
+        self._stats = {'submitted': 0, 'written': 0, 'batches': 0, 'failed_batches': 0, 'publish_failures': 0, 'dropped': 0,
+                       'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0}
+    
+    def submit(self, event_type: str, entity_id: Optional[int], entity_type: str, data: Optional[Dict] = None):
+        """הוספת אירוע לחוצץ (לא חוסם)"""
+        with self._cond:
+            self._pending.append((event_type, entity_id, entity_type, data))
+            self._stats['submitted'] += 1
+            self._drop_overflow()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+            if self._thread is None:
+                self._start()
+    
+    def _start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="zoares-event-writer", daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            # Scripts (e.g. migrate_data) exit without a shutdown hook - write what is left
+            atexit.register(self.stop)
+            self._atexit_registered = True
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            self.flush()
+    
+    def flush(self) -> int:
+        """כותב את כל האירועים הממתינים (באצוות של max_batch) - מחזיר כמה נכתבו"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                if not batch:
+                    return written
+                error = self._write(batch)
+                if error is None:
+                    self._failures = 0
+                    written += len(batch)
+                    continue
+                
+                self._failures += 1
+                if is_transient_db_error(error) and self._failures < EVENT_FLUSH_MAX_RETRIES:
+                    self._requeue(batch)
+                    return written
+                
+                # Permanent error (or the batch keeps failing) - one event at a time, dropping bad events
+                self._failures = 0
+                isolated, completed = self._write_each(batch)
+                written += isolated
+                if not completed:
+                    return written
+    
+    def _requeue(self, events: List[Tuple[str, Optional[int], str, Optional[Dict]]]):
+        """מחזיר אירועים לראש התור לכתיבה הבאה (אלא אם החוצץ התמלא בינתיים)"""
+        with self._cond:
+            self._pending.extendleft(reversed(events))
+            self._drop_overflow()
+    
+    def _drop_overflow(self):
+        """זורק את האירועים הוותיקים מעבר ל-max_pending (נקרא עם self._cond)"""
+        while len(self._pending) > self.max_pending:
+            self._drop(self._pending.popleft(), f"event buffer full ({self.max_pending} pending)")
+    
+    def _drop(self, event: Tuple[str, Optional[int], str, Optional[Dict]], reason: str):
+        """רושם אירוע שלא ייכתב (נקרא עם self._cond)"""
+        event_type, entity_id, entity_type, _ = event
+        print(f"ERROR: dropping system event {event_type} ({entity_type} {entity_id}): {reason}")
+        self._stats['dropped'] += 1
+    
+    def _write_each(self, batch: List[Tuple[str, Optional[int], str, Optional[Dict]]]) -> Tuple[int, bool]:
+        """כותב אצווה שנכשלה אירוע-אירוע: אירוע עם שגיאה קבועה נזרק, שגיאה זמנית מחזירה את השאר לתור"""
+        written = 0
+        for index, event in enumerate(batch):
+            error = self._write([event])
+            if error is None:
+                written += 1
+            elif is_transient_db_error(error):
+                self._requeue(batch[index:])
+                return written, False
+            else:
+                with self._cond:
+                    self._drop(event, str(error))
+        return written, True
+    
+    def _write(self, batch: List[Tuple[str, Optional[int], str, Optional[Dict]]]) -> Optional[Exception]:
+        """כותב אצווה בטרנזקציה אחת ומפרסם אותה - מחזיר את השגיאה אם ה-commit נכשל"""
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            try:
+                events = SystemEventService.add_events(db, batch)
+                event_ids = [event.id for event in events]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"ERROR: event buffer flush failed ({len(batch)} events): {str(e)}")
+                with self._cond:
+                    self._stats['failed_batches'] += 1
+                return e
+            
+            # The batch is committed from here on - a publish failure must not re-queue it
+            try:
+                SystemEventService.publish_events(db, event_ids)
+            except Exception as e:
+                print(f"ERROR: publishing {len(event_ids)} written events failed: {str(e)}")
+                with self._cond:
+                    self._stats['publish_failures'] += 1
+        finally:
+            db.close()
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+            self._stats['total_flush_ms'] += elapsed_ms
+        return None
+    
+    def stop(self):
+        """עוצר את ה-thread וכותב את מה שנשאר בחוצץ - מה שלא נכתב גם אחרי ניסיונות חוזרים נרשם כאבוד"""
+        with self._cond:
+            self._stopped = True
+            self._thread = None
+            self._cond.notify_all()
+        # flush() re-queues a batch after a transient error - retry it before giving up
+        for attempt in range(EVENT_FLUSH_MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(self.flush_interval)
+            self.flush()
+            with self._cond:
+                if not self._pending:
+                    return
+        with self._cond:
+            while self._pending:
+                self._drop(self._pending.popleft(), "not written before shutdown")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """עומק התור, כמויות ואיחור הכתיבה (ms)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._pending)
+        total_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = total_ms / stats['batches'] if stats['batches'] else 0.0
+        stats['mode'] = 'buffered' if self.enabled else 'sync'
+        return stats
+
+event_writer = EventWriteBuffer()
+
+# Dashboard Statistics
+# SQLite's func.now() stores UTC; other databases store the server's local time
+STATS_TIMES_ARE_UTC = engine.dialect.name == "sqlite"
+
+class StatsService:
+    """מוני סטטיסטיקה (טבלת stats_counters) שמתעדכנים באותה טרנזקציה של כתיבת ההזמנה/הלקוח"""
+    
+    NEW_ORDER_STATUS = "pending"
+    NON_REVENUE_STATUSES = ("cancelled",)  # not counted in the day buckets
+    STATUS_PREFIX = "orders:status:"
+    DAY_PREFIX = "orders:day:"
+    CUSTOMERS_TOTAL = "customers:total"
+    CUSTOMERS_ACTIVE = "customers:active"
+    
+    @staticmethod
+    def local_day(created_at: Optional[datetime] = None) -> date:
+        """היום (לפי שעון השרת) שאליו שייכת הזמנה"""
+        if created_at is None:
+            return date.today()
+        if STATS_TIMES_ARE_UTC:
+            return created_at.replace(tzinfo=timezone.utc).astimezone().date()
+        return created_at.date()
+    
+    @staticmethod
+    def day_key(day: date) -> str:
+        return f"{StatsService.DAY_PREFIX}{day.isoformat()}"
+    
+    @staticmethod
+    def order_deltas(status: Optional[str], amount: float, created_at: Optional[datetime] = None,
+                     sign: int = 1) -> Dict[str, Tuple[int, float]]:
+        """שינויי המונים של הזמנה אחת (sign=-1 להוצאתה מהמונים)"""
+        deltas = {f"{StatsService.STATUS_PREFIX}{status}": (sign, sign * amount)}
+        if status not in StatsService.NON_REVENUE_STATUSES:
+            deltas[StatsService.day_key(StatsService.local_day(created_at))] = (sign, sign * amount)
+        return deltas
+    
+    @staticmethod
+    def merge(target: Dict[str, Tuple[int, float]], deltas: Dict[str, Tuple[int, float]]):
+        for key, (count, amount) in deltas.items():
+            current_count, current_amount = target.get(key, (0, 0.0))
+            target[key] = (current_count + count, current_amount + amount)
+    
+    @staticmethod
+    def apply(db: Session, deltas: Dict[str, Tuple[int, float]]):
+        """מוסיף את השינויים למונים בטרנזקציה הפתוחה - upsert אחד לכל השינויים (בלי commit)"""
+        rows = [{"key": key, "count": count, "amount": amount}
+                for key, (count, amount) in deltas.items() if count or amount]
+        if not rows:
+            return
+        
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as upsert_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as upsert_insert
+            statement = upsert_insert(StatsCounter).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[StatsCounter.key],
+                set_={
+                    "count": StatsCounter.count + statement.excluded["count"],
+                    "amount": StatsCounter.amount + statement.excluded.amount,
+                }
+            )
+            db.execute(statement)
+            return
+        
+        for row in rows:
+            updated = db.query(StatsCounter).filter(StatsCounter.key == row["key"]).update({
+                StatsCounter.count: StatsCounter.count + row["count"],
+                StatsCounter.amount: StatsCounter.amount + row["amount"],
+            }, synchronize_session=False)
+            if not updated:
+                db.add(StatsCounter(**row))
+        db.flush()
+    
+    @staticmethod
+    def lock_counters(db: Session, wait: bool = True) -> bool:
+        """נועל את המונים לכתיבה בטרנזקציה הפתוחה, לפני קריאת הטבלאות - False אם wait=False ו-worker אחר מחזיק בנעילה
+        
+        כתיבות הזמנות מעדכנות את המונים באותה טרנזקציה, כך שאחרי הנעילה הקריאות
+        רואות את כל מה שכבר נספר ושום שינוי חדש לא נכנס עד ה-commit.
+        """
+        connection = db.connection()
+        dialect = connection.dialect.name
+        try:
+            if dialect == "sqlite":
+                # pysqlite opens a transaction only before a write - an open one already holds the write lock
+                if connection.connection.dbapi_connection.in_transaction:
+                    return True
+                if wait:
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                    return True
+                busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+                connection.exec_driver_sql("PRAGMA busy_timeout = 0")
+                try:
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                finally:
+                    connection.exec_driver_sql(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+            elif dialect == "postgresql":
+                # Blocks the counter upserts of concurrent order writes (and waits for those already made)
+                connection.exec_driver_sql(
+                    "LOCK TABLE stats_counters IN SHARE ROW EXCLUSIVE MODE" + ("" if wait else " NOWAIT")
+                )
+        except sa_exc.OperationalError:
+            if wait:
+                raise
+            db.rollback()
+            return False
+        return True
+    
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """בונה את כל המונים מחדש מהטבלאות (אחרי מיגרציה או לתיקון) - מחזיר כמה מונים נכתבו"""
+        # The write lock comes first - deltas committed between the reads and the delete would be lost
+        StatsService.lock_counters(db)
+        return StatsService._rebuild_locked(db)
+    
+    @staticmethod
+    def _rebuild_locked(db: Session) -> int:
+        counters: Dict[str, Tuple[int, float]] = {}
+        
+        # One GROUP BY status pass for the status counters
+        for status, count, amount in db.query(
+            Order.status, func.count(Order.id), func.coalesce(func.sum(Order.final_total), 0.0)
+        ).group_by(Order.status):
+            counters[f"{StatsService.STATUS_PREFIX}{status}"] = (count, float(amount))
+        
+        # Day buckets follow the server's local day, so they are grouped here rather than in SQL
+        for created_at, final_total in db.query(Order.created_at, Order.final_total).filter(
+            Order.status.notin_(StatsService.NON_REVENUE_STATUSES)
+        ).yield_per(5000):
+            StatsService.merge(counters, {StatsService.day_key(StatsService.local_day(created_at)): (1, final_total or 0.0)})
+        
+        total_customers, active_customers = db.query(
+            func.count(Customer.id), func.coalesce(func.sum(case((Customer.total_orders > 0, 1), else_=0)), 0)
+        ).one()
+        counters[StatsService.CUSTOMERS_TOTAL] = (total_customers, 0.0)
+        counters[StatsService.CUSTOMERS_ACTIVE] = (int(active_customers), 0.0)
+        
+        db.query(StatsCounter).delete(synchronize_session=False)
+        db.add_all(StatsCounter(key=key, count=count, amount=amount) for key, (count, amount) in counters.items())
+        db.commit()
+        return len(counters)
+    
+    @staticmethod
+    def ensure(db: Session):
+        """בונה את המונים אם הטבלה ריקה (הפעלה ראשונה על מסד נתונים קיים)
+        
+        כמה workers עולים יחד - אם worker אחר כבר מחזיק בנעילה, הוא זה שבונה.
+        """
+        if db.query(StatsCounter.key).first() is not None:
+            return
+        if not StatsService.lock_counters(db, wait=False):
+            return
+        # Another worker may have finished the rebuild before the lock was taken
+        if db.query(StatsCounter.key).first() is None:
+            StatsService._rebuild_locked(db)
+        else:
+            db.rollback()
+    
+    @staticmethod
+    def get_order_stats(db: Session) -> Dict[str, Any]:
+        """סטטיסטיקות הזמנות משאילתה אחת על המונים (לפי סטטוס, היום, השבוע והחודש)"""
+        today = date.today()
+        week_start = today - timedelta(days=(today.weekday() + 1) % 7)  # השבוע מתחיל ביום ראשון
+        month_start = today.replace(day=1)
+        
+        status_prefix = StatsService.STATUS_PREFIX
+        rows = db.query(StatsCounter).filter(or_(
+            and_(StatsCounter.key >= status_prefix, StatsCounter.key < status_prefix[:-1] + ";"),
+            StatsCounter.key.between(StatsService.day_key(min(week_start, month_start)), StatsService.day_key(today))
+        )).all()
+        
+        by_status: Dict[str, int] = {}
+        periods = {name: {"orders": 0, "revenue": 0.0} for name in ("today", "week", "month")}
+        for row in rows:
+            if row.key.startswith(status_prefix):
+                by_status[row.key[len(status_prefix):]] = row.count
+                continue
+            day = date.fromisoformat(row.key[len(StatsService.DAY_PREFIX):])
+            for name, start in (("today", today), ("week", week_start), ("month", month_start)):
+                if day >= start:
+                    periods[name]["orders"] += row.count
+                    periods[name]["revenue"] += row.amount
+        
+        return {
+            "total_orders": sum(by_status.values()),
+            "pending_orders": by_status.get("pending", 0),
+            "confirmed_orders": by_status.get("confirmed", 0),
+            "delivered_orders": by_status.get("delivered", 0),
+            "by_status": by_status,
+            **periods
+        }
     
     @staticmethod
-    def get_events_by_type(db: Session, event_type: str, limit: int = 100) -> List[SystemEvent]:
-        """קבלת אירועים לפי סוג"""
-        return db.query(SystemEvent).filter(SystemEvent.event_type == event_type).order_by(SystemEvent.created_at.desc()).limit(limit).all()
+    def get_customer_stats(db: Session) -> Dict[str, int]:
+        """סטטיסטיקות לקוחות מהמונים"""
+        counts = dict(db.query(StatsCounter.key, StatsCounter.count).filter(
+            StatsCounter.key.in_([StatsService.CUSTOMERS_TOTAL, StatsService.CUSTOMERS_ACTIVE])
+        ).all())
+        return {
+            "total_customers": counts.get(StatsService.CUSTOMERS_TOTAL, 0),
+            "active_customers": counts.get(StatsService.CUSTOMERS_ACTIVE, 0)
+        }
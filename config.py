@@ -21,8 +21,18 @@ class ServerConfig:
     ACTIVE_API_URL = EXTERNAL_API_URL or DEFAULT_API_URL
     
     # הגדרות חיבור
-    TIMEOUT = 30  # שניות
+    TIMEOUT = 30  # שניות (זמן המתנה לתגובה)
+    CONNECT_TIMEOUT = 3.05  # שניות להקמת חיבור
     MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.3  # שניות - בסיס להמתנה האקספוננציאלית בין ניסיונות
+    POOL_CONNECTIONS = 4  # מספר מאגרי חיבורים (לפי שרת)
+    POOL_MAXSIZE = 20  # חיבורים פתוחים לשרת - לפי מספר הסשנים המקבילים
+    FETCH_MAX_WORKERS = 4  # קריאות מקבילות ב-fetch_many (לוחות בקרה)
+    
+    # בדיקת בריאות ברקע ומפסק זרם
+    HEALTH_CHECK_INTERVAL = 15  # שניות בין בדיקות בריאות
+    CIRCUIT_FAILURE_THRESHOLD = 3  # כשלונות רצופים עד לחסימת בקשות לשרת
+    CIRCUIT_RESET_TIMEOUT = 30  # שניות עד לניסיון חוזר אחרי חסימה
     
     # הגדרות סנכרון
     SYNC_INTERVAL = 30  # שניות
@@ -18,9 +18,13 @@ st.set_page_config(
 # Import database functions
 from database import (
     load_orders, save_order, find_or_create_customer, 
-    update_customer_stats, cleanup_old_customers
+    update_customer_stats, cleanup_old_customers, iter_orders,
+    ensure_schema, search_orders
 )
 
+# עדכון סכמה קיימת (יומן שינויים וטריגרים) - פעם אחת לכל תהליך
+ensure_schema()
+
 # Add backend directory to path for API client
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 try:
@@ -30,6 +34,9 @@ except ImportError:
     API_AVAILABLE = False
     st.warning("⚠️ לא ניתן לטעון את קליינט ה-API. המערכת תפעל במצב offline.")
 
+# מרחק עריכה משותף עם שרת ה-API
+from backend.fuzzy import bounded_distances
+
 # הגדרת CSS מותאם אישית
 st.markdown("""
 <style>
@@ -104,6 +111,9 @@ if 'clear_sidebar_search_flag' not in st.session_state:
 if 'selected_page' not in st.session_state:
     st.session_state.selected_page = "הזמנת מוצרים"
 
+# מספר תוצאות החיפוש המרבי בדף מעקב ההזמנות
+TRACKING_SEARCH_LIMIT = 200
+
 # הגדרת קטגוריות המוצרים - מתוקן לפי הקובץ המקורי
 PRODUCT_CATEGORIES = {
     "עופות": [
@@ -439,26 +449,6 @@ def get_product_unit(product_name):
         # ברירת מחדל
         return "ק\"ג"
 
-def levenshtein_distance(s1, s2):
-    """חישוב מרחק Levenshtein בין שתי מחרוזות"""
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    
-    if len(s2) == 0:
-        return len(s1)
-    
-    previous_row = list(range(len(s2) + 1))
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    
-    return previous_row[-1]
-
 def smart_search(query, products, max_distance=2):
     """חיפוש חכם עם תיקון שגיאות כתיב והצעות דומות"""
     if not query:
@@ -468,9 +458,10 @@ def smart_search(query, products, max_distance=2):
     if API_AVAILABLE:
         try:
             api_client = create_api_client()
-            api_results = api_client.search_products(query)
-            if api_results:
-                return api_results
+            if api_client.health_check():
+                api_results = api_client.search_products(query)
+                if api_results:
+                    return api_results
         except Exception as e:
             st.debug(f"API search failed: {e}")
     
@@ -478,16 +469,17 @@ def smart_search(query, products, max_distance=2):
     results = []
     query_lower = query.lower()
     
+    # חיפוש מדויק
+    fuzzy_products = []
     for product in products:
-        product_lower = product.lower()
-        
-        # חיפוש מדויק
-        if query_lower in product_lower:
+        if query_lower in product.lower():
             results.append((product, 0, "מדויק"))
-            continue
-        
-        # חיפוש עם שגיאות כתיב
-        distance = levenshtein_distance(query_lower, product_lower)
+        else:
+            fuzzy_products.append(product)
+    
+    # חיפוש עם שגיאות כתיב - כל המוצרים מול השאילתה במעבר אחד
+    distances = bounded_distances(query_lower, [product.lower() for product in fuzzy_products], max_distance)
+    for product, distance in zip(fuzzy_products, distances):
         if distance <= max_distance:
             if distance == 1:
                 similarity = "דומה מאוד"
@@ -1041,17 +1033,9 @@ def show_tracking_page():
             st.warning(f"לא ניתן לטעון הזמנות מה-API: {e}")
             st.info("המערכת תטען הזמנות מהמסד הנתונים המקומי")
     
-    # אם אין הזמנות מה-API, טען מהמסד הנתונים המקומי
-    if not orders:
-        try:
-            orders = load_orders()
-        except Exception as e:
-            st.error(f"שגיאה בטעינת הזמנות: {e}")
-            orders = []
-    
-    if not orders:
-        st.info("אין הזמנות להצגה")
-        return
+    # אם אין הזמנות מה-API, ההזמנות נטענות מהמסד הנתונים המקומי - אחרי תיבת החיפוש,
+    # כדי שחיפוש ירוץ רק מול אינדקס החיפוש בלי לטעון את כל ההזמנות
+    local_orders = not orders
     
     # סינון הזמנות
     col1, col2 = st.columns([2, 1])
@@ -1065,6 +1049,33 @@ def show_tracking_page():
             ["כל הסטטוסים", "ממתין", "בטיפול", "הושלם", "בוטל"]
         )
     
+    searched = False
+    if local_orders:
+        # חיפוש במסד המקומי דרך אינדקס החיפוש (שם, טלפון, הערות ומוצרים) - מדורג לפי התאמה
+        if search_term:
+            try:
+                hits = search_orders(search_term, tables=('orders',), limit=TRACKING_SEARCH_LIMIT + 1)
+                orders = [hit['record'] for hit in hits[:TRACKING_SEARCH_LIMIT]]
+                searched = True
+                search_term = ''
+                if len(hits) > TRACKING_SEARCH_LIMIT:
+                    st.info(f"מוצגות {TRACKING_SEARCH_LIMIT} התוצאות המתאימות ביותר - צמצם את החיפוש כדי לראות את השאר")
+            except Exception as e:
+                st.warning(f"שגיאה בחיפוש: {e}")
+        
+        # בלי חיפוש (או כשהחיפוש נכשל) - כל ההזמנות
+        # (שורות עם פענוח עצל - פריטים וכתובת מפוענחים רק להזמנות שמוצגות)
+        if not searched:
+            try:
+                orders = list(iter_orders())
+            except Exception as e:
+                st.error(f"שגיאה בטעינת הזמנות: {e}")
+                orders = []
+    
+    if not orders and not searched:
+        st.info("אין הזמנות להצגה")
+        return
+    
     # סינון התוצאות
     filtered_orders = []
     for order in orders:
@@ -1569,7 +1580,7 @@ def main():
     # סנכרון אוטומטי עם השרת (אם זמין)
     try:
         api_client = create_api_client()
-        auto_refresh_on_updates(api_client, refresh_interval=30)  # בדיקה כל 30 שניות
+        auto_refresh_on_updates(api_client, refresh_interval=30, entity_types=["order", "product"])
     except Exception as e:
         st.sidebar.warning(f"⚠️ בעיה בסנכרון: {str(e)}")
     
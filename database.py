@@ -1,16 +1,344 @@
 import sqlite3
 import json
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 
 # נתיב למסד הנתונים המרכזי
 DATABASE_FILE = 'zoares_central.db'
 
+# הגדרות מאגר החיבורים
+READ_POOL_SIZE = 4  # מספר מקסימלי של חיבורי קריאה פתוחים
+STATEMENT_CACHE_SIZE = 256  # גודל מטמון השאילתות המהודרות לכל חיבור
+CONNECTION_TIMEOUT = 30.0  # שניות המתנה לנעילת מסד הנתונים
+
+# טבלאות שהשינויים בהן נרשמים ביומן השינויים
+CHANGE_TRACKED_TABLES = ('orders', 'closed_orders', 'customers')
+
+# PRAGMAs שמוחלים פעם אחת בפתיחת כל חיבור
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=10000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+class ConnectionPool:
+    """מאגר חיבורים למסד הנתונים - חיבורי קריאה משותפים וחיבור כתיבה ייעודי"""
+    
+    def __init__(self, database_file: str, max_readers: int = READ_POOL_SIZE,
+                 cached_statements: int = STATEMENT_CACHE_SIZE, timeout: float = CONNECTION_TIMEOUT):
+        self.database_file = database_file
+        self.max_readers = max_readers
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        
+        self._condition = threading.Condition()
+        self._idle_readers: List[sqlite3.Connection] = []
+        self._open_readers = 0
+        
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        self._writer_depth = 0
+        
+        # חיבור ייעודי לקריאת PRAGMA data_version (לעולם לא כותב)
+        self._watcher: Optional[sqlite3.Connection] = None
+        self._watcher_lock = threading.Lock()
+        
+        self._stats = {
+            'connections_created': 0,
+            'read_checkouts': 0,
+            'write_checkouts': 0,
+            'read_waits': 0,
+            'read_wait_seconds': 0.0,
+            'write_wait_seconds': 0.0,
+        }
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """פותח חיבור חדש ומחיל עליו את ה-PRAGMAs פעם אחת"""
+        conn = sqlite3.connect(
+            self.database_file,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        with self._condition:
+            self._stats['connections_created'] += 1
+        return conn
+    
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """לוקח חיבור קריאה פנוי מהמאגר, פותח חדש או ממתין לשחרור"""
+        started = time.perf_counter()
+        waited = False
+        with self._condition:
+            while not self._idle_readers and self._open_readers >= self.max_readers:
+                if not waited:
+                    self._stats['read_waits'] += 1
+                    waited = True
+                self._condition.wait()
+            
+            if self._idle_readers:
+                conn = self._idle_readers.pop()
+            else:
+                conn = None
+                self._open_readers += 1
+            
+            self._stats['read_checkouts'] += 1
+            self._stats['read_wait_seconds'] += time.perf_counter() - started
+        
+        if conn is None:
+            try:
+                conn = self._create_connection()
+            except Exception:
+                with self._condition:
+                    self._open_readers -= 1
+                    self._condition.notify()
+                raise
+        return conn
+    
+    def _release_reader(self, conn: sqlite3.Connection, broken: bool = False):
+        """מחזיר חיבור קריאה למאגר"""
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                broken = True
+        
+        with self._condition:
+            if broken:
+                self._open_readers -= 1
+            else:
+                self._idle_readers.append(conn)
+            self._condition.notify()
+        
+        if broken:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+    
+    @contextmanager
+    def read(self):
+        """מחזיר חיבור קריאה מהמאגר לשימוש בתוך בלוק with"""
+        conn = self._acquire_reader()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))
+            raise
+        finally:
+            self._release_reader(conn, broken)
+    
+    @contextmanager
+    def write(self):
+        """מחזיר את חיבור הכתיבה הייעודי - commit בסיום ו-rollback בשגיאה"""
+        started = time.perf_counter()
+        self._writer_lock.acquire()
+        try:
+            with self._condition:
+                self._stats['write_checkouts'] += 1
+                self._stats['write_wait_seconds'] += time.perf_counter() - started
+            
+            if self._writer is None:
+                self._writer = self._create_connection()
+            conn = self._writer
+            
+            # בלוק כתיבה מקונן (באותו thread) מצטרף לטרנזקציה החיצונית
+            self._writer_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                if self._writer_depth == 1 and conn.in_transaction:
+                    conn.rollback()
+                raise
+            else:
+                if self._writer_depth == 1 and conn.in_transaction:
+                    conn.commit()
+            finally:
+                self._writer_depth -= 1
+        finally:
+            self._writer_lock.release()
+    
+    def data_version(self) -> int:
+        """מחזיר את PRAGMA data_version - משתנה בכל commit של חיבור אחר (כולל תהליכים אחרים)"""
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = self._create_connection()
+            return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """מחזיר סטטיסטיקות שימוש במאגר החיבורים"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['max_readers'] = self.max_readers
+            stats['open_readers'] = self._open_readers
+            stats['idle_readers'] = len(self._idle_readers)
+            stats['readers_in_use'] = self._open_readers - len(self._idle_readers)
+        stats['writer_open'] = self._writer is not None
+        stats['writer_busy'] = self._writer_depth > 0
+        return stats
+    
+    def close(self):
+        """סוגר את כל החיבורים הפנויים ואת חיבור הכתיבה"""
+        with self._condition:
+            idle, self._idle_readers = self._idle_readers, []
+            self._open_readers -= len(idle)
+        for conn in idle:
+            conn.close()
+        
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool() -> ConnectionPool:
+    """מחזיר את מאגר החיבורים של התהליך (נוצר מחדש אם DATABASE_FILE השתנה)"""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database_file == DATABASE_FILE:
+        return pool
+    
+    with _pool_lock:
+        if _pool is None or _pool.database_file != DATABASE_FILE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_FILE)
+        return _pool
+
+def read_connection():
+    """חיבור קריאה מהמאגר: with read_connection() as conn"""
+    return get_connection_pool().read()
+
+def write_connection():
+    """חיבור הכתיבה הייעודי: with write_connection() as conn"""
+    return get_connection_pool().write()
+
+def get_pool_stats() -> Dict[str, Any]:
+    """מחזיר סטטיסטיקות מאגר החיבורים"""
+    return get_connection_pool().get_stats()
+
+def close_connection_pool():
+    """סוגר את מאגר החיבורים של התהליך"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_data_version() -> int:
+    """אסימון שינוי זול למסד הנתונים - ערך שונה אומר שבוצע commit מאז הקריאה הקודמת"""
+    return get_connection_pool().data_version()
+
+class VersionedCache:
+    """מטמון תוצאות טעינה משותף לכל הסשנים בתהליך - מתרענן רק כשמסד הנתונים השתנה"""
+    
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'incremental_loads': 0, 'load_seconds': 0.0}
+    
+    def _lookup(self, key: str, version: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._stats['hits'] += 1
+                return True, entry[1]
+        return False, None
+    
+    def get(self, key: str, loader, incremental: bool = False):
+        """מחזיר את התוצאה השמורה אם הגרסה לא השתנתה, אחרת טוען מחדש
+        
+        במצב incremental הפונקציה loader מקבלת את הערך הקודם (או None) ומעדכנת אותו.
+        """
+        version = (DATABASE_FILE, get_data_version())
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        
+        # טעינה אחת בלבד לכל מפתח - סשנים מקבילים ממתינים לתוצאה
+        with load_lock:
+            found, value = self._lookup(key, version)
+            if found:
+                return value
+            
+            previous = None
+            if incremental:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is not None and entry[0][0] == DATABASE_FILE:
+                    previous = entry[1]
+            
+            started = time.perf_counter()
+            value = loader(previous) if incremental else loader()
+            with self._lock:
+                self._entries[key] = (version, value)
+                self._stats['misses'] += 1
+                if previous is not None:
+                    self._stats['incremental_loads'] += 1
+                self._stats['load_seconds'] += time.perf_counter() - started
+            return value
+    
+    def invalidate(self, key: Optional[str] = None):
+        """מבטל רשומה אחת או את כל המטמון"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """מחזיר סטטיסטיקות פגיעות במטמון"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+_load_cache = VersionedCache()
+
+def get_cache_stats() -> Dict[str, Any]:
+    """מחזיר סטטיסטיקות מטמון הטעינות"""
+    return _load_cache.get_stats()
+
+def invalidate_load_cache():
+    """מנקה את מטמון הטעינות (למשל אחרי שינוי ידני במסד הנתונים)"""
+    _load_cache.invalidate()
+
+_schema_ready = set()
+
 def init_database():
     """יוצר את מסד הנתונים המרכזי עם הטבלאות הנדרשות"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        _create_schema(conn.cursor())
+        apply_migrations(conn)
+    _schema_ready.add(DATABASE_FILE)
+
+def ensure_schema():
+    """מוודא פעם אחת לכל תהליך שהסכמה (כולל טבלאות וטריגרים חדשים) קיימת"""
+    if DATABASE_FILE not in _schema_ready:
+        init_database()
+
+def _create_schema(cursor):
+    """יוצר את הטבלאות (אידמפוטנטי)"""
     
     # טבלת הזמנות
     cursor.execute('''
@@ -75,102 +403,557 @@ def init_database():
         VALUES (1, 1)
     ''')
     
-    conn.commit()
-    conn.close()
+    # יומן שינויים - נכתב ע"י טריגרים, משמש לטעינת דלתא
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    for table in CHANGE_TRACKED_TABLES:
+        for op, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{op}_log
+                AFTER {op.upper()} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, op)
+                    VALUES ('{table}', {row}.id, '{op}');
+                END
+            ''')
+
+# אינדקס חיפוש טקסט מלא (FTS5) - שורה לכל הזמנה פעילה, הזמנה סגורה ולקוח.
+# rowid = id * SEARCH_ROWID_STRIDE + קוד המקור, כך שעדכון ומחיקה לפי rowid זולים.
+SEARCH_ROWID_STRIDE = 4
+SEARCH_SOURCES = {'orders': 0, 'closed_orders': 1, 'customers': 2}
+# עמודות שעדכון שלהן מחייב אינדוקס מחדש (עדכון סטטיסטיקות לקוח לא נוגע באינדקס)
+SEARCH_SOURCE_COLUMNS = {
+    'orders': 'id, customer_name, phone, delivery_notes, butcher_notes, items',
+    'closed_orders': 'id, customer_name, phone, delivery_notes, butcher_notes, items',
+    'customers': 'id, full_name, phone',
+}
+
+def _search_values_sql(table: str, row: str):
+    """ביטויי SQL לעמודות האינדקס (שם, טלפון, הערות, מוצרים) עבור שורה row של הטבלה"""
+    # טלפון נשמר ללא מקפים ורווחים כדי ש-"050-1234567" ו-"0501234567" יתאימו
+    phone = f"replace(replace(coalesce({row}.phone, ''), '-', ''), ' ', '')"
+    if table == 'customers':
+        return f"coalesce({row}.full_name, '')", phone, "''", "''"
+    notes = f"coalesce({row}.delivery_notes, '') || ' ' || coalesce({row}.butcher_notes, '')"
+    # שמות המוצרים הם המפתחות של ה-JSON של items
+    items = f"""coalesce((SELECT group_concat(key, ' ') FROM json_each(
+        CASE WHEN json_valid({row}.items) THEN {row}.items ELSE '{{}}' END
+    ) WHERE typeof(key) = 'text'), '')"""
+    return f"coalesce({row}.customer_name, '')", phone, notes, items
+
+def _fill_search_index(conn):
+    """ממלא את אינדקס החיפוש מכל הטבלאות (אחרי יצירה או בבנייה מחדש)"""
+    for table, code in SEARCH_SOURCES.items():
+        name, phone, notes, items = _search_values_sql(table, table)
+        conn.execute(f'''
+            INSERT INTO search_index (rowid, customer_name, phone, notes, items)
+            SELECT {table}.id * {SEARCH_ROWID_STRIDE} + {code}, {name}, {phone}, {notes}, {items}
+            FROM {table}
+        ''')
+
+def _create_search_index(conn):
+    """יוצר את טבלת FTS5, טריגרים לסנכרון וממלא אותה
+    
+    טוקנייזר trigram מתאים לעברית: מוצא גם מילים עם אותיות שימוש ("והעוף" עבור "עוף")
+    וגם חלקי מספרי טלפון. ב-SQLite ישן ללא trigram נופלים ל-unicode61 עם חיפוש תחיליות.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE search_index
+            USING fts5(customer_name, phone, notes, items, tokenize='trigram')
+        ''')
+    except sqlite3.OperationalError:
+        conn.execute('''
+            CREATE VIRTUAL TABLE search_index
+            USING fts5(customer_name, phone, notes, items,
+                       tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+        ''')
+    
+    for table, code in SEARCH_SOURCES.items():
+        name, phone, notes, items = _search_values_sql(table, 'NEW')
+        new_rowid = f'NEW.id * {SEARCH_ROWID_STRIDE} + {code}'
+        old_rowid = f'OLD.id * {SEARCH_ROWID_STRIDE} + {code}'
+        # מחיקה לפני הכנסה - INSERT OR REPLACE לא מפעיל את טריגר המחיקה
+        insert = f'''
+            DELETE FROM search_index WHERE rowid = {new_rowid};
+            INSERT INTO search_index (rowid, customer_name, phone, notes, items)
+            VALUES ({new_rowid}, {name}, {phone}, {notes}, {items});
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_search
+            AFTER INSERT ON {table}
+            BEGIN {insert} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_search
+            AFTER UPDATE OF {SEARCH_SOURCE_COLUMNS[table]} ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = {old_rowid};
+                {insert}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_search
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = {old_rowid};
+            END
+        ''')
+    
+    _fill_search_index(conn)
+
+# טבלאות סיכום יומיות לדפי הניתוח (הזמנות פעילות + סגורות יחד).
+# מתעדכנות בטריגרים באותה טרנזקציה של כל כתיבה להזמנות - הוספה מוסיפה את תרומת ההזמנה,
+# מחיקה מחסירה, ועדכון מחסיר את הישנה ומוסיף את החדשה (העברה לסגורות מתקזזת).
+ROLLUP_SOURCE_TABLES = ('orders', 'closed_orders')
+ROLLUP_TABLES = ('rollup_daily_totals', 'rollup_daily_products', 'rollup_daily_customers', 'rollup_product_customers')
+ROLLUP_SOURCE_COLUMNS = 'items, created_at, phone, customer_name, customer_id, total_amount'
+
+# כמות של פריט: מספר ישיר או {"quantity": ...}
+_ROLLUP_QUANTITY = ("COALESCE(CAST(CASE WHEN item.type = 'object' "
+                    "THEN json_extract(item.value, '$.quantity') ELSE item.value END AS REAL), 0)")
+
+def _rollup_day(row: str) -> str:
+    """ביטוי SQL ליום ההזמנה (ריק אם התאריך לא תקין)"""
+    return f"COALESCE(date({row}.created_at), '')"
+
+def _rollup_items(row: str) -> str:
+    """ביטוי SQL לפריטי ההזמנה כ-json_each (אובייקט ריק אם items לא תקין)"""
+    return (f"json_each(CASE WHEN json_valid({row}.items) AND json_type({row}.items) = 'object' "
+            f"THEN {row}.items ELSE '{{}}' END)")
+
+def _rollup_apply_sql(row: str, sign: int) -> str:
+    """גוף טריגר שמוסיף (+1) או מחסיר (-1) את תרומת שורת ההזמנה (NEW / OLD) מכל טבלאות הסיכום"""
+    day, items = _rollup_day(row), _rollup_items(row)
+    sql = f'''
+        INSERT INTO rollup_daily_totals (day, order_count, quantity, revenue)
+        SELECT {day}, {sign}, {sign} * (SELECT TOTAL({_ROLLUP_QUANTITY}) FROM {items} AS item),
+               {sign} * COALESCE({row}.total_amount, 0)
+        WHERE true
+        ON CONFLICT (day) DO UPDATE SET order_count = order_count + excluded.order_count,
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO rollup_daily_products (day, product, quantity, order_count)
+        SELECT {day}, item.key, {sign} * {_ROLLUP_QUANTITY}, {sign} FROM {items} AS item
+        WHERE true
+        ON CONFLICT (day, product) DO UPDATE SET quantity = quantity + excluded.quantity,
+            order_count = order_count + excluded.order_count;
+        INSERT INTO rollup_daily_customers (day, phone, customer_name, customer_id, order_count, quantity, revenue)
+        SELECT {day}, COALESCE({row}.phone, ''), COALESCE({row}.customer_name, ''), COALESCE({row}.customer_id, 0),
+               {sign}, {sign} * (SELECT TOTAL({_ROLLUP_QUANTITY}) FROM {items} AS item),
+               {sign} * COALESCE({row}.total_amount, 0)
+        WHERE true
+        ON CONFLICT (day, phone, customer_name, customer_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO rollup_product_customers (product, customer_id, order_count)
+        SELECT item.key, {row}.customer_id, {sign} FROM {items} AS item
+        WHERE {row}.customer_id IS NOT NULL
+        ON CONFLICT (product, customer_id) DO UPDATE SET order_count = order_count + excluded.order_count;
+    '''
+    if sign < 0:
+        # שורות שירדו לאפס הזמנות נמחקות (לפי המפתח הראשי - בלי סריקה)
+        sql += f'''
+        DELETE FROM rollup_daily_totals WHERE day = {day} AND order_count <= 0;
+        DELETE FROM rollup_daily_products WHERE day = {day} AND order_count <= 0;
+        DELETE FROM rollup_daily_customers WHERE day = {day} AND order_count <= 0;
+        DELETE FROM rollup_product_customers WHERE customer_id = {row}.customer_id AND order_count <= 0
+            AND product IN (SELECT key FROM {items});
+        '''
+    return sql
+
+def _fill_rollups(conn):
+    """ממלא את טבלאות הסיכום מכל ההזמנות הפעילות והסגורות (מיגרציה / בנייה מחדש)"""
+    source = ' UNION ALL '.join(f'SELECT {ROLLUP_SOURCE_COLUMNS} FROM {table}' for table in ROLLUP_SOURCE_TABLES)
+    day, items = _rollup_day('R'), _rollup_items('R')
+    conn.execute(f'''
+        WITH R AS ({source})
+        INSERT INTO rollup_daily_totals (day, order_count, quantity, revenue)
+        SELECT {day}, COUNT(*), TOTAL((SELECT TOTAL({_ROLLUP_QUANTITY}) FROM {items} AS item)),
+               TOTAL(COALESCE(R.total_amount, 0))
+        FROM R GROUP BY 1
+    ''')
+    conn.execute(f'''
+        WITH R AS ({source})
+        INSERT INTO rollup_daily_products (day, product, quantity, order_count)
+        SELECT {day}, item.key, TOTAL({_ROLLUP_QUANTITY}), COUNT(*)
+        FROM R, {items} AS item GROUP BY 1, 2
+    ''')
+    conn.execute(f'''
+        WITH R AS ({source})
+        INSERT INTO rollup_daily_customers (day, phone, customer_name, customer_id, order_count, quantity, revenue)
+        SELECT {day}, COALESCE(R.phone, ''), COALESCE(R.customer_name, ''), COALESCE(R.customer_id, 0), COUNT(*),
+               TOTAL((SELECT TOTAL({_ROLLUP_QUANTITY}) FROM {items} AS item)), TOTAL(COALESCE(R.total_amount, 0))
+        FROM R GROUP BY 1, 2, 3, 4
+    ''')
+    conn.execute(f'''
+        WITH R AS ({source})
+        INSERT INTO rollup_product_customers (product, customer_id, order_count)
+        SELECT item.key, R.customer_id, COUNT(*)
+        FROM R, {items} AS item WHERE R.customer_id IS NOT NULL GROUP BY 1, 2
+    ''')
+
+def _create_rollups(conn):
+    """יוצר את טבלאות הסיכום והטריגרים שמעדכנים אותן, וממלא אותן"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_daily_totals (
+            day TEXT PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            quantity REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_daily_products (
+            day TEXT NOT NULL,
+            product TEXT NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_daily_customers (
+            day TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            customer_name TEXT NOT NULL,
+            customer_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            quantity REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, phone, customer_name, customer_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_product_customers (
+            product TEXT NOT NULL,
+            customer_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product, customer_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    for table in ROLLUP_SOURCE_TABLES:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_rollup
+            AFTER INSERT ON {table}
+            BEGIN {_rollup_apply_sql('NEW', 1)} END
+        ''')
+        # רק עמודות שמשפיעות על הסיכומים (עדכון סטטוס לא נוגע בהם)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_rollup
+            AFTER UPDATE OF {ROLLUP_SOURCE_COLUMNS} ON {table}
+            BEGIN {_rollup_apply_sql('OLD', -1)} {_rollup_apply_sql('NEW', 1)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_rollup
+            AFTER DELETE ON {table}
+            BEGIN {_rollup_apply_sql('OLD', -1)} END
+        ''')
+    
+    _fill_rollups(conn)
+
+# מיגרציות סכמה - כל מיגרציה רצה פעם אחת לפי PRAGMA user_version
+# (version, תיאור, פקודות SQL או פונקציה שמקבלת את החיבור).
+# יש להוסיף מיגרציות חדשות רק בסוף הרשימה.
+SCHEMA_MIGRATIONS = [
+    (1, 'אינדקסים לנתיבי הגישה החמים', [
+        # מיון הזמנות פעילות + סריקת שמירה ב-cleanup_old_orders
+        'CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_phone ON orders (phone)',
+        # עמודים לפי (closed_at, id) + סריקת שמירה של הזמנות סגורות
+        'CREATE INDEX IF NOT EXISTS idx_closed_orders_closed_at ON closed_orders (closed_at)',
+        'CREATE INDEX IF NOT EXISTS idx_closed_orders_status_closed ON closed_orders (status, closed_at)',
+        'CREATE INDEX IF NOT EXISTS idx_closed_orders_phone ON closed_orders (phone)',
+        # מיון לקוחות + סריקת שמירה ב-cleanup_old_customers
+        'CREATE INDEX IF NOT EXISTS idx_customers_last_order_date ON customers (last_order_date)',
+        # ניקוי יומן השינויים
+        'CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log (changed_at)',
+    ]),
+    (2, 'אינדקס חיפוש טקסט מלא', _create_search_index),
+    (3, 'טבלאות סיכום יומיות לניתוח', _create_rollups),
+]
+
+def get_schema_version(conn) -> int:
+    """מחזיר את גרסת הסכמה השמורה בקובץ (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn) -> List[int]:
+    """מריץ את המיגרציות שטרם הורצו (בתוך טרנזקציית הכתיבה) ומחזיר את הגרסאות שהוחלו"""
+    current = get_schema_version(conn)
+    applied = []
+    for version, _description, migration in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        if callable(migration):
+            migration(conn)
+        else:
+            for statement in migration:
+                conn.execute(statement)
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+        applied.append(version)
+    if applied:
+        conn.execute('ANALYZE')
+    return applied
+
+# השאילתות הקריטיות - כל אחת חייבת להשתמש באינדקס ולא בסריקה מלאה
+CRITICAL_QUERIES = {
+    'orders_by_created_at': ('SELECT id FROM orders ORDER BY created_at DESC', ()),
+    'orders_by_status': ('SELECT id FROM orders WHERE status = ? ORDER BY created_at DESC', ('pending',)),
+    'orders_by_phone': ('SELECT id FROM orders WHERE phone = ?', ('0500000000',)),
+    'orders_retention': ('''SELECT id FROM orders WHERE created_at < datetime('now', '-20 days')
+                            AND status != 'completed\'''', ()),
+    'closed_orders_page': ('''SELECT id FROM closed_orders
+                              WHERE (closed_at < ? OR (closed_at = ? AND id < ?))
+                              ORDER BY closed_at DESC, id DESC LIMIT 51''', ('2024-01-01', '2024-01-01', 1)),
+    'closed_orders_by_status': ('''SELECT id FROM closed_orders WHERE status = ?
+                                   ORDER BY closed_at DESC, id DESC LIMIT 51''', ('completed',)),
+    'closed_orders_by_phone': ('SELECT id FROM closed_orders WHERE phone = ?', ('0500000000',)),
+    'closed_orders_retention': ("SELECT id FROM closed_orders WHERE closed_at < datetime('now', '-1825 days')", ()),
+    'customer_by_phone': ('SELECT id, full_name FROM customers WHERE phone = ?', ('0500000000',)),
+    'customers_retention': ("SELECT id FROM customers WHERE last_order_date < datetime('now', '-365 days')", ()),
+    'change_log_retention': ("SELECT seq FROM change_log WHERE changed_at < datetime('now', '-7 days')", ()),
+}
+
+def check_query_plans(queries: Optional[Dict[str, tuple]] = None) -> Dict[str, List[str]]:
+    """מריץ EXPLAIN QUERY PLAN על השאילתות הקריטיות ומחזיר את אלה שנופלות לסריקה מלאה או למיון זמני
+
+    התוצאה: {שם שאילתה: שורות התוכנית} - מילון ריק אם כל השאילתות משתמשות באינדקסים.
+    """
+    ensure_schema()
+    failures = {}
+    with read_connection() as conn:
+        for name, (sql, params) in (queries or CRITICAL_QUERIES).items():
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+            full_scan = any(
+                detail.startswith('SCAN ') and ' USING ' not in detail
+                for detail in plan
+            )
+            temp_sort = any('USE TEMP B-TREE FOR ORDER BY' in detail for detail in plan)
+            if full_scan or temp_sort:
+                failures[name] = plan
+    return failures
 
 def get_db_connection():
-    """מחזיר חיבור למסד הנתונים"""
-    conn = sqlite3.connect(DATABASE_FILE, timeout=30.0)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    conn.execute("PRAGMA cache_size=10000")
-    conn.execute("PRAGMA temp_store=MEMORY")
+    """מחזיר חיבור עצמאי למסד הנתונים (מחוץ למאגר - באחריות הקורא לסגור)"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=CONNECTION_TIMEOUT)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-# פונקציות לניהול הזמנות
-def load_orders() -> List[Dict[str, Any]]:
-    """טוען את כל ההזמנות הפעילות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# עמודות הטבלאות בסדר שבו נבנות הרשומות
+ORDER_COLUMNS = '''id, customer_name, phone, address, delivery_notes, 
+                   butcher_notes, items, status, created_at, total_amount, customer_id'''
+CLOSED_ORDER_COLUMNS = '''id, customer_name, phone, address, delivery_notes, 
+                   butcher_notes, items, status, created_at, closed_at, 
+                   total_amount, customer_id'''
+CUSTOMER_COLUMNS = '''id, phone, full_name, created_at, last_updated, 
+                   total_orders, total_spent, last_order_date'''
+
+def _order_from_row(row) -> Dict[str, Any]:
+    """בונה מילון הזמנה פעילה משורה של ORDER_COLUMNS"""
+    return {
+        'id': row[0],
+        'customer_name': row[1],
+        'phone': row[2],
+        'address': json.loads(row[3]) if row[3] else {},
+        'delivery_notes': row[4] or '',
+        'butcher_notes': row[5] or '',
+        'items': json.loads(row[6]) if row[6] else {},
+        'status': row[7],
+        'created_at': row[8],
+        'total_amount': row[9] or 0.0,
+        'customer_id': row[10]
+    }
+
+def _closed_order_from_row(row) -> Dict[str, Any]:
+    """בונה מילון הזמנה סגורה משורה של CLOSED_ORDER_COLUMNS"""
+    return {
+        'id': row[0],
+        'customer_name': row[1],
+        'phone': row[2],
+        'address': json.loads(row[3]) if row[3] else {},
+        'delivery_notes': row[4] or '',
+        'butcher_notes': row[5] or '',
+        'items': json.loads(row[6]) if row[6] else {},
+        'status': row[7],
+        'created_at': row[8],
+        'closed_at': row[9],
+        'total_amount': row[10] or 0.0,
+        'customer_id': row[11]
+    }
+
+def _customer_from_row(row) -> Dict[str, Any]:
+    """בונה מילון לקוח משורה של CUSTOMER_COLUMNS"""
+    return {
+        'id': row[0],
+        'phone': row[1],
+        'full_name': row[2],
+        'created_at': row[3],
+        'last_updated': row[4],
+        'total_orders': row[5],
+        'total_spent': row[6],
+        'last_order_date': row[7]
+    }
+
+# טבלה -> (עמודות, בונה רשומה)
+_ROW_BUILDERS = {
+    'orders': (ORDER_COLUMNS, _order_from_row),
+    'closed_orders': (CLOSED_ORDER_COLUMNS, _closed_order_from_row),
+    'customers': (CUSTOMER_COLUMNS, _customer_from_row),
+}
+
+_UNDECODED = object()
+
+def _decode_json_field(raw):
+    return json.loads(raw) if raw else {}
+
+class OrderRow:
+    """שורת הזמנה פעילה קומפקטית - address ו-items מפוענחים מ-JSON רק בגישה הראשונה
     
-    cursor.execute('''
-        SELECT id, customer_name, phone, address, delivery_notes, 
-               butcher_notes, items, status, created_at, total_amount, customer_id
+    תומכת בגישה כמו מילון (row['id'], row.get(...), 'phone' in row) ו-to_dict().
+    """
+    __slots__ = ('id', 'customer_name', 'phone', '_address_raw', '_address',
+                 'delivery_notes', 'butcher_notes', '_items_raw', '_items',
+                 'status', 'created_at', 'total_amount', 'customer_id')
+    
+    FIELDS = ('id', 'customer_name', 'phone', 'address', 'delivery_notes', 'butcher_notes',
+              'items', 'status', 'created_at', 'total_amount', 'customer_id')
+    
+    def __init__(self, row):
+        self._set_common(row)
+        self.total_amount = row[9] or 0.0
+        self.customer_id = row[10]
+    
+    def _set_common(self, row):
+        self.id = row[0]
+        self.customer_name = row[1]
+        self.phone = row[2]
+        self._address_raw = row[3]
+        self._address = _UNDECODED
+        self.delivery_notes = row[4] or ''
+        self.butcher_notes = row[5] or ''
+        self._items_raw = row[6]
+        self._items = _UNDECODED
+        self.status = row[7]
+        self.created_at = row[8]
+    
+    @property
+    def address(self):
+        if self._address is _UNDECODED:
+            self._address = _decode_json_field(self._address_raw)
+            self._address_raw = None
+        return self._address
+    
+    @property
+    def items(self):
+        if self._items is _UNDECODED:
+            self._items = _decode_json_field(self._items_raw)
+            self._items_raw = None
+        return self._items
+    
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __contains__(self, key):
+        return key in self.FIELDS
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def keys(self):
+        return self.FIELDS
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """ממיר למילון רגיל (מפענח את כל עמודות ה-JSON)"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r}, customer_name={self.customer_name!r}, status={self.status!r})"
+
+class ClosedOrderRow(OrderRow):
+    """שורת הזמנה סגורה קומפקטית - כמו OrderRow עם closed_at"""
+    __slots__ = ('closed_at',)
+    
+    FIELDS = ('id', 'customer_name', 'phone', 'address', 'delivery_notes', 'butcher_notes',
+              'items', 'status', 'created_at', 'closed_at', 'total_amount', 'customer_id')
+    
+    def __init__(self, row):
+        self._set_common(row)
+        self.closed_at = row[9]
+        self.total_amount = row[10] or 0.0
+        self.customer_id = row[11]
+
+def _iter_rows(query: str, row_type, chunk_size: int):
+    """מזרים שורות מהסמן במנות - החיבור מוחזק עד סוף האיטרציה"""
+    with read_connection() as conn:
+        cursor = conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row_type(row)
+
+def iter_orders(chunk_size: int = 500) -> Iterator[OrderRow]:
+    """מזרים את ההזמנות הפעילות כשורות OrderRow עם פענוח עצל"""
+    return _iter_rows(f'''
+        SELECT {ORDER_COLUMNS}
         FROM orders 
         ORDER BY created_at DESC
-    ''')
-    
-    rows = cursor.fetchall()
-    orders = []
-    
-    for row in rows:
-        order = {
-            'id': row[0],
-            'customer_name': row[1],
-            'phone': row[2],
-            'address': json.loads(row[3]) if row[3] else {},
-            'delivery_notes': row[4] or '',
-            'butcher_notes': row[5] or '',
-            'items': json.loads(row[6]) if row[6] else {},
-            'status': row[7],
-            'created_at': row[8],
-            'total_amount': row[9] or 0.0,
-            'customer_id': row[10]
-        }
-        orders.append(order)
+    ''', OrderRow, chunk_size)
+
+def iter_closed_orders(chunk_size: int = 500) -> Iterator[ClosedOrderRow]:
+    """מזרים את ההזמנות הסגורות כשורות ClosedOrderRow עם פענוח עצל"""
+    return _iter_rows(f'''
+        SELECT {CLOSED_ORDER_COLUMNS}
+        FROM closed_orders 
+        ORDER BY closed_at DESC
+    ''', ClosedOrderRow, chunk_size)
+
+# פונקציות לניהול הזמנות
+def load_orders() -> List[Dict[str, Any]]:
+    """טוען את כל ההזמנות הפעילות"""
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT {ORDER_COLUMNS}
+            FROM orders 
+            ORDER BY created_at DESC
+        ''').fetchall()
     
-    conn.close()
-    return orders
+    return [_order_from_row(row) for row in rows]
 
 def save_order(order: Dict[str, Any]) -> int:
     """שומר הזמנה חדשה ומחזיר את ה-ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # קבלת מספר הזמנה הבא
-        cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
-        next_id = cursor.fetchone()[0]
-        
-        # עדכון המונה
-        cursor.execute('UPDATE order_counter SET next_order_id = ? WHERE id = 1', (next_id + 1,))
-        
-        # הכנסת ההזמנה עם REPLACE במקום INSERT כדי למנוע שגיאות UNIQUE
-        cursor.execute('''
-            INSERT OR REPLACE INTO orders (id, customer_name, phone, address, delivery_notes, 
-                           butcher_notes, items, status, created_at, total_amount, customer_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            next_id,
-            order['customer_name'],
-            order['phone'],
-            json.dumps(order.get('address', {})),
-            order.get('delivery_notes', ''),
-            order.get('butcher_notes', ''),
-            json.dumps(order['items']),
-            order.get('status', 'pending'),
-            order.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-            order.get('total_amount', 0.0),
-            order.get('customer_id')
-        ))
+        try:
+            # קבלת מספר הזמנה הבא
+            cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
+            next_id = cursor.fetchone()[0]
         
-        conn.commit()
-        return next_id
+            # עדכון המונה
+            cursor.execute('UPDATE order_counter SET next_order_id = ? WHERE id = 1', (next_id + 1,))
         
-    except sqlite3.IntegrityError as e:
-        # אם יש שגיאת UNIQUE, ננסה עם ID אחר
-        if "UNIQUE constraint failed" in str(e):
-            # נקבל ID חדש וננסה שוב
-            cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
-            new_id = cursor.fetchone()[0]
-            cursor.execute('UPDATE order_counter SET next_order_id = ? WHERE id = 1', (new_id + 1,))
-            
+            # הזמנה קיימת עם אותו מספר מוחלפת - מחיקה מפורשת במקום INSERT OR REPLACE,
+            # כדי שטריגרי המחיקה יעדכנו את אינדקס החיפוש וטבלאות הסיכום
+            cursor.execute('DELETE FROM orders WHERE id = ?', (next_id,))
             cursor.execute('''
                 INSERT INTO orders (id, customer_name, phone, address, delivery_notes, 
                                butcher_notes, items, status, created_at, total_amount, customer_id)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
-                new_id,
+                next_id,
                 order['customer_name'],
                 order['phone'],
                 json.dumps(order.get('address', {})),
@@ -182,286 +965,684 @@ def save_order(order: Dict[str, Any]) -> int:
                 order.get('total_amount', 0.0),
                 order.get('customer_id')
             ))
+        
+            return next_id
+        
+        except sqlite3.IntegrityError as e:
+            # אם יש שגיאת UNIQUE, ננסה עם ID אחר
+            if "UNIQUE constraint failed" in str(e):
+                # נקבל ID חדש וננסה שוב
+                cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
+                new_id = cursor.fetchone()[0]
+                cursor.execute('UPDATE order_counter SET next_order_id = ? WHERE id = 1', (new_id + 1,))
             
-            conn.commit()
-            return new_id
-        else:
-            raise e
-    finally:
-        conn.close()
+                cursor.execute('''
+                    INSERT INTO orders (id, customer_name, phone, address, delivery_notes, 
+                                   butcher_notes, items, status, created_at, total_amount, customer_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    new_id,
+                    order['customer_name'],
+                    order['phone'],
+                    json.dumps(order.get('address', {})),
+                    order.get('delivery_notes', ''),
+                    order.get('butcher_notes', ''),
+                    json.dumps(order['items']),
+                    order.get('status', 'pending'),
+                    order.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                    order.get('total_amount', 0.0),
+                    order.get('customer_id')
+                ))
+            
+                return new_id
+            else:
+                raise e
 
 def update_order(order_id: int, updated_fields: Dict[str, Any]):
     """מעדכן הזמנה קיימת"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # בניית שאילתת העדכון
-    set_clauses = []
-    values = []
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    for field, value in updated_fields.items():
-        if field in ['address', 'items']:
-            set_clauses.append(f"{field} = ?")
-            values.append(json.dumps(value))
-        else:
-            set_clauses.append(f"{field} = ?")
-            values.append(value)
+        # בניית שאילתת העדכון
+        set_clauses = []
+        values = []
     
-    values.append(order_id)
+        for field, value in updated_fields.items():
+            if field in ['address', 'items']:
+                set_clauses.append(f"{field} = ?")
+                values.append(json.dumps(value))
+            else:
+                set_clauses.append(f"{field} = ?")
+                values.append(value)
     
-    query = f"UPDATE orders SET {', '.join(set_clauses)} WHERE id = ?"
-    cursor.execute(query, values)
+        values.append(order_id)
     
-    conn.commit()
-    conn.close()
+        query = f"UPDATE orders SET {', '.join(set_clauses)} WHERE id = ?"
+        cursor.execute(query, values)
 
 def delete_order(order_id: int):
     """מוחק הזמנה"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM orders WHERE id = ?', (order_id,))
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    conn.commit()
-    conn.close()
+        cursor.execute('DELETE FROM orders WHERE id = ?', (order_id,))
 
 def move_order_to_closed(order: Dict[str, Any]):
     """מעביר הזמנה להזמנות סגורות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # אם ההזמנה כבר קיימת ב-closed_orders נעדכן, אחרת נכניס חדשה
-    cursor.execute('SELECT id FROM closed_orders WHERE id = ?', (order['id'],))
-    exists = cursor.fetchone()
-    if exists:
-        cursor.execute('''
-            UPDATE closed_orders
-            SET customer_name = ?,
-                phone = ?,
-                address = ?,
-                delivery_notes = ?,
-                butcher_notes = ?,
-                items = ?,
-                status = ?,
-                created_at = ?,
-                closed_at = ?,
-                total_amount = ?,
-                customer_id = ?
-            WHERE id = ?
-        ''', (
-            order['customer_name'],
-            order['phone'],
-            json.dumps(order.get('address', {})),
-            order.get('delivery_notes', ''),
-            order.get('butcher_notes', ''),
-            json.dumps(order['items']),
-            order.get('status', 'completed'),
-            order['created_at'],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            order.get('total_amount', 0.0),
-            order.get('customer_id'),
-            order['id']
-        ))
-    else:
-        cursor.execute('''
-            INSERT INTO closed_orders (id, customer_name, phone, address, delivery_notes,
-                                      butcher_notes, items, status, created_at, closed_at, 
-                                      total_amount, customer_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            order['id'],
-            order['customer_name'],
-            order['phone'],
-            json.dumps(order.get('address', {})),
-            order.get('delivery_notes', ''),
-            order.get('butcher_notes', ''),
-            json.dumps(order['items']),
-            order.get('status', 'completed'),
-            order['created_at'],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            order.get('total_amount', 0.0),
-            order.get('customer_id')
-        ))
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    # מחיקת ההזמנה מהזמנות פעילות
-    cursor.execute('DELETE FROM orders WHERE id = ?', (order['id'],))
+        # אם ההזמנה כבר קיימת ב-closed_orders נעדכן, אחרת נכניס חדשה
+        cursor.execute('SELECT id FROM closed_orders WHERE id = ?', (order['id'],))
+        exists = cursor.fetchone()
+        if exists:
+            cursor.execute('''
+                UPDATE closed_orders
+                SET customer_name = ?,
+                    phone = ?,
+                    address = ?,
+                    delivery_notes = ?,
+                    butcher_notes = ?,
+                    items = ?,
+                    status = ?,
+                    created_at = ?,
+                    closed_at = ?,
+                    total_amount = ?,
+                    customer_id = ?
+                WHERE id = ?
+            ''', (
+                order['customer_name'],
+                order['phone'],
+                json.dumps(order.get('address', {})),
+                order.get('delivery_notes', ''),
+                order.get('butcher_notes', ''),
+                json.dumps(order['items']),
+                order.get('status', 'completed'),
+                order['created_at'],
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                order.get('total_amount', 0.0),
+                order.get('customer_id'),
+                order['id']
+            ))
+        else:
+            cursor.execute('''
+                INSERT INTO closed_orders (id, customer_name, phone, address, delivery_notes,
+                                          butcher_notes, items, status, created_at, closed_at, 
+                                          total_amount, customer_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                order['id'],
+                order['customer_name'],
+                order['phone'],
+                json.dumps(order.get('address', {})),
+                order.get('delivery_notes', ''),
+                order.get('butcher_notes', ''),
+                json.dumps(order['items']),
+                order.get('status', 'completed'),
+                order['created_at'],
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                order.get('total_amount', 0.0),
+                order.get('customer_id')
+            ))
     
-    conn.commit()
-    conn.close()
+        # מחיקת ההזמנה מהזמנות פעילות
+        cursor.execute('DELETE FROM orders WHERE id = ?', (order['id'],))
 
 def load_closed_orders() -> List[Dict[str, Any]]:
     """טוען את כל ההזמנות הסגורות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT {CLOSED_ORDER_COLUMNS}
+            FROM closed_orders 
+            ORDER BY closed_at DESC
+        ''').fetchall()
     
-    cursor.execute('''
-        SELECT id, customer_name, phone, address, delivery_notes, 
-               butcher_notes, items, status, created_at, closed_at, 
-               total_amount, customer_id
-        FROM closed_orders 
-        ORDER BY closed_at DESC
-    ''')
+    return [_closed_order_from_row(row) for row in rows]
+
+def _like_escape(text: str) -> str:
+    """מבריח תווים מיוחדים של LIKE (לשימוש עם ESCAPE '\\')"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _like_pattern(text: str) -> str:
+    """בונה תבנית LIKE של 'מכיל' עם בריחה מתווים מיוחדים"""
+    return '%' + _like_escape(text) + '%'
+
+def _closed_orders_filter(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          status: Optional[str] = None, customer: Optional[str] = None):
+    """בונה תנאי WHERE ופרמטרים לסינון הזמנות סגורות"""
+    clauses = []
+    params = []
+    if date_from:
+        clauses.append('closed_at >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append('closed_at < ?')
+        params.append(date_to)
+    if status:
+        clauses.append('status = ?')
+        params.append(status)
+    if customer:
+        clauses.append("(customer_name LIKE ? ESCAPE '\\' OR phone LIKE ? ESCAPE '\\')")
+        pattern = _like_pattern(customer)
+        params.extend([pattern, pattern])
+    return clauses, params
+
+def query_closed_orders(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        status: Optional[str] = None, customer: Optional[str] = None,
+                        after: Optional[tuple] = None, page_size: int = 50) -> Dict[str, Any]:
+    """מחזיר עמוד אחד של הזמנות סגורות מסוננות, ממוין לפי (closed_at, id) בסדר יורד
     
-    rows = cursor.fetchall()
-    orders = []
-    
-    for row in rows:
-        order = {
-            'id': row[0],
-            'customer_name': row[1],
-            'phone': row[2],
-            'address': json.loads(row[3]) if row[3] else {},
-            'delivery_notes': row[4] or '',
-            'butcher_notes': row[5] or '',
-            'items': json.loads(row[6]) if row[6] else {},
-            'status': row[7],
-            'created_at': row[8],
-            'closed_at': row[9],
-            'total_amount': row[10] or 0.0,
-            'customer_id': row[11]
-        }
-        orders.append(order)
+    after הוא הסמן (closed_at, id) של השורה האחרונה בעמוד הקודם.
+    התוצאה: {'orders': [...], 'next_cursor': סמן לעמוד הבא או None}
+    """
+    clauses, params = _closed_orders_filter(date_from, date_to, status, customer)
+    if after is not None:
+        clauses.append('(closed_at < ? OR (closed_at = ? AND id < ?))')
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT {CLOSED_ORDER_COLUMNS}
+            FROM closed_orders
+            {where}
+            ORDER BY closed_at DESC, id DESC
+            LIMIT ?
+        ''', (*params, page_size + 1)).fetchall()
+    
+    # שורה עודפת מסמנת שיש עמוד נוסף - רק שורות העמוד מפוענחות
+    has_more = len(rows) > page_size
+    orders = [_closed_order_from_row(row) for row in rows[:page_size]]
+    next_cursor = (orders[-1]['closed_at'], orders[-1]['id']) if has_more else None
+    return {'orders': orders, 'next_cursor': next_cursor}
+
+def count_closed_orders(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        status: Optional[str] = None, customer: Optional[str] = None) -> Dict[str, int]:
+    """סופר הזמנות סגורות לפי סטטוס עבור אותם סינונים (ללא פענוח שורות)"""
+    clauses, params = _closed_orders_filter(date_from, date_to, status, customer)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT status, COUNT(*) FROM closed_orders
+            {where}
+            GROUP BY status
+        ''', params).fetchall()
+    
+    counts = {status: count for status, count in rows}
+    counts['total'] = sum(count for _, count in rows)
+    return counts
+
+# פריטי ההזמנה כטבלה (מפתחות ה-JSON) - JSON פגום נחשב כהזמנה ללא פריטים
+_ORDER_ITEMS_JSON = "json_each(CASE WHEN json_valid(orders.items) THEN orders.items ELSE '{}' END)"
+
+def _items_match_clause(names: List[str], params: list) -> str:
+    """תנאי EXISTS על פריטי ההזמנה - שם מוצר מדויק או עם סוג חיתוך ("עוף שלם - שלם")"""
+    conditions = []
+    for name in names:
+        conditions.append("key = ? OR key LIKE ? ESCAPE '\\'")
+        params.extend([name, _like_escape(name) + ' - %'])
+    return f'''EXISTS (SELECT 1 FROM {_ORDER_ITEMS_JSON}
+                       WHERE {' OR '.join(conditions)})'''
+
+def _orders_filter(filters: Optional[Dict[str, Any]] = None):
+    """מהדר את סינוני דף ההזמנות הפעילות לתנאי WHERE ופרמטרים
+    
+    מפתחות נתמכים: status, customer (חלק משם הלקוח), item (מוצר שחייב להופיע בהזמנה),
+    any_item (רשימת מוצרים - לפחות אחד מהם חייב להופיע, למשל כל מוצרי קטגוריה).
+    מוצר תואם גם פריט עם סוג חיתוך, למשל "ירכיים" תואם "ירכיים - עם עור".
+    """
+    filters = filters or {}
+    clauses = []
+    params = []
+    if filters.get('status'):
+        clauses.append('status = ?')
+        params.append(filters['status'])
+    if filters.get('customer'):
+        clauses.append("customer_name LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(filters['customer']))
+    if filters.get('any_item') is not None:
+        names = list(filters['any_item'])
+        if not names:
+            clauses.append('0')
+        else:
+            clauses.append(_items_match_clause(names, params))
+    if filters.get('item'):
+        clauses.append(_items_match_clause([filters['item']], params))
+    return clauses, params
+
+def query_orders(filters: Optional[Dict[str, Any]] = None, page: int = 1,
+                 page_size: int = 50) -> Dict[str, Any]:
+    """מחזיר עמוד של הזמנות פעילות מסוננות (ממוין לפי created_at בסדר יורד) וספירות
+    
+    התוצאה: {'orders': [...], 'total': n, 'status_counts': {status: n},
+             'page': מספר העמוד בפועל, 'pages': מספר העמודים}
+    """
+    clauses, params = _orders_filter(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        conn.execute('BEGIN')
+        status_rows = conn.execute(f'''
+            SELECT status, COUNT(*) FROM orders
+            {where}
+            GROUP BY status
+        ''', params).fetchall()
+        
+        total = sum(count for _, count in status_rows)
+        pages = max(1, -(-total // page_size))
+        page = min(max(1, page), pages)
+        
+        rows = conn.execute(f'''
+            SELECT {ORDER_COLUMNS}
+            FROM orders
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', params + [page_size, (page - 1) * page_size]).fetchall()
+    
+    return {
+        'orders': [_order_from_row(row) for row in rows],
+        'total': total,
+        'status_counts': {status: count for status, count in status_rows},
+        'page': page,
+        'pages': pages
+    }
+
+def count_orders(filters: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """סופר הזמנות פעילות לפי סטטוס עבור אותם סינונים (ללא פענוח שורות)"""
+    clauses, params = _orders_filter(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT status, COUNT(*) FROM orders
+            {where}
+            GROUP BY status
+        ''', params).fetchall()
+    
+    counts = {status: count for status, count in rows}
+    counts['total'] = sum(count for _, count in rows)
+    return counts
+
+def get_active_order_item_names() -> List[str]:
+    """מחזיר את שמות המוצרים שמופיעים בהזמנות הפעילות (לרשימת סינון המוצרים)"""
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT DISTINCT key FROM orders, {_ORDER_ITEMS_JSON}
+            WHERE typeof(key) = 'text'
+            ORDER BY key
+        ''').fetchall()
+    return [row[0] for row in rows]
+
+# חיפוש טקסט מלא
+SEARCH_RANK_WEIGHTS = (10.0, 10.0, 1.0, 3.0)  # שם, טלפון, הערות, מוצרים
+_search_tokenizers: Dict[str, str] = {}
+
+def _search_tokenizer(conn) -> str:
+    """מחזיר את הטוקנייזר של אינדקס החיפוש ('trigram' או 'unicode61')"""
+    if DATABASE_FILE not in _search_tokenizers:
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'search_index'"
+        ).fetchone()
+        _search_tokenizers[DATABASE_FILE] = 'trigram' if row and 'trigram' in row[0] else 'unicode61'
+    return _search_tokenizers[DATABASE_FILE]
+
+def _search_terms(text: str) -> List[str]:
+    """מפרק טקסט חיפוש למונחים (מונח שנראה כמו טלפון - ללא מקפים)"""
+    terms = []
+    for term in text.split():
+        if re.fullmatch(r'[\d\-]+', term):
+            term = term.replace('-', '')
+        if term:
+            terms.append(term)
+    return terms
+
+def search_orders(text: str, tables=tuple(SEARCH_SOURCES), limit: int = 50) -> List[Dict[str, Any]]:
+    """חיפוש מדורג בהזמנות פעילות, הזמנות סגורות ולקוחות
+    
+    מחפש בשם הלקוח, בטלפון, בהערות ובשמות המוצרים. כל המונחים חייבים להופיע.
+    התוצאה: [{'table': שם הטבלה, 'id': מזהה, 'score': ציון (נמוך = טוב יותר), 'record': הרשומה}]
+    """
+    terms = _search_terms(text or '')
+    if not terms:
+        return []
+    
+    ensure_schema()
+    with read_connection() as conn:
+        conn.execute('BEGIN')
+        trigram = _search_tokenizer(conn) == 'trigram'
+        
+        match_terms = []
+        clauses = []
+        params = []
+        for term in terms:
+            quoted = '"' + term.replace('"', '""') + '"'
+            if not trigram:
+                match_terms.append(quoted + '*')
+            elif len(term) >= 3:
+                match_terms.append(quoted)
+            else:
+                # trigram לא מאנדקס מונחים קצרים משלושה תווים
+                clauses.append("(customer_name || ' ' || phone || ' ' || notes || ' ' || items) LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(term))
+        
+        if match_terms:
+            clauses.insert(0, 'search_index MATCH ?')
+            params.insert(0, ' AND '.join(match_terms))
+            score = f"bm25(search_index, {', '.join(str(w) for w in SEARCH_RANK_WEIGHTS)})"
+        else:
+            score = '0.0'
+        
+        codes = [SEARCH_SOURCES[table] for table in tables]
+        clauses.append(f"rowid % {SEARCH_ROWID_STRIDE} IN ({', '.join('?' for _ in codes)})")
+        params.extend(codes)
+        
+        hits = conn.execute(f'''
+            SELECT rowid, {score} AS score FROM search_index
+            WHERE {' AND '.join(clauses)}
+            ORDER BY score, rowid DESC
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+        
+        # שליפת הרשומות המלאות לפי טבלה
+        tables_by_code = {code: table for table, code in SEARCH_SOURCES.items()}
+        ids_by_table: Dict[str, List[int]] = {}
+        for rowid, _score in hits:
+            ids_by_table.setdefault(tables_by_code[rowid % SEARCH_ROWID_STRIDE], []).append(rowid // SEARCH_ROWID_STRIDE)
+        
+        records = {}
+        for table, ids in ids_by_table.items():
+            columns, build = _ROW_BUILDERS[table]
+            rows = conn.execute(
+                f"SELECT {columns} FROM {table} WHERE id IN ({', '.join('?' for _ in ids)})",
+                ids
+            ).fetchall()
+            for row in rows:
+                records[(table, row[0])] = build(row)
+    
+    results = []
+    for rowid, hit_score in hits:
+        table = tables_by_code[rowid % SEARCH_ROWID_STRIDE]
+        record = records.get((table, rowid // SEARCH_ROWID_STRIDE))
+        if record is not None:
+            results.append({'table': table, 'id': record['id'], 'score': hit_score, 'record': record})
+    return results
+
+def rebuild_rollups():
+    """בונה מחדש את טבלאות הסיכום מכל ההזמנות (מילוי ראשוני או תיקון)"""
+    ensure_schema()
+    with write_connection() as conn:
+        for table in ROLLUP_TABLES:
+            conn.execute(f'DELETE FROM {table}')
+        _fill_rollups(conn)
+
+def get_rollup_daily_totals() -> List[Dict[str, Any]]:
+    """סיכום לכל יום: הזמנות, כמות והכנסות (day ריק = תאריך לא תקין)"""
+    ensure_schema()
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT day, order_count, quantity, revenue FROM rollup_daily_totals ORDER BY day
+        ''').fetchall()
+    return [{'day': day, 'orders': orders, 'quantity': quantity, 'revenue': revenue}
+            for day, orders, quantity, revenue in rows]
+
+def get_rollup_products() -> List[Dict[str, Any]]:
+    """סיכום לכל מוצר: כמות, שורות הזמנה ולקוחות ייחודיים"""
+    ensure_schema()
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT p.product, p.quantity, p.order_count, COALESCE(c.customers, 0)
+            FROM (SELECT product, TOTAL(quantity) AS quantity, SUM(order_count) AS order_count
+                  FROM rollup_daily_products GROUP BY product) AS p
+            LEFT JOIN (SELECT product, COUNT(*) AS customers
+                       FROM rollup_product_customers GROUP BY product) AS c USING (product)
+            ORDER BY p.quantity DESC
+        ''').fetchall()
+    return [{'product': product, 'quantity': quantity, 'orders': orders, 'customers': customers}
+            for product, quantity, orders, customers in rows]
+
+def get_rollup_customers() -> List[Dict[str, Any]]:
+    """סיכום לכל לקוח (שם + טלפון + מזהה, 0 = ללא מזהה): הזמנות, כמות והכנסות"""
+    ensure_schema()
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT customer_name, phone, customer_id, SUM(order_count), TOTAL(quantity), TOTAL(revenue)
+            FROM rollup_daily_customers
+            GROUP BY customer_name, phone, customer_id
+            ORDER BY 5 DESC
+        ''').fetchall()
+    return [{'customer': name, 'phone': phone, 'customer_id': customer_id or None,
+             'orders': orders, 'quantity': quantity, 'revenue': revenue}
+            for name, phone, customer_id, orders, quantity, revenue in rows]
+
+def rebuild_search_index():
+    """בונה מחדש את אינדקס החיפוש מהטבלאות (למשל אחרי שינוי ידני במסד הנתונים)"""
+    ensure_schema()
+    with write_connection() as conn:
+        conn.execute('DELETE FROM search_index')
+        _fill_search_index(conn)
+
+# פונקציות ליומן השינויים
+def get_change_seq(conn=None) -> int:
+    """מחזיר את מספר הרצף האחרון ביומן השינויים"""
+    if conn is None:
+        with read_connection() as conn:
+            return get_change_seq(conn)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def load_changes_since(seq: int, tables=CHANGE_TRACKED_TABLES, raw: bool = False) -> Dict[str, Any]:
+    """מחזיר את השורות שנוספו/עודכנו/נמחקו מאז מספר הרצף seq
+    
+    התוצאה: {'seq': רצף אחרון, 'reset': True אם היומן נוקה ויש לטעון הכל מחדש,
+    '<table>': {'upserted': [רשומות], 'deleted': [מזהים]}}
+    עם raw=True הרשומות הן שורות SQLite גולמיות (tuple) במקום מילונים.
+    """
+    with read_connection() as conn:
+        # snapshot אחד לכל השאילתות
+        conn.execute('BEGIN')
+        latest_seq = get_change_seq(conn)
+        oldest_seq = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+        oldest_available = oldest_seq if oldest_seq is not None else latest_seq + 1
+        
+        result = {'seq': latest_seq, 'reset': seq < oldest_available - 1 or seq > latest_seq}
+        if result['reset']:
+            return result
+        
+        placeholders = ', '.join('?' for _ in tables)
+        changed = conn.execute(f'''
+            SELECT table_name, row_id FROM change_log
+            WHERE seq > ? AND table_name IN ({placeholders})
+            GROUP BY table_name, row_id
+        ''', (seq, *tables)).fetchall()
+        
+        changed_ids = {table: [] for table in tables}
+        for table_name, row_id in changed:
+            changed_ids[table_name].append(row_id)
+        
+        for table in tables:
+            ids = changed_ids[table]
+            columns, build = _ROW_BUILDERS[table]
+            upserted = []
+            # SQLite מגביל את מספר הפרמטרים בשאילתה - עובדים במנות
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT {columns} FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    chunk
+                ).fetchall()
+                upserted.extend(rows if raw else (build(row) for row in rows))
+            
+            found = {row[0] if raw else row['id'] for row in upserted}
+            result[table] = {
+                'upserted': upserted,
+                'deleted': [row_id for row_id in ids if row_id not in found]
+            }
+    
+    return result
+
+def cleanup_change_log(retention_days: int = 7) -> int:
+    """מוחק רשומות ישנות מיומן השינויים"""
+    with write_connection() as conn:
+        cursor = conn.execute(
+            "DELETE FROM change_log WHERE changed_at < datetime('now', ?)",
+            (f'-{retention_days} days',)
+        )
+        return cursor.rowcount
+
+def _incremental_loader(table: str, full_query: str, sort_field: str):
+    """בונה loader למטמון שמעדכן רשימה קיימת לפי יומן השינויים במקום לטעון הכל
+    
+    המטמון שומר שורות SQLite גולמיות (tuple) - בלתי ניתנות לשינוי, כך שאין צורך להעתיק אותן.
+    """
+    columns, _ = _ROW_BUILDERS[table]
+    sort_index = [name.strip() for name in columns.split(',')].index(sort_field)
+    
+    def sort_rows(rows_by_id):
+        return sorted(rows_by_id.values(),
+                      key=lambda row: (row[sort_index] or '', row[0]),
+                      reverse=True)
+    
+    def loader(previous):
+        if previous is not None:
+            seq, rows_by_id, _ = previous
+            changes = load_changes_since(seq, (table,), raw=True)
+            if not changes['reset']:
+                if changes['seq'] == seq:
+                    return previous
+                rows_by_id = dict(rows_by_id)
+                for row_id in changes[table]['deleted']:
+                    rows_by_id.pop(row_id, None)
+                for row in changes[table]['upserted']:
+                    rows_by_id[row[0]] = row
+                return changes['seq'], rows_by_id, sort_rows(rows_by_id)
+        
+        # טעינה מלאה - הרצף והשורות מאותו snapshot
+        with read_connection() as conn:
+            conn.execute('BEGIN')
+            seq = get_change_seq(conn)
+            rows = conn.execute(full_query.format(columns=columns)).fetchall()
+        rows_by_id = {row[0]: row for row in rows}
+        return seq, rows_by_id, sort_rows(rows_by_id)
+    
+    return loader
+
+_orders_loader = _incremental_loader('orders', 'SELECT {columns} FROM orders', 'created_at')
+
+def load_orders_cached() -> List[OrderRow]:
+    """טוען הזמנות פעילות מהמטמון המשותף - רק השורות שהשתנו נטענות מחדש
     
-    conn.close()
-    return orders
+    מחזיר שורות OrderRow לקריאה בלבד; לעריכה יש להמיר עם to_dict().
+    """
+    _, _, rows = _load_cache.get('orders', _orders_loader, incremental=True)
+    return [OrderRow(row) for row in rows]
 
 # פונקציות לניהול לקוחות
 def load_customers() -> List[Dict[str, Any]]:
     """טוען את כל הלקוחות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, phone, full_name, created_at, last_updated, 
-               total_orders, total_spent, last_order_date
-        FROM customers 
-        ORDER BY last_order_date DESC NULLS LAST
-    ''')
-    
-    rows = cursor.fetchall()
-    customers = []
-    
-    for row in rows:
-        customer = {
-            'id': row[0],
-            'phone': row[1],
-            'full_name': row[2],
-            'created_at': row[3],
-            'last_updated': row[4],
-            'total_orders': row[5],
-            'total_spent': row[6],
-            'last_order_date': row[7]
-        }
-        customers.append(customer)
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT {CUSTOMER_COLUMNS}
+            FROM customers 
+            ORDER BY last_order_date DESC NULLS LAST
+        ''').fetchall()
     
-    conn.close()
-    return customers
+    return [_customer_from_row(row) for row in rows]
 
 def save_customers(customers: List[Dict[str, Any]]):
     """שומר את כל הלקוחות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    # מחיקת כל הלקוחות הקיימים
-    cursor.execute('DELETE FROM customers')
+        # מחיקת כל הלקוחות הקיימים
+        cursor.execute('DELETE FROM customers')
     
-    # הכנסת הלקוחות החדשים
-    for customer in customers:
-        cursor.execute('''
-            INSERT INTO customers (id, phone, full_name, created_at, last_updated,
-                                  total_orders, total_spent, last_order_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            customer['id'],
-            customer['phone'],
-            customer['full_name'],
-            customer['created_at'],
-            customer['last_updated'],
-            customer['total_orders'],
-            customer['total_spent'],
-            customer['last_order_date']
-        ))
-    
-    conn.commit()
-    conn.close()
+        # הכנסת הלקוחות החדשים
+        for customer in customers:
+            cursor.execute('''
+                INSERT INTO customers (id, phone, full_name, created_at, last_updated,
+                                      total_orders, total_spent, last_order_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                customer['id'],
+                customer['phone'],
+                customer['full_name'],
+                customer['created_at'],
+                customer['last_updated'],
+                customer['total_orders'],
+                customer['total_spent'],
+                customer['last_order_date']
+            ))
 
 def find_or_create_customer(phone: str, full_name: str) -> int:
     """מוצא לקוח קיים או יוצר חדש"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    # חיפוש לקוח קיים
-    cursor.execute('SELECT id, full_name FROM customers WHERE phone = ?', (phone,))
-    result = cursor.fetchone()
+        # חיפוש לקוח קיים
+        cursor.execute('SELECT id, full_name FROM customers WHERE phone = ?', (phone,))
+        result = cursor.fetchone()
     
-    if result:
-        customer_id, existing_name = result
-        # עדכון שם אם השתנה
-        if existing_name != full_name:
-            cursor.execute('''
-                UPDATE customers 
-                SET full_name = ?, last_updated = ? 
-                WHERE id = ?
-            ''', (full_name, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), customer_id))
-            conn.commit()
-        conn.close()
-        return customer_id
+        if result:
+            customer_id, existing_name = result
+            # עדכון שם אם השתנה
+            if existing_name != full_name:
+                cursor.execute('''
+                    UPDATE customers 
+                    SET full_name = ?, last_updated = ? 
+                    WHERE id = ?
+                ''', (full_name, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), customer_id))
+            return customer_id
     
-    # יצירת לקוח חדש
-    cursor.execute('''
-        INSERT INTO customers (phone, full_name, created_at, last_updated)
-        VALUES (?, ?, ?, ?)
-    ''', (
-        phone,
-        full_name,
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    ))
-    
-    customer_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return customer_id
+        # יצירת לקוח חדש
+        cursor.execute('''
+            INSERT INTO customers (phone, full_name, created_at, last_updated)
+            VALUES (?, ?, ?, ?)
+        ''', (
+            phone,
+            full_name,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
+    
+        customer_id = cursor.lastrowid
+        return customer_id
 
 def update_customer_stats(customer_id: int, order_total: float):
     """מעדכן סטטיסטיקות לקוח"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-        UPDATE customers 
-        SET total_orders = total_orders + 1,
-            total_spent = total_spent + ?,
-            last_order_date = ?,
-            last_updated = ?
-        WHERE id = ?
-    ''', (
-        order_total,
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        customer_id
-    ))
-    
-    conn.commit()
-    conn.close()
+        cursor.execute('''
+            UPDATE customers 
+            SET total_orders = total_orders + 1,
+                total_spent = total_spent + ?,
+                last_order_date = ?,
+                last_updated = ?
+            WHERE id = ?
+        ''', (
+            order_total,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            customer_id
+        ))
 
 def get_next_order_id() -> int:
     """מחזיר את מספר ההזמנה הבא"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with read_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
-    next_id = cursor.fetchone()[0]
+        cursor.execute('SELECT next_order_id FROM order_counter WHERE id = 1')
+        next_id = cursor.fetchone()[0]
     
-    conn.close()
-    return next_id
+        return next_id
 
 def reset_order_counter():
     """מאפס את מונה ההזמנות למספר הבא אחרי ההזמנה הגבוהה ביותר"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        
         # מציאת ההזמנה עם ה-ID הגבוה ביותר
         cursor.execute('SELECT MAX(id) FROM orders')
         max_order_id = cursor.fetchone()[0]
@@ -472,30 +1653,19 @@ def reset_order_counter():
         # עדכון המונה למספר הבא
         cursor.execute('UPDATE order_counter SET next_order_id = ? WHERE id = 1', (max_order_id + 1,))
         
-        conn.commit()
         return max_order_id + 1
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
 
 def fix_order_id_conflicts():
     """מתקן קונפליקטים של ID הזמנות"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
         # בדיקה אם יש הזמנות עם ID כפול
-        cursor.execute('''
-            SELECT id, COUNT(*) as count 
-            FROM orders 
-            GROUP BY id 
-            HAVING count > 1
-        ''')
-        
-        duplicates = cursor.fetchall()
+        with read_connection() as conn:
+            duplicates = conn.execute('''
+                SELECT id, COUNT(*) as count 
+                FROM orders 
+                GROUP BY id 
+                HAVING count > 1
+            ''').fetchall()
         
         if duplicates:
             # אם יש כפילויות, נאפס את המונה
@@ -506,15 +1676,11 @@ def fix_order_id_conflicts():
         
     except Exception as e:
         return f"שגיאה בבדיקת קונפליקטים: {str(e)}"
-    finally:
-        conn.close()
 
 # פונקציות ניקוי
 def cleanup_old_orders(active_retention_days: int = 20, closed_retention_days: int = 1825):
     """מנקה הזמנות ישנות"""
-    conn = None
-    try:
-        conn = get_db_connection()
+    with write_connection() as conn:
         cursor = conn.cursor()
         
         # ניקוי הזמנות פעילות ישנות
@@ -547,7 +1713,6 @@ def cleanup_old_orders(active_retention_days: int = 20, closed_retention_days: i
             except sqlite3.OperationalError as e:
                 if "database is locked" in str(e):
                     # אם הדאטהבייס נעול, ננסה שוב אחרי המתנה קצרה
-                    import time
                     time.sleep(0.1)
                     continue
                 else:
@@ -561,22 +1726,11 @@ def cleanup_old_orders(active_retention_days: int = 20, closed_retention_days: i
         
         deleted_closed_count = cursor.rowcount
         
-        conn.commit()
         return len(old_active_orders), deleted_closed_count
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
 
 def cleanup_old_customers(retention_days: int = 365):
     """מנקה לקוחות ישנים"""
-    conn = None
-    try:
-        conn = get_db_connection()
+    with write_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -585,17 +1739,7 @@ def cleanup_old_customers(retention_days: int = 365):
             OR last_order_date IS NULL
         '''.format(retention_days))
         
-        deleted_count = cursor.rowcount
-        conn.commit()
-        return deleted_count
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+        return cursor.rowcount
 
 # פונקציה לייבוא נתונים קיימים מ-JSON
 def import_existing_data():
@@ -603,79 +1747,97 @@ def import_existing_data():
     if not os.path.exists(DATABASE_FILE):
         init_database()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
     
-    # ייבוא הזמנות פעילות
-    if os.path.exists('orders.json'):
-        with open('orders.json', 'r', encoding='utf-8') as f:
-            orders = json.load(f)
+        # ייבוא הזמנות פעילות
+        if os.path.exists('orders.json'):
+            with open('orders.json', 'r', encoding='utf-8') as f:
+                orders = json.load(f)
         
-        for order in orders:
-            cursor.execute('''
-                INSERT OR IGNORE INTO orders (id, customer_name, phone, address, delivery_notes,
-                                             butcher_notes, items, status, created_at, total_amount, customer_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                order.get('id'),
-                order.get('customer_name', ''),
-                order.get('phone', ''),
-                json.dumps(order.get('address', {})),
-                order.get('delivery_notes', ''),
-                order.get('butcher_notes', ''),
-                json.dumps(order.get('items', {})),
-                order.get('status', 'pending'),
-                order.get('created_at', ''),
-                order.get('total_amount', 0.0),
-                order.get('customer_id')
-            ))
+            for order in orders:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO orders (id, customer_name, phone, address, delivery_notes,
+                                                 butcher_notes, items, status, created_at, total_amount, customer_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    order.get('id'),
+                    order.get('customer_name', ''),
+                    order.get('phone', ''),
+                    json.dumps(order.get('address', {})),
+                    order.get('delivery_notes', ''),
+                    order.get('butcher_notes', ''),
+                    json.dumps(order.get('items', {})),
+                    order.get('status', 'pending'),
+                    order.get('created_at', ''),
+                    order.get('total_amount', 0.0),
+                    order.get('customer_id')
+                ))
     
-    # ייבוא הזמנות סגורות
-    if os.path.exists('closed_orders.json'):
-        with open('closed_orders.json', 'r', encoding='utf-8') as f:
-            closed_orders = json.load(f)
+        # ייבוא הזמנות סגורות
+        if os.path.exists('closed_orders.json'):
+            with open('closed_orders.json', 'r', encoding='utf-8') as f:
+                closed_orders = json.load(f)
         
-        for order in closed_orders:
-            cursor.execute('''
-                INSERT OR IGNORE INTO closed_orders (id, customer_name, phone, address, delivery_notes,
-                                                    butcher_notes, items, status, created_at, closed_at, 
-                                                    total_amount, customer_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                order.get('id'),
-                order.get('customer_name', ''),
-                order.get('phone', ''),
-                json.dumps(order.get('address', {})),
-                order.get('delivery_notes', ''),
-                order.get('butcher_notes', ''),
-                json.dumps(order.get('items', {})),
-                order.get('status', 'completed'),
-                order.get('created_at', ''),
-                order.get('closed_at', ''),
-                order.get('total_amount', 0.0),
-                order.get('customer_id')
-            ))
+            for order in closed_orders:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO closed_orders (id, customer_name, phone, address, delivery_notes,
+                                                        butcher_notes, items, status, created_at, closed_at, 
+                                                        total_amount, customer_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    order.get('id'),
+                    order.get('customer_name', ''),
+                    order.get('phone', ''),
+                    json.dumps(order.get('address', {})),
+                    order.get('delivery_notes', ''),
+                    order.get('butcher_notes', ''),
+                    json.dumps(order.get('items', {})),
+                    order.get('status', 'completed'),
+                    order.get('created_at', ''),
+                    order.get('closed_at', ''),
+                    order.get('total_amount', 0.0),
+                    order.get('customer_id')
+                ))
     
-    # ייבוא לקוחות
-    if os.path.exists('customers.json'):
-        with open('customers.json', 'r', encoding='utf-8') as f:
-            customers = json.load(f)
+        # ייבוא לקוחות
+        if os.path.exists('customers.json'):
+            with open('customers.json', 'r', encoding='utf-8') as f:
+                customers = json.load(f)
         
-        for customer in customers:
-            cursor.execute('''
-                INSERT OR IGNORE INTO customers (id, phone, full_name, created_at, last_updated,
-                                                total_orders, total_spent, last_order_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                customer.get('id'),
-                customer.get('phone', ''),
-                customer.get('full_name', ''),
-                customer.get('created_at', ''),
-                customer.get('last_updated', ''),
-                customer.get('total_orders', 0),
-                customer.get('total_spent', 0.0),
-                customer.get('last_order_date', '')
-            ))
-    
-    conn.commit()
-    conn.close()
+            for customer in customers:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO customers (id, phone, full_name, created_at, last_updated,
+                                                    total_orders, total_spent, last_order_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    customer.get('id'),
+                    customer.get('phone', ''),
+                    customer.get('full_name', ''),
+                    customer.get('created_at', ''),
+                    customer.get('last_updated', ''),
+                    customer.get('total_orders', 0),
+                    customer.get('total_spent', 0.0),
+                    customer.get('last_order_date', '')
+                ))
+
+if __name__ == '__main__':
+    # שורת פקודה:
+    #   python database.py --rebuild-rollups [קובץ מסד נתונים] - בנייה מחדש של טבלאות הסיכום
+    #   python database.py --check-plans [קובץ מסד נתונים] - בדיקת תוכניות השאילתות הקריטיות
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild-rollups':
+        if len(sys.argv) > 2:
+            DATABASE_FILE = sys.argv[2]
+        rebuild_rollups()
+        print("✅ טבלאות הסיכום נבנו מחדש")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '--check-plans':
+        if len(sys.argv) > 2:
+            DATABASE_FILE = sys.argv[2]
+        failures = check_query_plans()
+        for name, plan in failures.items():
+            print(f"❌ {name}: {' | '.join(plan)}")
+        if failures:
+            sys.exit(1)
+        print(f"✅ כל {len(CRITICAL_QUERIES)} השאילתות הקריטיות משתמשות באינדקסים")